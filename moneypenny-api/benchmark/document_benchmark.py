@@ -0,0 +1,492 @@
+"""
+Benchmark of the document API at scale.
+
+Generates synthetic document trees and drives `GET /documents`,
+`GET /documents/<filename>` and `DELETE /documents/<filename>` through the ASGI
+app with concurrent clients. Reports latency percentiles, throughput, peak RSS
+and (read/write) system calls per request for every scenario and operation, and
+compares them against a stored baseline report.
+
+Scenarios:
+    flat-<count>    A flat tree of <count> small documents, e.g. flat-10000.
+    large-<size>    A few documents of <size> each, e.g. large-1MB or large-1GB.
+
+Every scenario runs in its own process, so that peak RSS and system call counts
+are not shared between scenarios and the app is set up against its own tree.
+
+Usage (from `moneypenny-api`):
+    python -m benchmark.document_benchmark --scenarios flat-1000,flat-10000,large-1MB --output documents.json
+    python -m benchmark.document_benchmark --baseline documents.json --fail-on-regression
+"""
+
+import os
+
+import re
+
+import sys
+
+import json
+
+import time
+
+import random
+
+import logging
+
+import asyncio
+
+import argparse
+
+import tempfile
+
+import subprocess
+
+from pathlib import Path
+
+from typing import Any, Optional
+
+from benchmark.stats import (
+    add_src_to_path,
+    summarize,
+    get_rss_mb,
+    get_peak_rss_mb,
+    get_syscall_count,
+    get_context_switch_count,
+    write_report,
+)
+
+
+OPERATIONS = ["list", "get", "delete"]
+
+SCENARIO_PATTERN = re.compile(r"^(flat)-(\d+)$|^(large)-(\d+)(B|KB|MB|GB)$", re.IGNORECASE)
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+# A minimal, valid single-page PDF, padded with comment lines up to the document size
+PDF_CONTENT = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+PADDING_LINE = b"%" + b"x" * 62 + b"\n"
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {
+    "latency_p50_seconds": False,
+    "latency_p95_seconds": False,
+    "throughput_rps": True,
+    "syscalls_per_request": False,
+    "peak_rss_mb": False,
+}
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        "--scenarios", default="flat-1000,flat-10000,large-1MB",
+        help="Comma-separated scenarios, e.g. flat-100000 or large-1GB.",
+    )
+    parser.add_argument(
+        "--operations", default=",".join(OPERATIONS),
+        help=f"Comma-separated operations, out of: {', '.join(OPERATIONS)}.",
+    )
+    parser.add_argument("--clients", type=int, default=10, help="Number of concurrent clients.")
+    parser.add_argument(
+        "--requests", type=int, default=200,
+        help="Requests per operation; deletes are capped to the number of documents.",
+    )
+    parser.add_argument(
+        "--list-requests", type=int, default=20, help="Requests of the list operation, which scans the tree.",
+    )
+    parser.add_argument("--file-size", type=int, default=4096, help="Size of flat scenario documents in bytes.")
+    parser.add_argument("--large-files", type=int, default=8, help="Number of large scenario documents.")
+    parser.add_argument(
+        "--log-level", default="WARNING", help="Level of the app logs; debug logging skews the results.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the document choice randomness.")
+    parser.add_argument("--output", help="Path of the JSON report.")
+    parser.add_argument("--baseline", help="Path of a baseline JSON report to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1,
+        help="Relative change against the baseline above which a metric counts as regressed.",
+    )
+    parser.add_argument(
+        "--fail-on-regression", action="store_true", help="Exit with status 1 if any metric regressed.",
+    )
+    # Internal: run a single scenario in this process and write its results to a path
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def parse_scenario(
+    scenario: str,
+    arguments: argparse.Namespace,
+) -> tuple[str, int, int]:
+    """
+    Parse a scenario name.
+
+    Args:
+        scenario (str): The scenario name, e.g. flat-10000 or large-1GB.
+        arguments (argparse.Namespace): The command line arguments.
+
+    Returns:
+        tuple[str, int, int]: The variant, the number of documents and their size.
+
+    Raises:
+        ValueError: If the scenario name is invalid.
+    """
+    match = SCENARIO_PATTERN.match(scenario.strip())
+
+    if not match:
+        raise ValueError(f"Invalid scenario: {scenario}")
+
+    if match.group(1):
+        return "flat", int(match.group(2)), arguments.file_size
+
+    return "large", arguments.large_files, int(match.group(4)) * SIZE_UNITS[match.group(5).upper()]
+
+
+def generate_tree(
+    directory: Path,
+    count: int,
+    size: int,
+) -> list[str]:
+    """
+    Generate a flat tree of synthetic PDF documents.
+
+    Args:
+        directory (Path): The directory.
+        count (int): Number of documents.
+        size (int): Size of every document in bytes.
+
+    Returns:
+        list[str]: The document names.
+    """
+    names = [f"document-{index:06d}.pdf" for index in range(count)]
+    padding = PADDING_LINE * (WRITE_CHUNK_SIZE // len(PADDING_LINE))
+
+    for name in names:
+        with open(directory / name, "wb") as fh:
+            fh.write(PDF_CONTENT)
+            remaining = max(0, size - len(PDF_CONTENT))
+
+            while remaining:
+                written = fh.write(padding[:min(remaining, len(padding))])
+                remaining -= written
+
+    return names
+
+
+async def run_request(
+    client: Any,
+    method: str,
+    path: str,
+) -> dict[str, Any]:
+    """
+    Run a single request and read its response body to the end.
+
+    Args:
+        client (Any): The Quart test client.
+        method (str): The HTTP method.
+        path (str): The request path.
+
+    Returns:
+        dict[str, Any]: The timing and outcome of the request.
+    """
+    started_on = time.perf_counter()
+    size = 0
+
+    async with client.request(path, method=method) as connection:
+        await connection.send_complete()
+
+        while chunk := await connection.receive():
+            size += len(chunk)
+
+    return {
+        "latency": time.perf_counter() - started_on,
+        "bytes": size,
+        "ok": connection.status_code == 200,
+    }
+
+
+async def run_operation(
+    client: Any,
+    method: str,
+    paths: list[str],
+    clients: int,
+) -> dict[str, Any]:
+    """
+    Run the requests of an operation with concurrent clients.
+
+    Args:
+        client (Any): The Quart test client.
+        method (str): The HTTP method.
+        paths (list[str]): The request paths.
+        clients (int): Number of concurrent clients.
+
+    Returns:
+        dict[str, Any]: The results of the operation.
+    """
+    results = []
+    semaphore = asyncio.Semaphore(clients)
+
+    async def run_client(path: str) -> None:
+        async with semaphore:
+            results.append(await run_request(client, method, path))
+
+    syscalls_before = get_syscall_count()
+    context_switches_before = get_context_switch_count()
+    started_on = time.perf_counter()
+
+    await asyncio.gather(*(run_client(path) for path in paths))
+
+    duration = time.perf_counter() - started_on
+    syscalls = get_syscall_count()
+    context_switches = get_context_switch_count() - context_switches_before
+    succeeded = [result for result in results if result["ok"]]
+
+    return {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "duration_seconds": duration,
+        "throughput_rps": len(succeeded) / duration if duration else None,
+        "latency_seconds": summarize([result["latency"] for result in succeeded]),
+        "response_bytes": summarize([result["bytes"] for result in succeeded]),
+        "syscalls_per_request": (
+            (syscalls - syscalls_before) / len(results)
+            if results and syscalls is not None and syscalls_before is not None else None
+        ),
+        "context_switches_per_request": context_switches / len(results) if results else None,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+async def run_scenario(
+    arguments: argparse.Namespace,
+    names: list[str],
+) -> dict[str, Any]:
+    """
+    Run the operations of a scenario against the app.
+
+    Args:
+        arguments (argparse.Namespace): The command line arguments.
+        names (list[str]): The document names of the tree.
+
+    Returns:
+        dict[str, Any]: The results of the scenario by operation.
+    """
+    # pylint: disable=import-outside-toplevel
+    from quart import Quart
+
+    from quart_schema import QuartSchema
+
+    from api.document_api import document_blueprint
+
+    logging.disable(logging.getLevelName(arguments.log_level.upper()) - 1)
+
+    # Only the document blueprint, so that the rest of the app does not skew the numbers
+    app = Quart(__name__)
+    QuartSchema(app)
+    app.register_blueprint(document_blueprint)
+
+    randomizer = random.Random(arguments.seed)
+    operations = [operation.strip() for operation in arguments.operations.split(",")]
+    deleted = randomizer.sample(names, min(arguments.requests, len(names)))
+    requests = {
+        "list": ("GET", ["/documents"] * arguments.list_requests),
+        "get": ("GET", [f"/documents/{randomizer.choice(names)}" for _ in range(arguments.requests)]),
+        "delete": ("DELETE", [f"/documents/{name}" for name in deleted]),
+    }
+    results = {}
+
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+
+        # Warm up the routes, so that the first requests do not measure imports and caches.
+        await run_request(client, "GET", f"/documents/{names[0]}")
+
+        rss_before = get_rss_mb()
+
+        # Deletes go last, since they shrink the tree.
+        for operation in OPERATIONS:
+            if operation in operations:
+                method, paths = requests[operation]
+                results[operation] = await run_operation(client, method, paths, arguments.clients)
+
+    return {
+        "rss_mb": {
+            "before": rss_before,
+            "after": get_rss_mb(),
+            "peak": get_peak_rss_mb(),
+        },
+        "operations": results,
+    }
+
+
+def run_scenario_process(
+    arguments: argparse.Namespace,
+    scenario: str,
+) -> dict[str, Any]:
+    """
+    Generate the tree of a scenario and run it in a child process.
+
+    Args:
+        arguments (argparse.Namespace): The command line arguments.
+        scenario (str): The scenario name.
+
+    Returns:
+        dict[str, Any]: The results of the scenario.
+    """
+    variant, count, size = parse_scenario(scenario, arguments)
+
+    with tempfile.TemporaryDirectory(prefix="moneypenny-benchmark-") as directory:
+        tree = Path(directory) / "document"
+        tree.mkdir()
+        result = Path(directory) / "result.json"
+
+        started_on = time.perf_counter()
+        generate_tree(tree, count, size)
+        generated_in = time.perf_counter() - started_on
+
+        command = [
+            sys.executable, "-m", "benchmark.document_benchmark",
+            *sys.argv[1:],
+            "--run-scenario", scenario,
+            "--result", str(result),
+        ]
+        environment = {**os.environ, "DOCUMENT_BASE_PATH": str(tree)}
+
+        subprocess.run(
+            command, env=environment, check=True, cwd=Path(__file__).resolve().parent.parent,
+        )
+
+        return {
+            "variant": variant,
+            "documents": count,
+            "document_bytes": size,
+            "generation_seconds": generated_in,
+            **json.loads(result.read_text(encoding="utf-8")),
+        }
+
+
+def flatten(report: dict[str, Any]) -> dict[tuple[str, str], dict[str, Optional[float]]]:
+    """
+    Get the compared metrics of a report by scenario and operation.
+
+    Args:
+        report (dict[str, Any]): The report.
+
+    Returns:
+        dict[tuple[str, str], dict[str, Optional[float]]]: The metrics.
+    """
+    metrics = {}
+
+    for scenario, results in report.get("scenarios", {}).items():
+        for operation, result in results.get("operations", {}).items():
+            metrics[(scenario, operation)] = {
+                "latency_p50_seconds": result["latency_seconds"]["p50"],
+                "latency_p95_seconds": result["latency_seconds"]["p95"],
+                "throughput_rps": result["throughput_rps"],
+                "syscalls_per_request": result["syscalls_per_request"],
+                "peak_rss_mb": result["peak_rss_mb"],
+            }
+
+    return metrics
+
+
+def compare(
+    report: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+) -> dict[str, Any]:
+    """
+    Compare a report against a baseline report.
+
+    Only scenarios and operations present in both reports are compared.
+
+    Args:
+        report (dict[str, Any]): The report.
+        baseline (dict[str, Any]): The baseline report.
+        tolerance (float): Relative change above which a metric counts as regressed.
+
+    Returns:
+        dict[str, Any]: The relative change of every metric and the regressed metrics.
+    """
+    current, previous = flatten(report), flatten(baseline)
+    changes = {}
+    regressions = []
+
+    for key in sorted(current.keys() & previous.keys()):
+        scenario, operation = key
+
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            value, baseline_value = current[key][metric], previous[key][metric]
+
+            if value is None or not baseline_value:
+                continue
+
+            change = (value - baseline_value) / baseline_value
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+
+            changes.setdefault(scenario, {}).setdefault(operation, {})[metric] = {
+                "baseline": baseline_value,
+                "current": value,
+                "change": change,
+                "regressed": regressed,
+            }
+
+            if regressed:
+                regressions.append(f"{scenario}/{operation}/{metric}")
+
+    return {
+        "tolerance": tolerance,
+        "changes": changes,
+        "regressions": regressions,
+    }
+
+
+def main() -> None:
+    """
+    Run the benchmark and report the results.
+    """
+    arguments = parse_arguments()
+
+    if arguments.run_scenario:
+        add_src_to_path()
+
+        names = sorted(path.name for path in Path(os.environ["DOCUMENT_BASE_PATH"]).iterdir())
+        results = asyncio.run(run_scenario(arguments, names))
+
+        Path(arguments.result).write_text(json.dumps(results), encoding="utf-8")
+
+        return
+
+    excluded = {"output", "baseline", "fail_on_regression", "run_scenario", "result"}
+    report = {
+        "benchmark": "documents",
+        "parameters": {key: value for key, value in vars(arguments).items() if key not in excluded},
+        "scenarios": {
+            scenario.strip(): run_scenario_process(arguments, scenario.strip())
+            for scenario in arguments.scenarios.split(",")
+        },
+    }
+
+    if arguments.baseline:
+        baseline = json.loads(Path(arguments.baseline).read_text(encoding="utf-8"))
+        report["comparison"] = compare(report, baseline, arguments.tolerance)
+
+    write_report(report, arguments.output)
+
+    if arguments.fail_on_regression and report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+A chat model with scripted tool-calling behavior and configurable latency,
+standing in for the provider in offline benchmarks.
+"""
+
+import re
+
+import uuid
+
+import time
+
+import random
+
+import asyncio
+
+from pathlib import PurePath
+
+from typing import Any, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+FILENAME_PATTERN = re.compile(
+    r"[\w\-.]+\.(?:pdf|docx?|xlsx?|pptx?|png|jpe?g|tiff?|html?|md)\b", re.IGNORECASE,
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that converts every document named in the prompt, one
+    `document_processor` call per document, and then answers.
+
+    Each call sleeps for `latency` seconds, +/- up to `jitter` seconds, and
+    reports token usage proportional to the size of the conversation.
+    """
+
+    latency: float = 0.5
+
+    jitter: float = 0.1
+
+    tool_name: str = "document_processor"
+
+    seed: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-calling"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        """
+        Accept the tools of the agent; the script only ever calls `tool_name`.
+        """
+        return self
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._get_latency())
+
+        return self._respond(messages)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._get_latency())
+
+        return self._respond(messages)
+
+    def _get_latency(self) -> float:
+        """
+        Get the latency of a call.
+        """
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _respond(self, messages: list[BaseMessage]) -> ChatResult:
+        """
+        Respond with the next scripted step: the next tool call, or the answer.
+
+        Args:
+            messages (list[BaseMessage]): The conversation.
+
+        Returns:
+            ChatResult: The response.
+        """
+        prompt_index = max(
+            index for index, message in enumerate(messages) if isinstance(message, HumanMessage)
+        )
+        prompt = str(messages[prompt_index].content)
+        done = [message for message in messages[prompt_index:] if isinstance(message, ToolMessage)]
+        # Prompts of per-document sub-runs name their document last.
+        documents = list(dict.fromkeys(FILENAME_PATTERN.findall(prompt)))
+
+        if "Only process the document" in prompt:
+            documents = documents[-1:]
+
+        if len(done) < len(documents):
+            document = documents[len(done)]
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": self.tool_name,
+                        "args": {
+                            "instructions": {
+                                "parts": [{"file": document}],
+                                "output": {"type": "pdf"},
+                            },
+                            "outputPath": f"{PurePath(document).stem}_processed.pdf",
+                        },
+                        "id": f"call_{uuid.uuid4().hex[:24]}",
+                    }
+                ],
+            )
+        else:
+            message = AIMessage(
+                content=f"Processed {len(done)} document(s)." if done else "Nothing to process.",
+            )
+
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4 + 1
+        output_tokens = len(str(message.content)) // 4 + 20 * len(message.tool_calls) + 1
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
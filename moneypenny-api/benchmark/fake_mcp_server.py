@@ -0,0 +1,137 @@
+"""
+A stand-in for the `nutrient-dws` MCP stdio server, for offline benchmarks.
+
+It exposes the tool surface of the real server (tool names and argument
+shapes) and works on the same `--sandbox` directory, but instead of calling the
+Nutrient DWS API every operation sleeps for a configurable latency and copies
+its input document to the output path.
+
+Usage:
+    python benchmark/fake_mcp_server.py --sandbox <path> [--latency 0.2] [--jitter 0.05]
+"""
+
+import time
+
+import random
+
+import shutil
+
+import argparse
+
+from pathlib import Path
+
+from typing import Any, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--sandbox", required=True, help="Sandbox directory of the documents.")
+parser.add_argument("--latency", type=float, default=0.2, help="Latency of operations in seconds.")
+parser.add_argument("--jitter", type=float, default=0.05, help="Latency jitter in seconds.")
+arguments = parser.parse_args()
+
+sandbox = Path(arguments.sandbox).resolve()
+server = FastMCP("nutrient-dws", log_level="WARNING")
+
+
+def _operate(
+    input_path: str,
+    output_path: str,
+) -> str:
+    """
+    Simulate an operation on a sandbox document.
+
+    Args:
+        input_path (str): Path of the input document, relative to the sandbox.
+        output_path (str): Path of the output document, relative to the sandbox.
+
+    Returns:
+        str: The result message.
+
+    Raises:
+        ValueError: If a path is outside of the sandbox or the input does not exist.
+    """
+    source = _resolve(input_path)
+    target = _resolve(output_path)
+
+    if not source.is_file():
+        raise ValueError(f"File not found in sandbox: {input_path}")
+
+    time.sleep(max(0.0, arguments.latency + random.uniform(-arguments.jitter, arguments.jitter)))
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, target)
+
+    return f"Output written to: {output_path}"
+
+
+def _resolve(path: str) -> Path:
+    """
+    Resolve a path relative to the sandbox, rejecting paths outside of it.
+    """
+    resolved = (sandbox / path).resolve()
+
+    if not resolved.is_relative_to(sandbox):
+        raise ValueError(f"Path is outside of the sandbox: {path}")
+
+    return resolved
+
+
+@server.tool()
+def document_processor(instructions: dict[str, Any], outputPath: str) -> str: # pylint: disable=invalid-name
+    """
+    Process documents with Build API instructions: merge parts, apply actions
+    (OCR, watermark, rotation, flattening, redaction) and convert the output
+    (PDF, PDF/A, Office formats, images, HTML, Markdown).
+    """
+    parts = instructions.get("parts") or []
+
+    if not parts:
+        raise ValueError("At least one part is required.")
+
+    return _operate(parts[0].get("file", ""), outputPath)
+
+
+@server.tool()
+def document_signer(
+    filePath: str, # pylint: disable=invalid-name
+    outputPath: str, # pylint: disable=invalid-name
+    signatureOptions: Optional[dict[str, Any]] = None, # pylint: disable=invalid-name,unused-argument
+) -> str:
+    """
+    Digitally sign a PDF document.
+    """
+    return _operate(filePath, outputPath)
+
+
+@server.tool()
+def ai_redactor(
+    filePath: str, # pylint: disable=invalid-name
+    criteria: str, # pylint: disable=unused-argument
+    outputPath: str, # pylint: disable=invalid-name
+) -> str:
+    """
+    Redact sensitive information from a document, as described by the criteria.
+    """
+    return _operate(filePath, outputPath)
+
+
+@server.tool()
+def check_credits() -> str:
+    """
+    Check the remaining credits of the API key.
+    """
+    return "Remaining credits: unlimited (stand-in server)"
+
+
+@server.tool()
+def sandbox_file_tree() -> str:
+    """
+    List the files of the sandbox directory.
+    """
+    return "\n".join(str(path.relative_to(sandbox)) for path in sorted(sandbox.rglob("*")))
+
+
+if __name__ == "__main__":
+    server.run()
@@ -0,0 +1,338 @@
+"""
+Offline load test and benchmark of `POST /process`.
+
+Drives the Quart app in-process with concurrent SSE clients, with the chat
+model replaced by a scripted fake and the `nutrient-dws` MCP server by a
+stand-in, so no API keys are needed and results are repeatable. Reports
+throughput, end-to-end latency and time-to-first-event percentiles, event
+loop lag and RSS.
+
+Usage (from `moneypenny-api`):
+    python -m benchmark.process_benchmark --clients 20 --requests 200 --output out.json
+"""
+
+import os
+
+import sys
+
+import json
+
+import time
+
+import random
+
+import logging
+
+import asyncio
+
+import argparse
+
+import tempfile
+
+from pathlib import Path
+
+from typing import Any
+
+from benchmark.stats import (
+    add_src_to_path,
+    summarize,
+    get_rss_mb,
+    get_peak_rss_mb,
+    LoopLagMonitor,
+    write_report,
+)
+
+
+FAKE_MCP_SERVER_PATH = Path(__file__).resolve().parent / "fake_mcp_server.py"
+
+# A minimal, valid single-page PDF
+PDF_CONTENT = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+# Prompts exercising the agent (single and multi document), the direct tool
+# call route and the per-document fan-out
+PROMPTS = {
+    "convert": "Convert {document} to PDF/A",
+    "convert_two": "Convert {document} and {other} to PDF",
+    "watermark": "Add 'CONFIDENTIAL' watermark to {document}",
+    "fan_out": "Convert all PDFs to PDF/A",
+}
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10, help="Number of concurrent SSE clients.")
+    parser.add_argument("--requests", type=int, default=50, help="Total number of requests.")
+    parser.add_argument("--documents", type=int, default=20, help="Number of sandbox documents.")
+    parser.add_argument(
+        "--prompts", default="convert,convert_two,watermark",
+        help=f"Comma-separated prompt mix, out of: {', '.join(PROMPTS)}.",
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake chat model latency in seconds.")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Fake chat model latency jitter in seconds.")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="Stand-in MCP tool latency in seconds.")
+    parser.add_argument(
+        "--checkpointer", default="memory", choices=["sqlite", "memory", "none"], help="Checkpointer backend.",
+    )
+    parser.add_argument(
+        "--protocol", default="1", choices=["1", "2"], help="SSE protocol: full updates (1) or deltas (2).",
+    )
+    parser.add_argument("--caches", action="store_true", help="Keep the result and tool call caches enabled.")
+    parser.add_argument(
+        "--log-level", default="WARNING", help="Level of the app logs; debug logging skews the results.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the prompt and latency randomness.")
+    parser.add_argument("--output", help="Path of the JSON report.")
+
+    return parser.parse_args()
+
+
+def set_up_environment(
+    arguments: argparse.Namespace,
+    sandbox: Path,
+) -> None:
+    """
+    Create the sandbox documents and configure the app before it is imported.
+
+    Args:
+        arguments (argparse.Namespace): The command line arguments.
+        sandbox (Path): The sandbox directory.
+    """
+    for index in range(arguments.documents):
+        (sandbox / f"document-{index:05d}.pdf").write_bytes(PDF_CONTENT)
+
+    os.environ["DOCUMENT_BASE_PATH"] = str(sandbox)
+    os.environ["MCP_COMMAND_NUTRIENT_DWS"] = (
+        f"{sys.executable} {FAKE_MCP_SERVER_PATH} --latency {arguments.tool_latency}"
+    )
+    os.environ["CHECKPOINTER"] = arguments.checkpointer
+    os.environ["CHECKPOINT_PATH"] = str(sandbox.parent / "checkpoints.sqlite")
+    os.environ["SHARED_STORE_PATH"] = str(sandbox.parent / "store.sqlite")
+    os.environ["WARM_UP_ENABLED"] = "false"
+
+    if not arguments.caches:
+        os.environ["RESULT_CACHE_TTL_SECONDS"] = "0"
+        os.environ["TOOL_CALL_CACHE_MAX_BYTES"] = "0"
+
+
+def install_fake_chat_models(arguments: argparse.Namespace) -> None:
+    """
+    Replace the chat models of every model tier with the fake chat model.
+
+    Args:
+        arguments (argparse.Namespace): The command line arguments.
+    """
+    # pylint: disable=import-outside-toplevel
+    from factory.chat_model_factory import ChatModelFactory
+
+    from graph.process_graph import model_router
+
+    from metrics.instruments import LLMMetricsHandler
+
+    from benchmark.fake_chat_model import FakeChatModel
+
+    for model in model_router.models.values():
+        ChatModelFactory.CACHE[model] = FakeChatModel(
+            latency=arguments.llm_latency,
+            jitter=arguments.llm_jitter,
+            callbacks=[LLMMetricsHandler(model)],
+        )
+
+
+def parse_frame(frame: bytes) -> tuple[str, Any]:
+    """
+    Parse an SSE frame into its event name and JSON data.
+
+    Args:
+        frame (bytes): The frame, without the blank line ending it.
+
+    Returns:
+        tuple[str, Any]: The event name ("message" if unnamed) and the data, None for comments.
+    """
+    event, data = "message", None
+
+    for line in frame.decode().splitlines():
+        name, _, value = line.partition(":")
+
+        if name == "event":
+            event = value.strip()
+        elif name == "data":
+            data = json.loads(value)
+
+    return event, data
+
+
+async def run_request(
+    client: Any,
+    prompt: str,
+    protocol: str,
+) -> dict[str, Any]:
+    """
+    Run a single `POST /process` request and read its SSE stream to the end.
+
+    Args:
+        client (Any): The Quart test client.
+        prompt (str): The prompt.
+        protocol (str): The SSE protocol.
+
+    Returns:
+        dict[str, Any]: The timings and outcome of the request.
+    """
+    started_on = time.perf_counter()
+    first_event_on = None
+    events = 0
+    event_bytes = 0
+    response = None
+    buffer = b""
+
+    async with client.request(
+        f"/process?protocol={protocol}", method="POST", headers={"Content-Type": "application/json"},
+    ) as connection:
+        await connection.send(json.dumps({"prompt": prompt}).encode())
+        await connection.send_complete()
+
+        while True:
+            chunk = await connection.receive()
+
+            if not chunk:
+                break
+
+            buffer += chunk
+
+            while b"\n\n" in buffer:
+                frame, buffer = buffer.split(b"\n\n", 1)
+                event, data = parse_frame(frame)
+
+                if data is None:
+                    continue
+
+                if first_event_on is None:
+                    first_event_on = time.perf_counter()
+
+                events += 1
+                event_bytes += len(frame) + 2
+
+                # Protocol 1 sends full states, protocol 2 state deltas and appended text.
+                if event == "message":
+                    response = data.get("response", response)
+                elif event == "state":
+                    response = data.get("set", {}).get("response", response)
+                elif event == "text" and data["field"] == "response":
+                    response = (response or "") + data["text"]
+
+    finished_on = time.perf_counter()
+
+    return {
+        "status": connection.status_code,
+        "latency": finished_on - started_on,
+        "time_to_first_event": first_event_on - started_on if first_event_on else None,
+        "events": events,
+        "event_bytes": event_bytes,
+        "ok": connection.status_code == 200 and bool(response),
+    }
+
+
+async def run_benchmark(arguments: argparse.Namespace) -> dict[str, Any]:
+    """
+    Run the benchmark.
+
+    Args:
+        arguments (argparse.Namespace): The command line arguments.
+
+    Returns:
+        dict[str, Any]: The report.
+    """
+    from api.app import app # pylint: disable=import-outside-toplevel
+
+    logging.disable(logging.getLevelName(arguments.log_level.upper()) - 1)
+    install_fake_chat_models(arguments)
+
+    random.seed(arguments.seed)
+    randomizer = random.Random(arguments.seed)
+    prompt_names = [name.strip() for name in arguments.prompts.split(",")]
+    documents = [f"document-{index:05d}.pdf" for index in range(arguments.documents)]
+    prompts = [
+        PROMPTS[randomizer.choice(prompt_names)].format(
+            document=randomizer.choice(documents), other=randomizer.choice(documents),
+        )
+        for _ in range(arguments.requests)
+    ]
+    results = []
+    semaphore = asyncio.Semaphore(arguments.clients)
+    monitor = LoopLagMonitor()
+
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+
+        # Discover the tools once, so that the first requests do not measure the spawn.
+        from graph.process_graph import ProcessGraph # pylint: disable=import-outside-toplevel
+
+        await ProcessGraph.get_tools()
+
+        rss_before = get_rss_mb()
+
+        async def run_client(prompt: str) -> None:
+            async with semaphore:
+                results.append(await run_request(client, prompt, arguments.protocol))
+
+        monitor.start()
+        started_on = time.perf_counter()
+
+        await asyncio.gather(*(run_client(prompt) for prompt in prompts))
+
+        duration = time.perf_counter() - started_on
+        loop_lag = await monitor.stop()
+
+    succeeded = [result for result in results if result["ok"]]
+
+    return {
+        "benchmark": "process",
+        "parameters": {
+            key: value for key, value in vars(arguments).items() if key != "output"
+        },
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "duration_seconds": duration,
+        "throughput_rps": len(succeeded) / duration if duration else None,
+        "latency_seconds": summarize([result["latency"] for result in succeeded]),
+        "time_to_first_event_seconds": summarize(
+            [result["time_to_first_event"] for result in succeeded if result["time_to_first_event"]]
+        ),
+        "events_per_request": summarize([result["events"] for result in succeeded]),
+        "event_bytes_per_request": summarize([result["event_bytes"] for result in succeeded]),
+        "event_loop_lag_seconds": loop_lag,
+        "rss_mb": {
+            "before": rss_before,
+            "after": get_rss_mb(),
+            "peak": get_peak_rss_mb(),
+        },
+    }
+
+
+def main() -> None:
+    """
+    Run the benchmark and report the results.
+    """
+    arguments = parse_arguments()
+
+    with tempfile.TemporaryDirectory(prefix="moneypenny-benchmark-") as directory:
+        sandbox = Path(directory) / "document"
+        sandbox.mkdir()
+
+        set_up_environment(arguments, sandbox)
+        add_src_to_path()
+
+        report = asyncio.run(run_benchmark(arguments))
+
+    write_report(report, arguments.output)
+
+
+if __name__ == "__main__":
+    main()
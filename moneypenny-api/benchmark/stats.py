@@ -0,0 +1,191 @@
+"""
+Measurement and reporting helpers shared by the benchmarks.
+"""
+
+import os
+
+import sys
+
+import json
+
+import time
+
+import math
+
+import asyncio
+
+import resource
+
+from pathlib import Path
+
+from typing import Any, Optional
+
+
+SRC_PATH = Path(__file__).resolve().parent.parent / "src"
+
+
+def add_src_to_path() -> None:
+    """
+    Make the API sources importable, the way they are when run from `src`.
+    """
+    if str(SRC_PATH) not in sys.path:
+        sys.path.insert(0, str(SRC_PATH))
+
+
+def percentile(
+    values: list[float],
+    q: float,
+) -> Optional[float]:
+    """
+    Get a percentile of values, interpolating between the closest ranks.
+
+    Args:
+        values (list[float]): The values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        Optional[float]: The percentile or None if there are no values.
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower, upper = math.floor(rank), math.ceil(rank)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: list[float]) -> dict[str, Optional[float]]:
+    """
+    Summarize a distribution with its mean, p50, p95, p99 and maximum.
+
+    Args:
+        values (list[float]): The values.
+
+    Returns:
+        dict[str, Optional[float]]: The summary.
+    """
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def get_rss_mb() -> float:
+    """
+    Get the current resident set size of the process in MiB.
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return get_peak_rss_mb()
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Get the peak resident set size of the process in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS and in KiB elsewhere.
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def get_syscall_count() -> Optional[int]:
+    """
+    Get the number of read and write system calls made by the process so far.
+
+    Other system calls (stat, getdents, open, ...) are not counted by the kernel
+    per process, so this is a lower bound, comparable between runs.
+
+    Returns:
+        Optional[int]: The number of system calls or None if unavailable (non-Linux).
+    """
+    try:
+        with open("/proc/self/io", encoding="utf-8") as fh:
+            counters = dict(line.split(": ") for line in fh.read().splitlines())
+    except OSError:
+        return None
+
+    return int(counters["syscr"]) + int(counters["syscw"])
+
+
+def get_context_switch_count() -> int:
+    """
+    Get the number of context switches of the process so far.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    return usage.ru_nvcsw + usage.ru_nivcsw
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how late a periodic timer fires compared to when
+    it was due. Sustained lag means something is blocking the loop.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+    ):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval (float): Timer interval in seconds.
+        """
+        self.interval = interval
+        self.lags: list[float] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start measuring.
+        """
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict[str, Optional[float]]:
+        """
+        Stop measuring.
+
+        Returns:
+            dict[str, Optional[float]]: Summary of the lag in seconds.
+        """
+        self.task.cancel()
+
+        await asyncio.gather(self.task, return_exceptions=True)
+
+        return summarize(self.lags)
+
+    async def _run(self) -> None:
+        while True:
+            due = time.perf_counter() + self.interval
+
+            await asyncio.sleep(self.interval)
+
+            self.lags.append(max(0.0, time.perf_counter() - due))
+
+
+def write_report(
+    report: dict[str, Any],
+    path: Optional[str],
+) -> None:
+    """
+    Print a report and, if a path is given, write it there as JSON.
+
+    Args:
+        report (dict[str, Any]): The report.
+        path (Optional[str]): Path of the JSON file.
+    """
+    print(json.dumps(report, indent=2))
+
+    if path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(report, indent=2), encoding="utf-8")
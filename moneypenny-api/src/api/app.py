@@ -5,6 +5,8 @@ the Flask app, registers the blueprints, and runs the app.
 
 import os
 
+import asyncio
+
 import warnings
 
 from pathlib import Path
@@ -20,6 +22,14 @@ from common.setup import get_config_settings, set_up_logging
 
 from api.process_api import process_blueprint
 from api.document_api import document_blueprint
+from api.health_api import health_blueprint, warm_up_service
+from api.metrics_api import metrics_blueprint
+
+from factory.checkpointer_factory import CheckpointerFactory
+
+from service.checkpoint_service import CheckpointService
+
+from util.io import preload_resources
 
 
 warnings.filterwarnings("ignore", message="Multiple schemas resolved to the name ")
@@ -72,12 +82,71 @@ QuartSchema(
         {
             "name": "Document Management",
             "description": "Operations for listing and retrieving documents",
+        },
+        {
+            "name": "Health",
+            "description": "Liveness and readiness of the service",
+        },
+        {
+            "name": "Monitoring",
+            "description": "Service metrics",
         }
     ],
 )
 
 app.register_blueprint(process_blueprint)
 app.register_blueprint(document_blueprint)
+app.register_blueprint(health_blueprint)
+app.register_blueprint(metrics_blueprint)
+
+checkpoint_service = CheckpointService()
+
+
+@app.before_serving
+async def preload_resource_cache() -> None:
+    """
+    Load the resources listed in the (opt-in) preload manifest into the resource cache.
+    """
+    preload_resources()
+
+
+@app.before_serving
+async def start_warm_up() -> None:
+    """
+    Start the (opt-in) warm-up of the processing pipeline in the background,
+    so that liveness is reported while readiness waits for the warm-up.
+    """
+    app.warm_up_task = asyncio.create_task(warm_up_service.warm_up())
+
+
+@app.before_serving
+async def start_checkpoint_retention() -> None:
+    """
+    Start purging expired checkpoints of processing runs in the background.
+    """
+    app.checkpoint_retention_task = asyncio.create_task(checkpoint_service.run_retention())
+
+
+@app.after_serving
+async def stop_warm_up() -> None:
+    """
+    Cancel the warm-up if it is still running on shutdown.
+    """
+    app.warm_up_task.cancel()
+
+    await asyncio.gather(app.warm_up_task, return_exceptions=True)
+
+
+@app.after_serving
+async def stop_checkpointing() -> None:
+    """
+    Stop purging expired checkpoints and close the checkpointer on shutdown.
+    """
+    app.checkpoint_retention_task.cancel()
+
+    await asyncio.gather(app.checkpoint_retention_task, return_exceptions=True)
+    await CheckpointerFactory.close()
+
 
 asgi_app = app
 
@@ -24,6 +24,8 @@ from repository.document_repository import DocumentRepository
 
 from service.document_service import DocumentService
 
+from metrics.instruments import time_request, document_bytes_served
+
 from util.api import handle_exception_impl
 
 
@@ -40,6 +42,7 @@ document_blueprint = Blueprint("document", __name__, url_prefix="/documents")
 @document_blueprint.route("", methods=["GET"])
 @tag(["Document Management"])
 @validate_response(DocumentListResponseSchema, 200)
+@time_request("list")
 async def list_documents() -> tuple[dict, int]:
     """
     List all available documents.
@@ -85,6 +88,7 @@ async def list_documents() -> tuple[dict, int]:
 
 @document_blueprint.route("/<string:filename>", methods=["GET"])
 @tag(["Document Management"])
+@time_request("get")
 async def get_document(filename: str) -> Response:
     """
     Stream document content for viewing or downloading.
@@ -117,6 +121,8 @@ async def get_document(filename: str) -> Response:
 
     document = document_service.get_document(filename)
 
+    document_bytes_served.observe(len(document.content))
+
     # Create in-memory file for streaming
     file_stream = BytesIO(document.content)
     file_stream.seek(0)
@@ -131,6 +137,7 @@ async def get_document(filename: str) -> Response:
 
 @document_blueprint.route("/<string:filename>", methods=["DELETE"])
 @tag(["Document Management"])
+@time_request("delete")
 async def delete_document(filename: str) -> tuple[dict, int]:
     """
     Delete a document from the repository.
@@ -0,0 +1,57 @@
+"""
+Health API Blueprint.
+"""
+
+from logging import getLogger
+
+from quart import Blueprint
+
+from quart_schema import tag
+
+from common.constants import (
+    KEY_STATUS,
+    STATUS_ALIVE,
+)
+
+from service.warm_up_service import WarmUpService
+
+
+logger = getLogger(__name__)
+
+warm_up_service = WarmUpService()
+
+health_blueprint = Blueprint("health", __name__, url_prefix="/health")
+
+
+@health_blueprint.route("/live", methods=["GET"])
+@tag(["Health"])
+async def live() -> tuple[dict, int]:
+    """
+    Report that the service is running.
+
+    Returns:
+        Liveness status
+
+    Responses:
+        200: Service is running
+    """
+    return {KEY_STATUS: STATUS_ALIVE}, 200
+
+
+@health_blueprint.route("/ready", methods=["GET"])
+@tag(["Health"])
+async def ready() -> tuple[dict, int]:
+    """
+    Report whether the service is ready to serve requests.
+
+    The service becomes ready once the (opt-in) warm-up of the processing
+    pipeline has completed. The response includes per-stage warm-up timings.
+
+    Returns:
+        Readiness status and warm-up stage timings
+
+    Responses:
+        200: Service is ready
+        503: Service is still warming up
+    """
+    return warm_up_service.describe(), 200 if warm_up_service.ready else 503
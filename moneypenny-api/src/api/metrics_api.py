@@ -0,0 +1,58 @@
+"""
+Metrics API Blueprint.
+"""
+
+from logging import getLogger
+
+from quart import Blueprint, Response
+
+from quart_schema import tag
+
+from common.constants import TEXT_PROMETHEUS
+
+from metrics.registry import registry
+
+
+logger = getLogger(__name__)
+
+metrics_blueprint = Blueprint("metrics", __name__, url_prefix="/metrics")
+
+
+@metrics_blueprint.route("", methods=["GET"])
+@tag(["Monitoring"])
+async def metrics() -> Response:
+    """
+    Expose the service metrics in the Prometheus text format.
+
+    **Metrics:**
+    - `moneypenny_graph_node_duration_seconds{node}`: duration of process graph nodes
+    - `moneypenny_llm_call_duration_seconds{model}`: latency of chat model calls
+    - `moneypenny_mcp_tool_call_duration_seconds{tool,status}`: latency of MCP tool calls, by
+      status (success, error or cancelled)
+    - `moneypenny_sse_time_to_first_event_seconds`: time from a process request to its first event
+    - `moneypenny_document_request_duration_seconds{endpoint}`: latency of document endpoints
+    - `moneypenny_document_bytes_served`: size of documents served
+    - `moneypenny_sse_buffer_overflows_total{policy}`: SSE stream buffer overflows
+    - `moneypenny_runs_cancelled_total`: runs cancelled before completion, e.g. on client disconnect
+    - `moneypenny_budgets_exceeded_total{budget}`: execution budgets exceeded by runs, by budget
+    - `moneypenny_resource_cache_requests_total{result}`: resource cache lookups, by `hit` or `miss`
+    - `moneypenny_prompt_router_requests_total{result}`: prompts seen by the prompt router, by `hit`
+      (routed to a direct tool call), `miss` or `failure` (routed, but left to the agent)
+    - `moneypenny_agent_run_duration_seconds{model,tier}`: latency of agent runs, by model tier
+    - `moneypenny_agent_run_failures_total{model,tier}`: failed agent runs
+    - `moneypenny_agent_escalations_total{model,tier}`: agent runs escalated to the next larger tier
+    - `moneypenny_model_tokens_total{model,tier,type}`: tokens used by agent runs, by `input` or `output`
+    - `moneypenny_upstream_retries_total{upstream}`: model and MCP server calls retried
+    - `moneypenny_hedged_requests_total{upstream,winner}`: hedged model calls, by the winning request
+    - `moneypenny_circuit_breaker_state{upstream}`: circuit of a model or MCP server, 0 closed,
+      1 half-open, 2 open
+    - `moneypenny_runs_in_flight`, `moneypenny_sse_streams`, `moneypenny_sse_queue_depth`,
+      `moneypenny_mcp_sessions`, `moneypenny_ws_connections`: gauges
+
+    Returns:
+        The metrics exposition (text/plain; version=0.0.4)
+
+    Responses:
+        200: Metrics exposition
+    """
+    return Response(registry.render(), content_type=TEXT_PROMETHEUS)
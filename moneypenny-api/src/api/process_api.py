@@ -6,33 +6,63 @@ import os
 
 import asyncio
 
-import json
+import time
+
+from dataclasses import asdict
 
 from logging import getLogger
 
-from quart import Blueprint, Response
+from typing import Any, AsyncIterator
+
+from quart import Blueprint, Response, request, websocket
 
 from quart_schema import validate_request, tag
 
 from common.constants import (
     KEY_PROMPT,
-    KEY_DATA,
+    KEY_TENANT,
+    KEY_SESSION_ID,
+    KEY_BUDGET,
+    KEY_PROTOCOL,
+    ENV_SSE_PROTOCOL,
+    VALUE_SSE_PROTOCOL_DEFAULT,
+    SSE_PROTOCOL_V1,
+    SSE_PROTOCOL_V2,
+    ENV_DOCUMENT_BASE_PATH,
+    VALUE_DOCUMENT_BASE_PATH_DEFAULT,
+    EVENT_HEARTBEAT,
     TEXT_EVENT_STREAM,
     NEWLINE,
 )
-from common.exception import ObjectNotFoundException
+from common.exception import ObjectNotFoundException, ClientException
 
 from schema.process_schema import ProcessRequestSchema
 
+from repository.document_repository import DocumentRepository
+
 from graph.process_graph import ProcessGraph
 
+from metrics.instruments import sse_time_to_first_event
+
+from service.event_stream_service import EventBuffer, HeartbeatService
+from service.run_service import RunService
+from service.document_event_service import DocumentEventService
+from service.multiplex_service import MultiplexService
+
 from util.api import handle_exception_impl
+from util.sse import DeltaEncoder, encode_event_v1
 
 
 logger = getLogger(__file__)
 
 process_blueprint = Blueprint("process", __name__, url_prefix="/process")
 
+heartbeat_service = HeartbeatService()
+run_service = RunService()
+document_event_service = DocumentEventService(
+    DocumentRepository(os.getenv(ENV_DOCUMENT_BASE_PATH, VALUE_DOCUMENT_BASE_PATH_DEFAULT))
+)
+
 
 @process_blueprint.route("", methods=["POST"])
 @tag(["Document Processing"])
@@ -52,70 +82,176 @@ async def process_documents(data: ProcessRequestSchema) -> tuple[Response, dict]
     - "Apply digital signature to contracts"
 
     **Args:**
-    - data: Request body containing the natural language prompt
+    - data: Request body containing the natural language prompt and, optionally,
+      the tenant the request is made for, the session id of the conversation it
+      continues and the execution budget of the run
 
     **Returns:**
     - Server-Sent Events (SSE) stream with processing updates.
     - Content-Type: text/event-stream
-    - Each event contains JSON data with the current processing state:
+    - The event format is selected with the `protocol` query parameter (`1` or
+      `2`, `SSE_PROTOCOL` by default).
+    - Protocol 1: each event contains JSON data with the current processing state:
     ```
     data: {
+        "run_id": "...",
+        "session_id": "...",
         "prompt": "...",
-        "response": "..."
+        "response": "...",
+        "cached": false
     }
     ```
+    - `run_id` identifies the run, which can be resumed from its last checkpoint
+      with `POST /process/<run_id>/resume` if it is interrupted.
+    - `session_id` identifies the conversation. Send it with the next prompt to
+      follow up on this one: earlier turns are fed to the agent, compacted to a
+      token budget (older turns are summarized, documents are referred to by name).
+      Sessions idle for `SESSION_IDLE_SECONDS` (30 minutes by default) are evicted.
+    - `cached` is true when the response was served from the result cache of an
+      identical earlier run against unchanged documents.
+    - Set-based prompts (e.g. "... to all PDFs") are processed per document, with
+      bounded concurrency. Per-document progress is interleaved with the state
+      updates as `{"document": "...", "status": "processing|completed|failed"}`
+      events, and the responses are aggregated in the `documents` field.
+    - Documents the run writes, i.e. the output files named by its tool calls
+      (not files other runs or uploads write meanwhile), are reported live,
+      polled every `ARTIFACT_EVENTS_INTERVAL_SECONDS` (0.5 by default, `0` to
+      report them only when the run ends), as `{"artifact": "...", "status": "...", "size": ...,
+      "content_type": "...", "path": "/documents/..."}` events with the status
+      `created`, `finalized` once the file stops changing, `updated` or
+      `deleted`. The final state lists the finalized documents in `artifacts`.
+    - Protocol 2 sends typed events with increasing ids and only what changed:
+      `state` events with the fields set, merged or unset since the previous
+      state, `text` events with text appended to a field, `document` events with
+      per-document progress, `artifact` events with the documents written and a
+      final `done` event:
+    ```
+    id: 1
+    event: state
+    data: {"set": {"run_id": "...", "prompt": "..."}}
+    ```
+    - If the client disconnects, the run is cancelled: provider requests and MCP
+      tool calls in flight are aborted and their partial outputs removed. With
+      `DISCONNECT_GRACE_SECONDS` set, the run is given that long to complete in
+      the background instead, and its result can be fetched with
+      `POST /process/<run_id>/resume`.
+    - Runs are held to an execution budget: agent steps, tool calls, seconds per
+      tool call, total seconds and tokens, configured with the `BUDGET_*`
+      environment variables and per tenant with `BUDGET_TENANTS`. The `budget`
+      of the request can only tighten it, e.g. `{"max_tool_calls": 5}`. A run
+      that exceeds its budget stops with the work done so far and a
+      `{"budget": "max_tool_calls", "limit": 5, "used": 5}` event (a `budget`
+      event with protocol 2). A tool call exceeding `tool_timeout_seconds` is
+      cancelled and reported the same way, and the agent carries on without it.
+    - The agent model is picked per request from small, medium and large tiers by
+      prompt complexity (and the tenant's minimum tier), and a run that fails or
+      looks unreliable on a smaller model is retried on the next larger one.
 
     **Responses:**
     - 200: SSE stream with processing updates (text/event-stream)
     - 400: Invalid request or missing prompt
     - 500: Processing error
     """
+    started_on = time.perf_counter()
     process_data = {
         KEY_PROMPT: data.prompt,
+        KEY_TENANT: data.tenant,
+        KEY_SESSION_ID: data.session_id,
+        KEY_BUDGET: asdict(data.budget) if data.budget else None,
     }
 
-    logger.debug("Initiating processing operation using data: %s", process_data)
-
+    protocol = _get_protocol()
     graph = ProcessGraph(process_data)
 
-    async def event_stream():
-        heartbeat_interval = max(1, int(os.getenv("SSE_HEARTBEAT_SECONDS", "15")))
-        queue: asyncio.Queue[str | None] = asyncio.Queue()
+    logger.debug(
+        "Initiating processing run '%s' (tenant: %s, session: %s, prompt: %d characters).",
+        graph.run_id, data.tenant, data.session_id, len(data.prompt),
+    )
 
-        async def produce_updates():
-            try:
-                async for update in graph.stream():
-                    await queue.put(f"{KEY_DATA}: {json.dumps(update)}{NEWLINE}{NEWLINE}")
-            finally:
-                await queue.put(None)
+    return _stream_events(graph.stream(), started_on, graph.run_id, protocol)
 
-        async def send_heartbeats():
-            # Periodic SSE comment frames to keep intermediaries from timing out idle connections.
-            try:
-                while True:
-                    await asyncio.sleep(heartbeat_interval)
-                    await queue.put(f": keep-alive{NEWLINE}{NEWLINE}")
-            except asyncio.CancelledError:
-                return
 
-        producer_task = asyncio.create_task(produce_updates())
-        heartbeat_task = asyncio.create_task(send_heartbeats())
+@process_blueprint.route("/<string:run_id>/resume", methods=["POST"])
+@tag(["Document Processing"])
+async def resume_processing(run_id: str) -> Response:
+    """
+    Resume an interrupted processing run from its last checkpoint.
 
-        try:
-            while True:
-                chunk = await queue.get()
-                if chunk is None:
-                    break
-                yield chunk
-        finally:
-            heartbeat_task.cancel()
-            producer_task.cancel()
-            await asyncio.gather(heartbeat_task, producer_task, return_exceptions=True)
+    Runs are checkpointed after every graph node and every agent step, so a run
+    interrupted by a worker restart or a crash continues where it stopped, without
+    redoing completed document operations. Checkpoints are kept for
+    `CHECKPOINT_RETENTION_SECONDS` (7 days by default).
 
-    return Response(event_stream(), content_type=TEXT_EVENT_STREAM)
+    **Args:**
+    - run_id: Id of the run, as sent in the `run_id` field of its events
+
+    **Returns:**
+    - Server-Sent Events (SSE) stream with the processing updates of the rest of
+      the run, in the same format as `POST /process`, including the `protocol`
+      query parameter. A run that has completed already streams its final state,
+      and a run still finishing in the background after its client disconnected
+      is waited for.
+
+    **Responses:**
+    - 200: SSE stream with processing updates (text/event-stream)
+    - 400: Checkpointing is disabled
+    - 404: Run not found
+    """
+    started_on = time.perf_counter()
+
+    logger.debug("Resuming processing run: %s", run_id)
+
+    protocol = _get_protocol()
+
+    # Fail with an error response, rather than an empty stream, if the run cannot be resumed.
+    await ProcessGraph.check_resumable(run_id)
+
+    async def resumed_updates():
+        await run_service.wait_for(run_id)
+
+        async for update in ProcessGraph(run_id=run_id).stream(resume=True):
+            yield update
+
+    return _stream_events(resumed_updates(), started_on, run_id, protocol)
+
+
+@process_blueprint.websocket("/ws")
+async def process_documents_websocket() -> None:
+    """
+    Start, observe and cancel many processing runs over a single WebSocket connection.
+
+    Messages are JSON objects with a `type`. Client messages:
+    - `{"type": "start", "prompt": "...", "ref": "..."}`: start a run, with the
+      fields of `POST /process` (`tenant`, `session_id`, `budget`), an optional
+      `ref` echoed in the `started` reply and an optional flow control `window`.
+    - `{"type": "resume", "run_id": "..."}`: resume a run, as with
+      `POST /process/<run_id>/resume`.
+    - `{"type": "cancel", "run_id": "..."}`: cancel a run.
+    - `{"type": "ack", "run_id": "...", "count": 1}`: acknowledge events of a run.
+    - `{"type": "subscribe", "topic": "documents"}` (and `unsubscribe`): be
+      notified of documents created, modified or deleted.
+
+    Server messages:
+    - `{"type": "started", "run_id": "...", "ref": "..."}`
+    - `{"type": "event", "run_id": "...", "id": 1, "event": "state", "data": {...}}`:
+      the events of SSE protocol 2 (`state`, `text`, `document`, `budget`, `artifact`, `done`).
+    - `{"type": "cancelled", "run_id": "..."}` and `{"type": "error", "run_id": "...", "message": "..."}`
+    - `{"type": "documents", "changed": [...], "deleted": [...]}`, with the
+      document metadata of `GET /documents`.
+
+    Flow control is per run: at most `window` (`WS_RUN_WINDOW`, 16 by default)
+    events of a run are sent ahead of its acknowledgements, while its updates
+    wait in a buffer with the SSE overflow policy. A connection can observe up to
+    `WS_MAX_RUNS` runs at once. When the connection closes, its runs are
+    cancelled, or finish in the background with `DISCONNECT_GRACE_SECONDS` set.
+    """
+    await websocket.accept()
+
+    await MultiplexService(websocket.send, run_service, document_event_service).serve(websocket.receive)
 
 
 @process_blueprint.errorhandler(ObjectNotFoundException)
+@process_blueprint.errorhandler(ClientException)
 def handle_exception(exception: Exception) -> tuple[dict, int]:
     """
     Handle exceptions thrown during execution.
@@ -130,3 +266,102 @@ def handle_exception(exception: Exception) -> tuple[dict, int]:
         exception=exception,
         logger=logger,
     )
+
+
+def _get_protocol() -> str:
+    """
+    Get the SSE protocol requested with the `protocol` query parameter.
+
+    Returns:
+        str: The protocol.
+
+    Raises:
+        ClientException: If the protocol is not supported.
+    """
+    protocol = request.args.get(KEY_PROTOCOL, os.getenv(ENV_SSE_PROTOCOL, VALUE_SSE_PROTOCOL_DEFAULT))
+
+    if protocol not in (SSE_PROTOCOL_V1, SSE_PROTOCOL_V2):
+        raise ClientException(f"Unsupported SSE protocol: {protocol}")
+
+    return protocol
+
+
+def _stream_events(
+    updates: AsyncIterator[tuple[str, dict[str, Any]]],
+    started_on: float,
+    run_id: str,
+    protocol: str = SSE_PROTOCOL_V1,
+) -> Response:
+    """
+    Stream graph updates as Server-Sent Events, interleaved with heartbeats.
+
+    Updates are passed through a bounded buffer, so that a slow client cannot
+    make the queued updates grow without limit, and encoded as they are sent.
+    Heartbeats are sent by the shared heartbeat service on idle streams only.
+
+    When the stream ends before the run does, i.e. the client disconnected, the
+    run is cancelled, or left to finish in the background for up to
+    `DISCONNECT_GRACE_SECONDS`.
+
+    Args:
+        updates (AsyncIterator[tuple[str, dict[str, Any]]]): The graph updates and their stream modes.
+        started_on (float): When the request was received, per `time.perf_counter`.
+        run_id (str): Id of the run.
+        protocol (str): The SSE protocol, full updates (1) or deltas (2).
+
+    Returns:
+        Response: The SSE response.
+    """
+    async def event_stream():
+        buffer = EventBuffer()
+        encoder = DeltaEncoder() if protocol == SSE_PROTOCOL_V2 else None
+        completed = False
+
+        async def produce_updates():
+            nonlocal completed
+
+            try:
+                async for mode, update in updates:
+                    await buffer.put(mode, update)
+
+                completed = True
+            finally:
+                buffer.close()
+
+        producer_task = asyncio.create_task(produce_updates())
+        heartbeat_service.register(buffer)
+
+        first_event = True
+
+        try:
+            while (item := await buffer.get()) is not None:
+                mode, update = item
+
+                if mode == EVENT_HEARTBEAT:
+                    # SSE comment frame to keep intermediaries from timing out idle connections.
+                    yield f": keep-alive{NEWLINE}{NEWLINE}"
+
+                    continue
+
+                chunk = encoder.encode(mode, update) if encoder else encode_event_v1(update)
+
+                if not chunk:
+                    continue
+
+                if first_event:
+                    sse_time_to_first_event.observe(time.perf_counter() - started_on)
+                    first_event = False
+
+                yield chunk
+
+            if encoder and completed and not buffer.overflowed:
+                yield encoder.encode_done()
+        finally:
+            heartbeat_service.unregister(buffer)
+            # Updates produced from now on are dropped.
+            buffer.discard()
+
+            await run_service.release(run_id, producer_task)
+
+    return Response(event_stream(), content_type=TEXT_EVENT_STREAM)
+
@@ -0,0 +1,301 @@
+"""
+In-process cache of resource files and directory listings.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+import pathlib
+
+from collections import OrderedDict
+
+from dataclasses import dataclass
+
+from typing import Optional, Union
+
+from common.constants import (
+    ENCODING_UTF8,
+    ENV_RESOURCE_CACHE_MAX_BYTES,
+    ENV_RESOURCE_CACHE_VALIDATE_SECONDS,
+    VALUE_RESOURCE_CACHE_MAX_BYTES_DEFAULT,
+    VALUE_RESOURCE_CACHE_VALIDATE_SECONDS_DEFAULT,
+    RESOURCE_CACHE_HIT,
+    RESOURCE_CACHE_MISS,
+)
+
+from metrics.instruments import resource_cache_requests
+
+
+logger = getLogger(__name__)
+
+# Estimated size of a directory listing entry beyond its name, in bytes
+LISTING_ENTRY_OVERHEAD = 64
+
+
+@dataclass
+class CachedResource:
+    """
+    Cached content of a resource file or listing of a resource directory.
+
+    Attributes:
+        value: Text of the file or sorted names of the children of the directory.
+        mtime_ns: Modification time of the file or directory when cached.
+        size: Size of the file or directory when cached.
+        cost: Estimated memory taken by the value, in bytes.
+        validated_on: Monotonic time the entry was last checked against the filesystem.
+    """
+
+    value: Union[str, list[str]]
+    mtime_ns: int
+    size: int
+    cost: int
+    validated_on: float
+
+
+class ResourceCache:
+    """
+    Bounded LRU cache of resource files and directory listings.
+
+    An entry is checked against the modification time and size of its file or
+    directory at most every `RESOURCE_CACHE_VALIDATE_SECONDS`, so repeated
+    reads in between cost a dict lookup. Entries are evicted, least recently
+    used first, once the cache exceeds `RESOURCE_CACHE_MAX_BYTES`; a
+    resource larger than that is never cached.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = None,
+        validate_seconds: float = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Memory budget of the cache, 0 disables the cache.
+            validate_seconds (float): Time during which an entry is served without
+                checking the filesystem, 0 to check on every read.
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv(ENV_RESOURCE_CACHE_MAX_BYTES, str(VALUE_RESOURCE_CACHE_MAX_BYTES_DEFAULT))
+        )
+        self.validate_seconds = validate_seconds if validate_seconds is not None else float(
+            os.getenv(ENV_RESOURCE_CACHE_VALIDATE_SECONDS, str(VALUE_RESOURCE_CACHE_VALIDATE_SECONDS_DEFAULT))
+        )
+        self.entries: OrderedDict[tuple[str, str], CachedResource] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def read_text(
+        self,
+        path: str,
+        encoding: str = ENCODING_UTF8,
+    ) -> str:
+        """
+        Read a text file.
+
+        Args:
+            path (str): Absolute path of the file.
+            encoding (str): The encoding of the file.
+
+        Returns:
+            str: The contents of the file.
+
+        Raises:
+            OSError: If the file cannot be read.
+            UnicodeDecodeError: If the file cannot be decoded.
+        """
+        key = (path, encoding)
+        entry = self._get(key, path)
+
+        if entry is not None:
+            return entry.value
+
+        stat = os.stat(path)
+        content = pathlib.Path(path).read_text(encoding=encoding)
+
+        self._put(key, content, stat, len(content))
+
+        return content
+
+    def list_children(self, path: str) -> list[str]:
+        """
+        List the names of the children of a directory, sorted.
+
+        Args:
+            path (str): Absolute path of the directory.
+
+        Returns:
+            list[str]: Names of the children, empty if the directory does not exist.
+        """
+        key = (path, "")
+        entry = self._get(key, path)
+
+        if entry is not None:
+            return list(entry.value)
+
+        try:
+            stat = os.stat(path)
+            names = sorted(os.listdir(path))
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+        self._put(key, names, stat, sum(len(name) + LISTING_ENTRY_OVERHEAD for name in names))
+
+        return list(names)
+
+    def invalidate(self, path: str) -> None:
+        """
+        Drop the entries of a file, and the listing of its directory.
+
+        Args:
+            path (str): Absolute path of the file.
+        """
+        parent = str(pathlib.Path(path).parent)
+
+        for key in [key for key in self.entries if key[0] in (path, parent)]:
+            self._evict(key)
+
+    def clear(self) -> None:
+        """
+        Clear the cache.
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def preload(self, manifest_path: str, base_path: str) -> int:
+        """
+        Load the resources listed in a manifest into the cache.
+
+        The manifest lists one resource per line, relative to the base path, and
+        may use glob patterns; blank lines and lines starting with '#' are ignored.
+
+        Args:
+            manifest_path (str): Absolute path of the manifest.
+            base_path (str): Absolute path the resources are relative to.
+
+        Returns:
+            int: Number of resources loaded.
+        """
+        loaded = 0
+        base = pathlib.Path(base_path)
+
+        for line in self.read_text(manifest_path).splitlines():
+            pattern = line.strip()
+
+            if not pattern or pattern.startswith("#"):
+                continue
+
+            for path in sorted(base.glob(pattern)):
+                try:
+                    if path.is_dir():
+                        self.list_children(str(path.resolve()))
+                    else:
+                        self.read_text(str(path.resolve()))
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.warning("Could not preload resource '%s': %s", path, e)
+
+                    continue
+
+                loaded += 1
+
+        logger.info("Preloaded %d resources listed in: %s", loaded, manifest_path)
+
+        return loaded
+
+    def _get(
+        self,
+        key: tuple[str, str],
+        path: str,
+    ) -> Optional[CachedResource]:
+        """
+        Get a valid entry, dropping it if its file or directory changed.
+
+        Args:
+            key (tuple[str, str]): Key of the entry.
+            path (str): Absolute path of the file or directory.
+
+        Returns:
+            Optional[CachedResource]: The entry or None on a miss.
+        """
+        entry = self.entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None and now - entry.validated_on >= self.validate_seconds:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+
+            if stat is None or (stat.st_mtime_ns, stat.st_size) != (entry.mtime_ns, entry.size):
+                logger.debug("Resource changed, discarding cached copy: %s", path)
+
+                self._evict(key)
+
+                entry = None
+            else:
+                entry.validated_on = now
+
+        if entry is None:
+            self.misses += 1
+            resource_cache_requests.inc(RESOURCE_CACHE_MISS)
+
+            return None
+
+        self.hits += 1
+        resource_cache_requests.inc(RESOURCE_CACHE_HIT)
+        self.entries.move_to_end(key)
+
+        return entry
+
+    def _put(
+        self,
+        key: tuple[str, str],
+        value: Union[str, list[str]],
+        stat: os.stat_result,
+        cost: int,
+    ) -> None:
+        """
+        Cache an entry, evicting the least recently used ones if the cache is full.
+
+        Args:
+            key (tuple[str, str]): Key of the entry.
+            value (Union[str, list[str]]): The value.
+            stat (os.stat_result): Status of the file or directory, taken before reading it.
+            cost (int): Estimated memory taken by the value, in bytes.
+        """
+        if self.max_bytes <= 0 or cost > self.max_bytes:
+            return
+
+        self._evict(key)
+
+        self.entries[key] = CachedResource(
+            value=value,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            cost=cost,
+            validated_on=time.monotonic(),
+        )
+        self.size += cost
+
+        while self.size > self.max_bytes:
+            self._evict(next(iter(self.entries)))
+
+    def _evict(self, key: tuple[str, str]) -> None:
+        """
+        Remove an entry from the cache.
+
+        Args:
+            key (tuple[str, str]): Key of the entry.
+        """
+        entry = self.entries.pop(key, None)
+
+        if entry is not None:
+            self.size -= entry.cost
+
+
+resource_cache = ResourceCache()
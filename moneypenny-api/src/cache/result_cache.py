@@ -0,0 +1,386 @@
+"""
+Result cache for repeated processing prompts.
+"""
+
+from logging import getLogger
+
+import os
+
+import re
+
+import json
+
+import time
+
+import hashlib
+
+from collections import OrderedDict
+
+from dataclasses import dataclass, field
+
+from typing import Callable, Optional
+
+from langchain_core.tools import BaseTool
+
+from common.constants import (
+    ENCODING_UTF8,
+    KEY_RESPONSE,
+    KEY_OUTPUTS,
+    KEY_EXPIRES_ON,
+    NAMESPACE_RESULTS,
+    NAMESPACE_RESULT_OUTPUTS,
+    ENV_RESULT_CACHE_TTL_SECONDS,
+    ENV_RESULT_CACHE_MAX_ENTRIES,
+    VALUE_RESULT_CACHE_TTL_SECONDS_DEFAULT,
+    VALUE_RESULT_CACHE_MAX_ENTRIES_DEFAULT,
+)
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+from cache.shared_store import SharedStore
+
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CachedResult:
+    """
+    Result of a processing run.
+
+    Attributes:
+        response: The final response of the run.
+        outputs: Output files of the run, mapped to their size.
+        expires_on: Monotonic time after which the result is discarded.
+    """
+
+    response: str
+    outputs: dict[str, int] = field(default_factory=dict)
+    expires_on: float = 0.0
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of processing results.
+
+    Results are keyed on the normalized prompt, the model, the toolset version and
+    a fingerprint of the documents the prompt refers to. A result is only served
+    while all the output files it reported still exist unchanged. The outputs of
+    cached results are left out of the fingerprints, so that they do not keep a
+    repeated prompt from hitting.
+
+    With a shared store, results are written through to it and local misses are
+    looked up in it, so that a result computed by one worker is served by all.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = None,
+        max_entries: int = None,
+        store: Optional[SharedStore] = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl_seconds (float): Time to live of a result, 0 disables the cache.
+            max_entries (int): Maximum number of cached results.
+            store (Optional[SharedStore]): Store shared with the other workers.
+        """
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv(ENV_RESULT_CACHE_TTL_SECONDS, str(VALUE_RESULT_CACHE_TTL_SECONDS_DEFAULT))
+        )
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv(ENV_RESULT_CACHE_MAX_ENTRIES, str(VALUE_RESULT_CACHE_MAX_ENTRIES_DEFAULT))
+        )
+        self.store = store
+        self.entries: OrderedDict[str, CachedResult] = OrderedDict()
+        # Output files of the cached results, mapped to the monotonic time they expire on
+        self.outputs: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether the cache is enabled.
+        """
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(
+        self,
+        key: str,
+        repository: DocumentRepository,
+    ) -> Optional[CachedResult]:
+        """
+        Get a cached result.
+
+        Args:
+            key (str): The cache key.
+            repository (DocumentRepository): Repository used to check the outputs.
+
+        Returns:
+            Optional[CachedResult]: The cached result or None on a miss.
+        """
+        result = self.entries.get(key) or self._load(key)
+
+        if result is None:
+            return None
+
+        if time.monotonic() >= result.expires_on:
+            logger.debug("Cached result expired: %s", key)
+
+            del self.entries[key]
+
+            return None
+
+        for name, size in result.outputs.items():
+            document = repository.get_document(name)
+
+            if document is None or document.size != size:
+                logger.debug("Output '%s' of cached result changed, discarding: %s", name, key)
+
+                del self.entries[key]
+
+                if self.store is not None:
+                    self.store.delete(NAMESPACE_RESULTS, key)
+
+                return None
+
+        self.entries.move_to_end(key)
+
+        return result
+
+    def put(
+        self,
+        key: str,
+        response: str,
+        outputs: list[Document],
+    ) -> None:
+        """
+        Cache a result, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            response (str): The final response of the run.
+            outputs (list[Document]): Output files of the run.
+        """
+        if not self.enabled:
+            return
+
+        result = CachedResult(
+            response=response,
+            outputs={document.name: document.size for document in outputs},
+            expires_on=time.monotonic() + self.ttl_seconds,
+        )
+
+        self._cache(key, result)
+
+        for name in result.outputs:
+            self.outputs[name] = result.expires_on
+
+            if self.store is not None:
+                self.store.put(NAMESPACE_RESULT_OUTPUTS, name, True, ttl_seconds=self.ttl_seconds)
+
+        if self.store is not None:
+            self.store.put(
+                NAMESPACE_RESULTS,
+                key,
+                {
+                    KEY_RESPONSE: result.response,
+                    KEY_OUTPUTS: result.outputs,
+                    KEY_EXPIRES_ON: time.time() + self.ttl_seconds,
+                },
+                ttl_seconds=self.ttl_seconds,
+                max_entries=self.max_entries,
+            )
+
+    def clear(self) -> None:
+        """
+        Clear the cache.
+        """
+        self.entries.clear()
+        self.outputs.clear()
+
+        if self.store is not None:
+            self.store.delete(NAMESPACE_RESULTS)
+            self.store.delete(NAMESPACE_RESULT_OUTPUTS)
+
+    def is_output(self, name: str) -> bool:
+        """
+        Check whether a document is an output of a cached result, of this worker or another.
+
+        Args:
+            name (str): Name of the document.
+
+        Returns:
+            bool: Whether the document is an output.
+        """
+        if self.outputs.get(name, 0.0) > time.monotonic():
+            return True
+
+        if self.store is not None and self.store.get(NAMESPACE_RESULT_OUTPUTS, name) is not None:
+            self.outputs[name] = time.monotonic() + self.ttl_seconds
+
+            return True
+
+        return False
+
+    def _cache(
+        self,
+        key: str,
+        result: CachedResult,
+    ) -> None:
+        """
+        Cache a result locally, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            result (CachedResult): The result.
+        """
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[CachedResult]:
+        """
+        Load a result another worker cached into the local cache.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[CachedResult]: The result or None on a miss.
+        """
+        stored = self.store.get(NAMESPACE_RESULTS, key) if self.store is not None else None
+
+        if stored is None:
+            return None
+
+        result = CachedResult(
+            response=stored[KEY_RESPONSE],
+            outputs=stored[KEY_OUTPUTS],
+            expires_on=time.monotonic() + stored[KEY_EXPIRES_ON] - time.time(),
+        )
+
+        self._cache(key, result)
+
+        return result
+
+    def get_key(
+        self,
+        prompt: str,
+        model: str,
+        tools: list[BaseTool],
+        repository: DocumentRepository,
+    ) -> str:
+        """
+        Get the cache key of a processing run.
+
+        Args:
+            prompt (str): The prompt.
+            model (str): The model.
+            tools (list[BaseTool]): The tools available to the agent.
+            repository (DocumentRepository): The document repository.
+
+        Returns:
+            str: The cache key.
+        """
+        identity = [
+            normalize_prompt(prompt),
+            model,
+            get_toolset_version(tools),
+            get_document_fingerprint(prompt, repository, self.is_output),
+        ]
+
+        return hashlib.sha256(json.dumps(identity).encode(ENCODING_UTF8)).hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt: case, surrounding punctuation and whitespace are ignored.
+
+    Args:
+        prompt (str): The prompt.
+
+    Returns:
+        str: The normalized prompt.
+    """
+    return re.sub(r"\s+", " ", prompt).strip(" .!").lower()
+
+
+def get_toolset_version(tools: list[BaseTool]) -> str:
+    """
+    Get a version of a toolset that changes whenever a tool or its schema does.
+
+    Args:
+        tools (list[BaseTool]): The tools.
+
+    Returns:
+        str: The toolset version.
+    """
+    identity = sorted(
+        json.dumps([tool.name, tool.description, tool.args], sort_keys=True, default=str)
+        for tool in tools
+    )
+
+    return hashlib.sha256(json.dumps(identity).encode(ENCODING_UTF8)).hexdigest()
+
+
+def is_named(
+    prompt: str,
+    name: str,
+) -> bool:
+    """
+    Check whether a prompt names a document, as a whole word or path, so that
+    e.g. "a.pdf" is not named by "data.pdf".
+
+    Args:
+        prompt (str): The prompt.
+        name (str): Name of the document.
+
+    Returns:
+        bool: Whether the prompt names the document.
+    """
+    return re.search(rf"(?<![\w.-]){re.escape(name)}(?![\w-]|\.\w)", prompt, re.IGNORECASE) is not None
+
+
+def get_document_fingerprint(
+    prompt: str,
+    repository: DocumentRepository,
+    is_output: Callable[[str], bool] = None,
+) -> str:
+    """
+    Get a fingerprint of the documents a prompt refers to.
+
+    Documents named in the prompt are fingerprinted by content. If the prompt
+    names no document, every input document, i.e. every document but the
+    outputs of earlier runs, is fingerprinted by name, size and modification
+    time instead.
+
+    Args:
+        prompt (str): The prompt.
+        repository (DocumentRepository): The document repository.
+        is_output (Callable[[str], bool]): Checks whether a document is an output of an earlier run.
+
+    Returns:
+        str: The fingerprint.
+    """
+    documents = repository.list_documents()
+    referenced = [document for document in documents if is_named(prompt, document.name)]
+
+    if referenced:
+        identity = sorted(
+            [document.name, repository.get_document_digest(document.name)]
+            for document in referenced
+        )
+    else:
+        identity = sorted(
+            [document.name, document.size, document.modified_on.isoformat()]
+            for document in documents
+            if is_output is None or not is_output(document.name)
+        )
+
+    return hashlib.sha256(json.dumps(identity).encode(ENCODING_UTF8)).hexdigest()
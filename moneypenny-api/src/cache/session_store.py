@@ -0,0 +1,338 @@
+"""
+Store of conversation sessions, with bounded and compacted message history.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+from collections import OrderedDict
+
+from dataclasses import dataclass, field
+
+from typing import Optional
+
+from common.constants import (
+    KEY_ROLE,
+    KEY_CONTENT,
+    VALUE_USER,
+    VALUE_ASSISTANT,
+    VALUE_SYSTEM,
+    ENV_SESSION_MAX_TOKENS,
+    ENV_SESSION_IDLE_SECONDS,
+    ENV_SESSION_MAX_SESSIONS,
+    VALUE_SESSION_MAX_TOKENS_DEFAULT,
+    VALUE_SESSION_IDLE_SECONDS_DEFAULT,
+    VALUE_SESSION_MAX_SESSIONS_DEFAULT,
+)
+
+from domain.document import Document
+
+
+logger = getLogger(__name__)
+
+# Longest response kept in a turn, in characters
+MAX_RESPONSE_CHARS = 1000
+
+# Longest prompt or response kept in a summary line, in characters
+MAX_SUMMARY_CHARS = 160
+
+
+@dataclass
+class Turn:
+    """
+    A compacted turn of a conversation.
+
+    Attributes:
+        prompt: The prompt.
+        response: The final response, truncated.
+        artifacts: Documents the turn created or modified, mapped to their size.
+    """
+
+    prompt: str
+    response: str
+    artifacts: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def tokens(self) -> int:
+        """
+        Estimated number of tokens of the turn in a prompt.
+        """
+        return estimate_tokens(self.prompt) + estimate_tokens(self.get_answer())
+
+    def get_answer(self) -> str:
+        """
+        Get the answer of the turn as shown to the model: the response followed by
+        references to the documents it created or modified.
+        """
+        if not self.artifacts:
+            return self.response
+
+        references = ", ".join(f"{name} ({size} bytes)" for name, size in self.artifacts.items())
+
+        return f"{self.response}\nDocuments created or modified: {references}"
+
+    def summarize(self) -> str:
+        """
+        Summarize the turn in a single line.
+        """
+        line = f"- Asked: {shorten(self.prompt)} Answered: {shorten(self.response)}"
+
+        if self.artifacts:
+            line += f" Documents: {', '.join(self.artifacts)}"
+
+        return line
+
+
+@dataclass
+class Session:
+    """
+    A conversation session.
+
+    Attributes:
+        session_id: Id of the session.
+        turns: Recent turns, in full.
+        summary: One line per older turn, oldest first.
+        omitted: Number of turns dropped from the summary.
+        used_on: Monotonic time the session was last used.
+    """
+
+    session_id: str
+    turns: list[Turn] = field(default_factory=list)
+    summary: list[str] = field(default_factory=list)
+    omitted: int = 0
+    used_on: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        """
+        Estimated number of tokens of the history in a prompt.
+        """
+        return sum(turn.tokens for turn in self.turns) + sum(estimate_tokens(line) for line in self.summary)
+
+
+class SessionStore:
+    """
+    In-memory LRU store of conversation sessions.
+
+    The history of a session is kept within a token budget: once it is exceeded,
+    the oldest turns are folded into a summary of one line per turn, and the
+    oldest summary lines are dropped once the summary takes more than a quarter
+    of the budget. Turns keep the final response of the agent only, never the
+    payloads of its tool calls, and refer to the documents they created or
+    modified by name. Sessions idle for longer than the idle timeout are evicted,
+    as are the least recently used sessions once the store is full.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = None,
+        idle_seconds: float = None,
+        max_sessions: int = None,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_tokens (int): Token budget of the history of a session, 0 disables sessions.
+            idle_seconds (float): Time after which an idle session is evicted.
+            max_sessions (int): Maximum number of sessions.
+        """
+        self.max_tokens = max_tokens if max_tokens is not None else int(
+            os.getenv(ENV_SESSION_MAX_TOKENS, str(VALUE_SESSION_MAX_TOKENS_DEFAULT))
+        )
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(
+            os.getenv(ENV_SESSION_IDLE_SECONDS, str(VALUE_SESSION_IDLE_SECONDS_DEFAULT))
+        )
+        self.max_sessions = max_sessions if max_sessions is not None else int(
+            os.getenv(ENV_SESSION_MAX_SESSIONS, str(VALUE_SESSION_MAX_SESSIONS_DEFAULT))
+        )
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether sessions are enabled.
+        """
+        return self.max_tokens > 0 and self.max_sessions > 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """
+        Get a session.
+
+        Args:
+            session_id (str): Id of the session.
+
+        Returns:
+            Optional[Session]: The session or None if unknown or evicted.
+        """
+        self._evict_idle()
+
+        session = self.sessions.get(session_id)
+
+        if session is not None:
+            session.used_on = time.monotonic()
+            self.sessions.move_to_end(session_id)
+
+        return session
+
+    def get_messages(self, session_id: str) -> list[dict[str, str]]:
+        """
+        Get the history of a session as messages to prepend to the next prompt.
+
+        Args:
+            session_id (str): Id of the session.
+
+        Returns:
+            list[dict[str, str]]: The messages, empty for a new session.
+        """
+        session = self.get(session_id) if self.enabled and session_id else None
+
+        if session is None:
+            return []
+
+        messages = []
+
+        if session.summary:
+            lines = list(session.summary)
+
+            if session.omitted:
+                lines.insert(0, f"- ({session.omitted} earlier turns omitted)")
+
+            messages.append({
+                KEY_ROLE: VALUE_SYSTEM,
+                KEY_CONTENT: "Summary of the earlier turns of this conversation:\n" + "\n".join(lines),
+            })
+
+        for turn in session.turns:
+            messages.append({KEY_ROLE: VALUE_USER, KEY_CONTENT: turn.prompt})
+            messages.append({KEY_ROLE: VALUE_ASSISTANT, KEY_CONTENT: turn.get_answer()})
+
+        return messages
+
+    def append(
+        self,
+        session_id: str,
+        prompt: str,
+        response: Optional[str],
+        artifacts: list[Document],
+    ) -> None:
+        """
+        Append a turn to a session, creating the session if needed, and compact its history.
+
+        Args:
+            session_id (str): Id of the session.
+            prompt (str): The prompt.
+            response (Optional[str]): The final response.
+            artifacts (list[Document]): Documents the turn created or modified.
+        """
+        if not self.enabled or not session_id:
+            return
+
+        session = self.get(session_id)
+
+        if session is None:
+            session = Session(session_id=session_id, used_on=time.monotonic())
+            self.sessions[session_id] = session
+
+        response = response or ""
+
+        if len(response) > MAX_RESPONSE_CHARS:
+            response = response[:MAX_RESPONSE_CHARS] + "…"
+
+        session.turns.append(
+            Turn(
+                prompt=prompt,
+                response=response,
+                artifacts={document.name: document.size for document in artifacts},
+            )
+        )
+
+        self._compact(session)
+
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Delete a session.
+
+        Args:
+            session_id (str): Id of the session.
+
+        Returns:
+            bool: Whether the session existed.
+        """
+        return self.sessions.pop(session_id, None) is not None
+
+    def clear(self) -> None:
+        """
+        Clear the store.
+        """
+        self.sessions.clear()
+
+    def _compact(self, session: Session) -> None:
+        """
+        Fold the oldest turns of a session into its summary until its history fits the budget.
+
+        The latest turn is always kept in full.
+
+        Args:
+            session (Session): The session.
+        """
+        while session.tokens > self.max_tokens and len(session.turns) > 1:
+            session.summary.append(session.turns.pop(0).summarize())
+
+        while session.summary and sum(estimate_tokens(line) for line in session.summary) > self.max_tokens // 4:
+            session.summary.pop(0)
+            session.omitted += 1
+
+    def _evict_idle(self) -> None:
+        """
+        Evict the sessions idle for longer than the idle timeout.
+        """
+        cutoff = time.monotonic() - self.idle_seconds
+
+        # Sessions are ordered by last use, so the idle ones are at the front.
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+
+            if session.used_on >= cutoff:
+                break
+
+            logger.debug("Evicting idle session: %s", session_id)
+
+            del self.sessions[session_id]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text, at four characters per token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+def shorten(text: str) -> str:
+    """
+    Shorten a text to a single line of at most `MAX_SUMMARY_CHARS` characters.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The shortened text.
+    """
+    text = " ".join(text.split())
+
+    return text if len(text) <= MAX_SUMMARY_CHARS else text[:MAX_SUMMARY_CHARS - 1] + "…"
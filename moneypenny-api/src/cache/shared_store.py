@@ -0,0 +1,242 @@
+"""
+Store shared by the workers of a host.
+"""
+
+from logging import getLogger
+
+import os
+
+import json
+
+import time
+
+import sqlite3
+
+import threading
+
+from typing import Any, Optional
+
+from common.constants import (
+    DIR_CACHE,
+    DIR_SHARED,
+    FILE_SHARED_STORE,
+    ENV_SHARED_STORE_PATH,
+)
+
+from util.path import get_resource_path
+
+
+logger = getLogger(__name__)
+
+# Seconds a worker waits for another one to release the database
+BUSY_TIMEOUT_SECONDS = 5
+
+
+class SharedStore:
+    """
+    Key-value store shared by the workers of a host, in a local SQLite database
+    at `SHARED_STORE_PATH`.
+
+    Values are JSON, grouped in namespaces and optionally expire. Leases let one
+    worker claim a piece of work, e.g. spawning an MCP server, while the others
+    wait for its result. The store is an optimization: when the database cannot
+    be used, reads miss, writes are dropped and leases are granted.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Initialize the store.
+
+        Args:
+            path (str): Path of the database.
+        """
+        self.path = path or os.getenv(ENV_SHARED_STORE_PATH) or get_resource_path(
+            DIR_CACHE, DIR_SHARED, FILE_SHARED_STORE, ensure_parent_exists=True,
+        )
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        namespace: str,
+        key: str,
+    ) -> Optional[Any]:
+        """
+        Get a value.
+
+        Args:
+            namespace (str): Namespace of the value.
+            key (str): Key of the value.
+
+        Returns:
+            Optional[Any]: The value or None if missing or expired.
+        """
+        row = self._execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND (expires_on = 0 OR expires_on > ?)",
+            (namespace, key, time.time()),
+        )
+
+        return json.loads(row[0]) if row else None
+
+    def put(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        ttl_seconds: float = 0,
+        max_entries: int = 0,
+    ) -> None:
+        """
+        Put a value, purging the expired values of the namespace and evicting its
+        oldest values if it is full.
+
+        Args:
+            namespace (str): Namespace of the value.
+            key (str): Key of the value.
+            value (Any): The value, serializable to JSON.
+            ttl_seconds (float): Time to live of the value, 0 for no expiry.
+            max_entries (int): Maximum number of values in the namespace, 0 for no limit.
+        """
+        now = time.time()
+
+        self._execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, stored_on, expires_on) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), now, now + ttl_seconds if ttl_seconds > 0 else 0),
+        )
+
+        self._execute(
+            "DELETE FROM entries WHERE namespace = ? AND expires_on > 0 AND expires_on <= ?",
+            (namespace, now),
+        )
+
+        if max_entries > 0:
+            self._execute(
+                "DELETE FROM entries WHERE namespace = ? AND key NOT IN "
+                "(SELECT key FROM entries WHERE namespace = ? ORDER BY stored_on DESC LIMIT ?)",
+                (namespace, namespace, max_entries),
+            )
+
+    def delete(
+        self,
+        namespace: str,
+        key: str = None,
+    ) -> None:
+        """
+        Delete a value, or all values of a namespace.
+
+        Args:
+            namespace (str): Namespace of the value.
+            key (str): Key of the value, None for the whole namespace.
+        """
+        if key is None:
+            self._execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        else:
+            self._execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def acquire(
+        self,
+        name: str,
+        ttl_seconds: float,
+    ) -> bool:
+        """
+        Acquire a lease, unless another worker holds it.
+
+        Args:
+            name (str): Name of the lease.
+            ttl_seconds (float): Time after which the lease lapses if not released.
+
+        Returns:
+            bool: Whether the lease was acquired.
+        """
+        now = time.time()
+        acquired = self._execute(
+            "INSERT INTO leases (name, owner, expires_on) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_on = excluded.expires_on "
+            "WHERE leases.owner = excluded.owner OR leases.expires_on <= ?",
+            (name, self.owner, now + ttl_seconds, now),
+            changes=True,
+        )
+
+        return acquired is None or acquired > 0
+
+    def release(self, name: str) -> None:
+        """
+        Release a lease held by this worker.
+
+        Args:
+            name (str): Name of the lease.
+        """
+        self._execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def close(self) -> None:
+        """
+        Close the database connection of this worker.
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _execute(
+        self,
+        statement: str,
+        parameters: tuple,
+        changes: bool = False,
+    ) -> Any:
+        """
+        Execute a statement, connecting to the database first if needed.
+
+        Args:
+            statement (str): The SQL statement.
+            parameters (tuple): Parameters of the statement.
+            changes (bool): Whether to return the number of changed rows instead of the first row.
+
+        Returns:
+            Any: The first row or the number of changed rows, None if the database cannot be used.
+        """
+        with self.lock:
+            try:
+                if self.connection is None:
+                    self.connection = self._connect()
+
+                cursor = self.connection.execute(statement, parameters)
+
+                return cursor.rowcount if changes else cursor.fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Shared store '%s' unavailable: %s", self.path, e)
+
+                return None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connect to the database, creating its tables if needed.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        connection = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+
+        # Readers do not block the writer, nor the writer the readers
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "stored_on REAL NOT NULL, expires_on REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_on REAL NOT NULL)"
+        )
+
+        logger.debug("Connected to the shared store: %s", self.path)
+
+        return connection
+
+
+shared_store = SharedStore()
@@ -0,0 +1,370 @@
+"""
+Result cache for deterministic MCP tool calls.
+"""
+
+from logging import getLogger
+
+import os
+
+import json
+
+import shutil
+
+import asyncio
+
+import hashlib
+
+from collections import OrderedDict
+
+from pathlib import Path
+
+from typing import Annotated, Any, Optional
+
+from langchain_core.tools import BaseTool, InjectedToolArg, StructuredTool
+
+from common.constants import (
+    DIR_CACHE,
+    DIR_TOOL_CALL_CACHE,
+    FILE_TOOL_CALL_CACHE_ENTRY,
+    ENCODING_UTF8,
+    KEY_CONTENT,
+    KEY_ARTIFACT,
+    KEY_OUTPUTS,
+    ENV_TOOL_CALL_CACHE_TOOLS,
+    ENV_TOOL_CALL_CACHE_MAX_BYTES,
+    VALUE_TOOL_CALL_CACHE_TOOLS_DEFAULT,
+    VALUE_TOOL_CALL_CACHE_MAX_BYTES_DEFAULT,
+)
+
+from repository.document_repository import DocumentRepository
+
+from util.path import get_resource_path, ensure_dir
+from util.tool import get_output_paths
+
+
+logger = getLogger(__name__)
+
+# Longest argument value considered a potential input file name
+MAX_FILENAME_LENGTH = 255
+
+
+class ToolCallCache:
+    """
+    Disk-backed LRU cache of tool call results.
+
+    Only tools on the allowlist, i.e. side-effect free tools whose output depends
+    on their arguments and input files alone, are cached. Calls are keyed on the
+    tool name, the canonicalized arguments and the digests of the sandbox files
+    the arguments refer to. The output files a call names in its `output*`
+    arguments are stored with the result and re-materialized into the sandbox
+    on a hit. Calls that name no output file, name one outside the sandbox, or
+    do not write the ones they name, are not cached: other files in the sandbox may be written by other
+    calls at the same time, so they cannot be told apart from its outputs. The
+    least recently used entries are evicted once the cache exceeds its disk
+    budget.
+    """
+
+    def __init__(
+        self,
+        tools: set[str] = None,
+        max_bytes: int = None,
+        cache_path: str = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            tools (set[str]): Names of the tools whose calls may be cached.
+            max_bytes (int): Disk budget of the cache.
+            cache_path (str): Directory in which cached results are stored.
+        """
+        self.tools = tools if tools is not None else {
+            name.strip()
+            for name in os.getenv(ENV_TOOL_CALL_CACHE_TOOLS, VALUE_TOOL_CALL_CACHE_TOOLS_DEFAULT).split(",")
+            if name.strip()
+        }
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv(ENV_TOOL_CALL_CACHE_MAX_BYTES, str(VALUE_TOOL_CALL_CACHE_MAX_BYTES_DEFAULT))
+        )
+        self.cache_path = Path(cache_path or get_resource_path(DIR_CACHE, DIR_TOOL_CALL_CACHE))
+        self.entries: Optional[OrderedDict[str, int]] = None
+
+    def wrap(
+        self,
+        tools: list[BaseTool],
+        repository: DocumentRepository,
+    ) -> list[BaseTool]:
+        """
+        Wrap the allowlisted tools in the caching layer.
+
+        Args:
+            tools (list[BaseTool]): The tools to wrap.
+            repository (DocumentRepository): Repository of the sandbox the tools work in.
+
+        Returns:
+            list[BaseTool]: The tools, allowlisted ones wrapped.
+        """
+        if self.max_bytes <= 0:
+            return tools
+
+        return [
+            self._wrap_tool(tool, repository)
+            if tool.name in self.tools and isinstance(tool, StructuredTool) and tool.coroutine
+            else tool
+            for tool in tools
+        ]
+
+    def _wrap_tool(
+        self,
+        tool: StructuredTool,
+        repository: DocumentRepository,
+    ) -> BaseTool:
+        """
+        Wrap a single tool in the caching layer.
+
+        Args:
+            tool (StructuredTool): The tool to wrap.
+            repository (DocumentRepository): Repository of the sandbox the tool works in.
+
+        Returns:
+            BaseTool: The wrapped tool.
+        """
+        async def call_tool(
+            runtime: Annotated[object | None, InjectedToolArg()] = None,
+            **arguments: Any,
+        ) -> Any:
+            outputs = get_output_paths(arguments)
+
+            # Output paths are written by the model, e.g. "../x.pdf" must not be restored
+            if not outputs or not all(
+                _is_inside(repository.base_path / name, repository.base_path) for name in outputs
+            ):
+                return await tool.coroutine(runtime=runtime, **arguments)
+
+            # Input files are hashed off the event loop, large ones take a while
+            key = await asyncio.to_thread(self.get_key, tool.name, arguments, repository)
+            result = await asyncio.to_thread(self._load, key, repository)
+
+            if result is not None:
+                logger.debug("Serving cached result of tool '%s': %s", tool.name, key)
+
+                return result
+
+            result = await tool.coroutine(runtime=runtime, **arguments)
+
+            await asyncio.to_thread(self._store, key, result, outputs, repository)
+
+            return result
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=call_tool,
+            response_format=tool.response_format,
+            metadata=tool.metadata,
+            handle_tool_error=tool.handle_tool_error,
+        )
+
+    @staticmethod
+    def get_key(
+        name: str,
+        arguments: dict[str, Any],
+        repository: DocumentRepository,
+    ) -> str:
+        """
+        Get the cache key of a tool call.
+
+        Output arguments are keyed on their value only: the file they name is
+        written by the call, an earlier version of it is not an input.
+
+        Args:
+            name (str): Name of the tool.
+            arguments (dict[str, Any]): Arguments of the call.
+            repository (DocumentRepository): Repository of the sandbox the tool works in.
+
+        Returns:
+            str: The cache key.
+        """
+        outputs = set(get_output_paths(arguments))
+        inputs = sorted(
+            (value, digest)
+            for value in set(_iter_strings([
+                value for value in arguments.values() if not (isinstance(value, str) and value in outputs)
+            ]))
+            if len(value) <= MAX_FILENAME_LENGTH
+            and (digest := repository.get_document_digest(value)) is not None
+        )
+        identity = [name, json.dumps(arguments, sort_keys=True, default=str), inputs]
+
+        return hashlib.sha256(json.dumps(identity).encode(ENCODING_UTF8)).hexdigest()
+
+    # ------------------------------------- Storage -------------------------------------
+
+    def _load(
+        self,
+        key: str,
+        repository: DocumentRepository,
+    ) -> Optional[tuple[Any, Any]]:
+        """
+        Load a cached result, re-materializing its output files into the sandbox.
+
+        Args:
+            key (str): The cache key.
+            repository (DocumentRepository): Repository of the sandbox the tool works in.
+
+        Returns:
+            Optional[tuple[Any, Any]]: The cached result or None on a miss.
+        """
+        entries = self._get_entries()
+        entry_path = self.cache_path / key
+
+        # Entries stored by the other workers of the host are not in the index yet.
+        if key not in entries and not (entry_path / FILE_TOOL_CALL_CACHE_ENTRY).is_file():
+            return None
+
+        try:
+            entry = json.loads((entry_path / FILE_TOOL_CALL_CACHE_ENTRY).read_text(encoding=ENCODING_UTF8))
+
+            for name in entry[KEY_OUTPUTS]:
+                source, target = entry_path / KEY_OUTPUTS / name, repository.base_path / name
+
+                if not _is_inside(source, entry_path / KEY_OUTPUTS) or not _is_inside(target, repository.base_path):
+                    raise ValueError(f"output '{name}' is outside of the sandbox")
+
+                shutil.copyfile(source, target)
+
+            (entry_path / FILE_TOOL_CALL_CACHE_ENTRY).touch()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Discarding unreadable tool call cache entry '%s': %s", key, e)
+
+            self._evict(key)
+
+            return None
+
+        if key not in entries:
+            entries[key] = _get_size(entry_path)
+
+        entries.move_to_end(key)
+
+        return entry[KEY_CONTENT], entry[KEY_ARTIFACT]
+
+    def _store(
+        self,
+        key: str,
+        result: Any,
+        outputs: list[str],
+        repository: DocumentRepository,
+    ) -> None:
+        """
+        Store a result and its output files, evicting least recently used entries.
+
+        Args:
+            key (str): The cache key.
+            result (Any): The result of the call.
+            outputs (list[str]): Names of the output files the call was to write.
+            repository (DocumentRepository): Repository of the sandbox the tool works in.
+        """
+        missing = [name for name in outputs if not repository.has_document(name)]
+
+        if missing:
+            logger.debug("Not caching call '%s', output files not written: %s", key, missing)
+
+            return
+
+        content, artifact = result if isinstance(result, tuple) else (result, None)
+        entry_path = self.cache_path / key
+
+        try:
+            ensure_dir(str(entry_path / KEY_OUTPUTS))
+
+            for name in outputs:
+                target = entry_path / KEY_OUTPUTS / name
+
+                if not _is_inside(target, entry_path / KEY_OUTPUTS):
+                    raise OSError(f"output '{name}' is outside of the cache entry")
+
+                shutil.copyfile(repository.base_path / name, target)
+
+            (entry_path / FILE_TOOL_CALL_CACHE_ENTRY).write_text(
+                json.dumps(
+                    {
+                        KEY_CONTENT: content,
+                        KEY_ARTIFACT: artifact,
+                        KEY_OUTPUTS: outputs,
+                    },
+                    default=str,
+                ),
+                encoding=ENCODING_UTF8,
+            )
+        except (OSError, TypeError) as e:
+            logger.warning("Failed to store tool call cache entry '%s': %s", key, e)
+
+            self._evict(key)
+
+            return
+
+        entries = self._get_entries()
+        entries[key] = _get_size(entry_path)
+        entries.move_to_end(key)
+
+        while entries and sum(entries.values()) > self.max_bytes:
+            self._evict(next(iter(entries)))
+
+    def _evict(self, key: str) -> None:
+        """
+        Remove an entry from the cache.
+
+        Args:
+            key (str): The cache key.
+        """
+        self._get_entries().pop(key, None)
+
+        shutil.rmtree(self.cache_path / key, ignore_errors=True)
+
+    def _get_entries(self) -> OrderedDict[str, int]:
+        """
+        Get the cache index, loading it from disk in least recently used order on first use.
+
+        Returns:
+            OrderedDict[str, int]: Sizes of the entries by key.
+        """
+        if self.entries is None:
+            entry_paths = [
+                path for path in self.cache_path.iterdir()
+                if (path / FILE_TOOL_CALL_CACHE_ENTRY).is_file()
+            ] if self.cache_path.is_dir() else []
+
+            entry_paths.sort(key=lambda path: (path / FILE_TOOL_CALL_CACHE_ENTRY).stat().st_mtime)
+
+            self.entries = OrderedDict((path.name, _get_size(path)) for path in entry_paths)
+
+        return self.entries
+
+
+def _iter_strings(value: Any):
+    """
+    Iterate over all strings nested in a value.
+    """
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_strings(item)
+
+
+def _is_inside(path: Path, base: Path) -> bool:
+    """
+    Check whether a path resolves to a location inside a base directory.
+    """
+    return path.resolve().is_relative_to(base.resolve())
+
+
+def _get_size(path: Path) -> int:
+    """
+    Get the total size of the files in a directory.
+    """
+    return sum(file_path.stat().st_size for file_path in path.rglob("*") if file_path.is_file())
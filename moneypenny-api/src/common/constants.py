@@ -4,15 +4,89 @@ Common constants used throughout the codebase.
 
 # Directories
 DIR_RESOURCE = "resource"
+DIR_CACHE = "cache"
+DIR_TOOL_CALL_CACHE = "tool"
+DIR_CHECKPOINT = "checkpoint"
+DIR_SHARED = "shared"
 
 # Environment variables
 ENV_CORS_ORIGIN = "CORS_ORIGIN"
 ENV_DOCUMENT_BASE_PATH = "DOCUMENT_BASE_PATH"
+ENV_WARM_UP_ENABLED = "WARM_UP_ENABLED"
+ENV_RESULT_CACHE_TTL_SECONDS = "RESULT_CACHE_TTL_SECONDS"
+ENV_RESULT_CACHE_MAX_ENTRIES = "RESULT_CACHE_MAX_ENTRIES"
+ENV_TOOL_CALL_CACHE_TOOLS = "TOOL_CALL_CACHE_TOOLS"
+ENV_TOOL_CALL_CACHE_MAX_BYTES = "TOOL_CALL_CACHE_MAX_BYTES"
+ENV_FAN_OUT_CONCURRENCY = "FAN_OUT_CONCURRENCY"
+ENV_SHARDING_MIN_PAGES = "SHARDING_MIN_PAGES"
+ENV_SHARDING_CHUNK_PAGES = "SHARDING_CHUNK_PAGES"
+ENV_SHARDING_CONCURRENCY = "SHARDING_CONCURRENCY"
+ENV_SHARDING_RETRIES = "SHARDING_RETRIES"
+ENV_MODEL_ROUTER = "MODEL_ROUTER"
+ENV_MODEL_SMALL = "MODEL_SMALL"
+ENV_MODEL_MEDIUM = "MODEL_MEDIUM"
+ENV_MODEL_LARGE = "MODEL_LARGE"
+ENV_MODEL_TENANT_TIERS = "MODEL_TENANT_TIERS"
+ENV_CHECKPOINTER = "CHECKPOINTER"
+ENV_CHECKPOINT_PATH = "CHECKPOINT_PATH"
+ENV_CHECKPOINT_RETENTION_SECONDS = "CHECKPOINT_RETENTION_SECONDS"
+ENV_MCP_COMMAND_NUTRIENT_DWS = "MCP_COMMAND_NUTRIENT_DWS"
+ENV_MCP_TOOL_CACHE_TTL_SECONDS = "MCP_TOOL_CACHE_TTL_SECONDS"
+ENV_MCP_TOOL_CACHE_BACKOFF_SECONDS = "MCP_TOOL_CACHE_BACKOFF_SECONDS"
+ENV_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS = "MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS"
+ENV_SESSION_MAX_TOKENS = "SESSION_MAX_TOKENS"
+ENV_SESSION_IDLE_SECONDS = "SESSION_IDLE_SECONDS"
+ENV_SESSION_MAX_SESSIONS = "SESSION_MAX_SESSIONS"
+ENV_SSE_PROTOCOL = "SSE_PROTOCOL"
+ENV_SSE_HEARTBEAT_SECONDS = "SSE_HEARTBEAT_SECONDS"
+ENV_SSE_BUFFER_SIZE = "SSE_BUFFER_SIZE"
+ENV_SSE_OVERFLOW_POLICY = "SSE_OVERFLOW_POLICY"
+ENV_DISCONNECT_GRACE_SECONDS = "DISCONNECT_GRACE_SECONDS"
+ENV_BUDGET_MAX_STEPS = "BUDGET_MAX_STEPS"
+ENV_BUDGET_MAX_TOOL_CALLS = "BUDGET_MAX_TOOL_CALLS"
+ENV_BUDGET_TOOL_TIMEOUT_SECONDS = "BUDGET_TOOL_TIMEOUT_SECONDS"
+ENV_BUDGET_DEADLINE_SECONDS = "BUDGET_DEADLINE_SECONDS"
+ENV_BUDGET_MAX_TOKENS = "BUDGET_MAX_TOKENS"
+ENV_BUDGET_TENANTS = "BUDGET_TENANTS"
+ENV_WS_RUN_WINDOW = "WS_RUN_WINDOW"
+ENV_WS_MAX_RUNS = "WS_MAX_RUNS"
+ENV_DOCUMENT_EVENTS_INTERVAL_SECONDS = "DOCUMENT_EVENTS_INTERVAL_SECONDS"
+ENV_SHARED_STORE_PATH = "SHARED_STORE_PATH"
+ENV_MCP_MAX_SESSIONS = "MCP_MAX_SESSIONS"
+ENV_LOG_PRESET = "LOG_PRESET"
+ENV_LOG_FORMAT = "LOG_FORMAT"
+ENV_LOG_QUEUE_SIZE = "LOG_QUEUE_SIZE"
+ENV_RESOURCE_CACHE_MAX_BYTES = "RESOURCE_CACHE_MAX_BYTES"
+ENV_RESOURCE_CACHE_VALIDATE_SECONDS = "RESOURCE_CACHE_VALIDATE_SECONDS"
+ENV_RESOURCE_CACHE_PRELOAD = "RESOURCE_CACHE_PRELOAD"
+ENV_CATALOG_MAX_TOKENS = "CATALOG_MAX_TOKENS"
+ENV_UPSTREAM_RETRIES = "UPSTREAM_RETRIES"
+ENV_UPSTREAM_BACKOFF_SECONDS = "UPSTREAM_BACKOFF_SECONDS"
+ENV_UPSTREAM_MAX_BACKOFF_SECONDS = "UPSTREAM_MAX_BACKOFF_SECONDS"
+ENV_UPSTREAM_RETRY_TOOLS = "UPSTREAM_RETRY_TOOLS"
+ENV_CIRCUIT_BREAKER_FAILURES = "CIRCUIT_BREAKER_FAILURES"
+ENV_CIRCUIT_BREAKER_RESET_SECONDS = "CIRCUIT_BREAKER_RESET_SECONDS"
+ENV_HEDGE_ENABLED = "HEDGE_ENABLED"
+ENV_HEDGE_PERCENTILE = "HEDGE_PERCENTILE"
+ENV_HEDGE_MIN_SAMPLES = "HEDGE_MIN_SAMPLES"
+ENV_ARTIFACT_EVENTS_INTERVAL_SECONDS = "ARTIFACT_EVENTS_INTERVAL_SECONDS"
 
 # Keys
 KEY_PROMPT = "prompt"
+KEY_TENANT = "tenant"
+KEY_SESSION_ID = "session_id"
+KEY_RUN_ID = "run_id"
+KEY_CONFIGURABLE = "configurable"
+KEY_THREAD_ID = "thread_id"
+KEY_TS = "ts"
 KEY_DATA = "data"
 KEY_RESPONSE = "response"
+KEY_CACHED = "cached"
+KEY_DOCUMENT = "document"
+KEY_DOCUMENTS = "documents"
+KEY_CHUNK = "chunk"
+KEY_PAGES = "pages"
+KEY_CATALOG = "catalog"
 KEY_MESSAGES = "messages"
 KEY_ROLE = "role"
 KEY_CONTENT = "content"
@@ -20,30 +94,277 @@ KEY_TRANSPORT = "transport"
 KEY_COMMAND = "command"
 KEY_ARGS = "args"
 KEY_ENV = "env"
+KEY_TOOLS = "tools"
+KEY_SAVED_ON = "saved_on"
+KEY_FINGERPRINT = "fingerprint"
+KEY_STATUS = "status"
+KEY_STAGES = "stages"
+KEY_DURATION = "duration"
+KEY_ERROR = "error"
+KEY_ARTIFACT = "artifact"
+KEY_OUTPUTS = "outputs"
+KEY_EXPIRES_ON = "expires_on"
+KEY_TIMESTAMP = "timestamp"
+KEY_LEVEL = "level"
+KEY_LOGGER = "logger"
+KEY_MESSAGE = "message"
+KEY_EXCEPTION = "exception"
+KEY_PRESETS = "presets"
+KEY_LOGGERS = "loggers"
+KEY_HANDLERS = "handlers"
+KEY_FORMATTER = "formatter"
+KEY_PROTOCOL = "protocol"
+KEY_FIELD = "field"
+KEY_TEXT = "text"
+KEY_SET = "set"
+KEY_MERGE = "merge"
+KEY_UNSET = "unset"
+KEY_BUDGET = "budget"
+KEY_LIMIT = "limit"
+KEY_USED = "used"
+KEY_TYPE = "type"
+KEY_REF = "ref"
+KEY_WINDOW = "window"
+KEY_COUNT = "count"
+KEY_TOPIC = "topic"
+KEY_CHANGED = "changed"
+KEY_DELETED = "deleted"
+KEY_ARTIFACTS = "artifacts"
+KEY_NAME = "name"
+KEY_SIZE = "size"
+KEY_CONTENT_TYPE = "content_type"
+KEY_PATH = "path"
+KEY_CACHE_KEY = "cache_key"
+KEY_SELECTION = "selection"
+KEY_SNAPSHOT = "snapshot"
+KEY_TARGETS = "targets"
+KEY_DONE = "done"
+KEY_BUDGET_USED = "budget_used"
 
 # Values
 VALUE_USER = "user"
 VALUE_TOOL = "tool"
 VALUE_AGENT = "agent"
+VALUE_ASSISTANT = "assistant"
+VALUE_SYSTEM = "system"
+VALUE_ERROR = "error"
 VALUE_DOCUMENT_BASE_PATH_DEFAULT = "/moneypenny-api/resource/document"
+VALUE_TRUE = ("1", "true", "yes", "on")
+VALUE_RESULT_CACHE_TTL_SECONDS_DEFAULT = 3600
+VALUE_RESULT_CACHE_MAX_ENTRIES_DEFAULT = 256
+VALUE_TOOL_CALL_CACHE_TOOLS_DEFAULT = "document_processor"
+VALUE_TOOL_CALL_CACHE_MAX_BYTES_DEFAULT = 1024 * 1024 * 1024
+VALUE_FAN_OUT_CONCURRENCY_DEFAULT = 4
+VALUE_SHARDING_MIN_PAGES_DEFAULT = 200
+VALUE_SHARDING_CHUNK_PAGES_DEFAULT = 100
+VALUE_SHARDING_CONCURRENCY_DEFAULT = 4
+VALUE_SHARDING_RETRIES_DEFAULT = 2
+VALUE_CHECKPOINTER_DEFAULT = "sqlite"
+VALUE_CHECKPOINT_RETENTION_SECONDS_DEFAULT = 7 * 24 * 3600
+VALUE_CHECKPOINT_PURGE_INTERVAL_SECONDS = 3600
+VALUE_MCP_TOOL_CACHE_TTL_SECONDS_DEFAULT = 3600
+VALUE_MCP_TOOL_CACHE_BACKOFF_SECONDS_DEFAULT = 5
+VALUE_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS_DEFAULT = 300
+VALUE_SESSION_MAX_TOKENS_DEFAULT = 2000
+VALUE_SESSION_IDLE_SECONDS_DEFAULT = 1800
+VALUE_SESSION_MAX_SESSIONS_DEFAULT = 1000
+VALUE_SSE_PROTOCOL_DEFAULT = "1"
+VALUE_SSE_HEARTBEAT_SECONDS_DEFAULT = 15
+VALUE_SSE_HEARTBEAT_TICK_SECONDS = 1
+VALUE_SSE_BUFFER_SIZE_DEFAULT = 32
+VALUE_SSE_OVERFLOW_POLICY_DEFAULT = "coalesce"
+VALUE_DISCONNECT_GRACE_SECONDS_DEFAULT = 0
+VALUE_BUDGET_MAX_STEPS_DEFAULT = 25
+VALUE_BUDGET_MAX_TOOL_CALLS_DEFAULT = 20
+VALUE_BUDGET_TOOL_TIMEOUT_SECONDS_DEFAULT = 120
+VALUE_BUDGET_DEADLINE_SECONDS_DEFAULT = 300
+VALUE_BUDGET_MAX_TOKENS_DEFAULT = 0
+VALUE_WS_RUN_WINDOW_DEFAULT = 16
+VALUE_WS_MAX_RUNS_DEFAULT = 32
+VALUE_DOCUMENT_EVENTS_INTERVAL_SECONDS_DEFAULT = 2
+VALUE_MCP_MAX_SESSIONS_DEFAULT = 0
+VALUE_MCP_DISCOVERY_LEASE_SECONDS = 60
+VALUE_LOG_PRESET_DEFAULT = "development"
+VALUE_LOG_FORMAT_DEFAULT = "text"
+VALUE_LOG_QUEUE_SIZE_DEFAULT = 10000
+VALUE_HIGHLIGHT_THRESHOLD_DEFAULT = 0.5
+VALUE_RESOURCE_CACHE_MAX_BYTES_DEFAULT = 16 * 1024 * 1024
+VALUE_RESOURCE_CACHE_VALIDATE_SECONDS_DEFAULT = 1
+VALUE_CATALOG_MAX_TOKENS_DEFAULT = 400
+VALUE_UPSTREAM_RETRIES_DEFAULT = 2
+VALUE_UPSTREAM_BACKOFF_SECONDS_DEFAULT = 0.5
+VALUE_UPSTREAM_MAX_BACKOFF_SECONDS_DEFAULT = 8
+VALUE_UPSTREAM_RETRY_TOOLS_DEFAULT = "document_processor"
+VALUE_CIRCUIT_BREAKER_FAILURES_DEFAULT = 5
+VALUE_CIRCUIT_BREAKER_RESET_SECONDS_DEFAULT = 30
+VALUE_HEDGE_ENABLED_DEFAULT = "false"
+VALUE_HEDGE_PERCENTILE_DEFAULT = 95
+VALUE_HEDGE_MIN_SAMPLES_DEFAULT = 20
+VALUE_LATENCY_WINDOW_SIZE = 200
+VALUE_ARTIFACT_EVENTS_INTERVAL_SECONDS_DEFAULT = 0.5
 
 # Nodes
 NODE_ENTRY_POINT = "entry_point"
 NODE_VALIDATE_STATE = "validate_state"
+NODE_CHECK_CACHE = "check_cache"
+NODE_ROUTE = "route"
 NODE_SET_UP = "set_up"
+NODE_CATALOG = "catalog"
 NODE_PROCESS = "process"
+NODE_PROCESS_DOCUMENT = "process_document"
+NODE_AGGREGATE = "aggregate"
 NODE_EXIT_POINT = "exit_point"
 
+# Stages
+STAGE_MCP_SERVER = "mcp_server"
+STAGE_MCP_TOOLS = "mcp_tools"
+STAGE_PROVIDER = "provider"
+STAGE_AGENT = "agent"
+STAGE_GRAPH = "graph"
+
+# Statuses
+STATUS_PENDING = "pending"
+STATUS_WARMING_UP = "warming_up"
+STATUS_READY = "ready"
+STATUS_ALIVE = "alive"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_RETRYING = "retrying"
+STATUS_MERGING = "merging"
+STATUS_CREATED = "created"
+STATUS_UPDATED = "updated"
+STATUS_FINALIZED = "finalized"
+STATUS_DELETED = "deleted"
+
+# Circuit breaker states, valued as reported in metrics
+CIRCUIT_CLOSED = 0
+CIRCUIT_HALF_OPEN = 1
+CIRCUIT_OPEN = 2
+
 # Models
+MODEL_GPT_5_NANO = "gpt-5-nano"
 MODEL_GPT_5_MINI = "gpt-5-mini"
+MODEL_GPT_5 = "gpt-5"
+
+# Model tiers
+TIER_SMALL = "small"
+TIER_MEDIUM = "medium"
+TIER_LARGE = "large"
+
+# Checkpointers
+CHECKPOINTER_SQLITE = "sqlite"
+CHECKPOINTER_MEMORY = "memory"
+CHECKPOINTER_NONE = "none"
+
+# Stream modes
+STREAM_MODE_VALUES = "values"
+STREAM_MODE_CUSTOM = "custom"
+
+# SSE protocols
+SSE_PROTOCOL_V1 = "1"
+SSE_PROTOCOL_V2 = "2"
+
+# SSE events
+EVENT_STATE = "state"
+EVENT_TEXT = "text"
+EVENT_DOCUMENT = "document"
+EVENT_DONE = "done"
+EVENT_HEARTBEAT = "heartbeat"
+EVENT_BUDGET = "budget"
+EVENT_ARTIFACT = "artifact"
+
+# WebSocket messages
+MESSAGE_START = "start"
+MESSAGE_RESUME = "resume"
+MESSAGE_CANCEL = "cancel"
+MESSAGE_ACK = "ack"
+MESSAGE_SUBSCRIBE = "subscribe"
+MESSAGE_UNSUBSCRIBE = "unsubscribe"
+MESSAGE_STARTED = "started"
+MESSAGE_EVENT = "event"
+MESSAGE_CANCELLED = "cancelled"
+MESSAGE_SUBSCRIBED = "subscribed"
+MESSAGE_UNSUBSCRIBED = "unsubscribed"
+MESSAGE_DOCUMENTS = "documents"
+MESSAGE_ERROR = "error"
+
+# WebSocket topics
+TOPIC_DOCUMENTS = "documents"
+
+# SSE buffer overflow policies
+OVERFLOW_POLICY_COALESCE = "coalesce"
+OVERFLOW_POLICY_DISCONNECT = "disconnect"
+
+# Execution budgets
+BUDGET_MAX_STEPS = "max_steps"
+BUDGET_MAX_TOOL_CALLS = "max_tool_calls"
+BUDGET_TOOL_TIMEOUT_SECONDS = "tool_timeout_seconds"
+BUDGET_DEADLINE_SECONDS = "deadline_seconds"
+BUDGET_MAX_TOKENS = "max_tokens"
+
+# MCP servers
+MCP_SERVER_NUTRIENT_DWS = "nutrient-dws"
+MCP_COMMAND_NUTRIENT_DWS = "dws-mcp-wrapper.sh"
+
+# Tools
+TOOL_DOCUMENT_PROCESSOR = "document_processor"
+
+# Log formats
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+
+# Resource cache results
+RESOURCE_CACHE_HIT = "hit"
+RESOURCE_CACHE_MISS = "miss"
+
+# Prompt router results
+PROMPT_ROUTER_HIT = "hit"
+PROMPT_ROUTER_MISS = "miss"
+PROMPT_ROUTER_FAILURE = "failure"
+
+# Shared store namespaces
+NAMESPACE_MCP_TOOL_CATALOG = "mcp_tool_catalog"
+NAMESPACE_RESULTS = "results"
+NAMESPACE_RESULT_OUTPUTS = "result_outputs"
+
+# Metrics
+METRIC_NODE_DURATION = "moneypenny_graph_node_duration_seconds"
+METRIC_LLM_CALL_DURATION = "moneypenny_llm_call_duration_seconds"
+METRIC_MCP_TOOL_CALL_DURATION = "moneypenny_mcp_tool_call_duration_seconds"
+METRIC_SSE_TIME_TO_FIRST_EVENT = "moneypenny_sse_time_to_first_event_seconds"
+METRIC_DOCUMENT_REQUEST_DURATION = "moneypenny_document_request_duration_seconds"
+METRIC_DOCUMENT_BYTES_SERVED = "moneypenny_document_bytes_served"
+METRIC_RUNS_IN_FLIGHT = "moneypenny_runs_in_flight"
+METRIC_RUNS_CANCELLED = "moneypenny_runs_cancelled_total"
+METRIC_SSE_QUEUE_DEPTH = "moneypenny_sse_queue_depth"
+METRIC_SSE_STREAMS = "moneypenny_sse_streams"
+METRIC_SSE_BUFFER_OVERFLOWS = "moneypenny_sse_buffer_overflows_total"
+METRIC_MCP_SESSIONS = "moneypenny_mcp_sessions"
+METRIC_BUDGETS_EXCEEDED = "moneypenny_budgets_exceeded_total"
+METRIC_WS_CONNECTIONS = "moneypenny_ws_connections"
+METRIC_RESOURCE_CACHE_REQUESTS = "moneypenny_resource_cache_requests_total"
+METRIC_CIRCUIT_BREAKER_STATE = "moneypenny_circuit_breaker_state"
+METRIC_UPSTREAM_RETRIES = "moneypenny_upstream_retries_total"
+METRIC_HEDGED_REQUESTS = "moneypenny_hedged_requests_total"
+METRIC_PROMPT_ROUTER_REQUESTS = "moneypenny_prompt_router_requests_total"
+METRIC_AGENT_RUN_DURATION = "moneypenny_agent_run_duration_seconds"
+METRIC_AGENT_RUN_FAILURES = "moneypenny_agent_run_failures_total"
+METRIC_AGENT_ESCALATIONS = "moneypenny_agent_escalations_total"
+METRIC_MODEL_TOKENS = "moneypenny_model_tokens_total"
 
 # Prompt
 PROMPT_APPENDIX_NO_QUESTIONS = ". Use available tools only. Do not invent tools or provide scripts. No additional questions, when in doubt, use defaults."
 
 # Various
 ENCODING_UTF8 = "utf-8"
+FILE_TOOL_CALL_CACHE_ENTRY = "entry.json"
+FILE_CHECKPOINTS = "checkpoints.sqlite"
+FILE_SHARED_STORE = "store.sqlite"
 NEWLINE = "\n"
 APPLICATION_JSON = "application/json"
 APPLICATION_OCTET_STREAM = "application/octet-stream"
+APPLICATION_PDF = "application/pdf"
 TEXT_EVENT_STREAM = "text/event-stream"
+TEXT_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
 TRANSPORT_STDIO = "stdio"
@@ -45,3 +45,18 @@ class ObjectNotFoundException(BaseMoneypennyException):
 
     def __init__(self, message: str = "Object not found."):
         super().__init__(message, 404)
+
+
+class UpstreamUnavailableException(BaseMoneypennyException):
+    """
+    Exception raised when an upstream service is failing and calls to it are not made.
+    """
+
+    def __init__(
+        self,
+        message: str = "Upstream service unavailable.",
+        upstream: str = None,
+    ):
+        super().__init__(message, 503)
+
+        self.upstream = upstream
@@ -2,13 +2,34 @@
 Setup module.
 """
 
+import os
+
+import atexit
+
+import logging
 import logging.config as config
 
 import yaml
 
 from dynaconf import Dynaconf
 
-from common.constants import ENCODING_UTF8
+from common.constants import (
+    ENCODING_UTF8,
+    KEY_PRESETS,
+    KEY_LOGGERS,
+    KEY_HANDLERS,
+    KEY_FORMATTER,
+    KEY_LEVEL,
+    ENV_LOG_PRESET,
+    ENV_LOG_FORMAT,
+    ENV_LOG_QUEUE_SIZE,
+    VALUE_LOG_PRESET_DEFAULT,
+    VALUE_LOG_FORMAT_DEFAULT,
+    VALUE_LOG_QUEUE_SIZE_DEFAULT,
+    LOG_FORMAT_TEXT,
+)
+
+from util.log import start_queue_listener
 
 
 def get_config_settings():
@@ -22,6 +43,12 @@ def set_up_logging(configuration_path: str) -> None:
     """
     Set up logging based on the logging configuration.
 
+    The levels of the `LOG_PRESET` preset of the configuration are applied to
+    its loggers and the handlers use the formatter named by `LOG_FORMAT`
+    ("text" or "json"). The handlers of the root logger are then moved behind a
+    queue of `LOG_QUEUE_SIZE` records, served by a listener thread, so that
+    records are formatted and written off the event loop (0 to log synchronously).
+
     Args:
         configuration_path (str): The path to the logging configuration file.
 
@@ -31,4 +58,26 @@ def set_up_logging(configuration_path: str) -> None:
     with open(configuration_path, "r", encoding=ENCODING_UTF8) as fh:
         logging_config = yaml.safe_load(fh.read())
 
-        config.dictConfig(logging_config)
+    presets = logging_config.pop(KEY_PRESETS, {})
+    preset = os.getenv(ENV_LOG_PRESET, VALUE_LOG_PRESET_DEFAULT)
+    log_format = os.getenv(ENV_LOG_FORMAT, VALUE_LOG_FORMAT_DEFAULT).lower()
+
+    for name, level in (presets.get(preset) or {}).items():
+        logging_config.setdefault(KEY_LOGGERS, {}).setdefault(name, {})[KEY_LEVEL] = level
+
+    if log_format != LOG_FORMAT_TEXT:
+        for handler in logging_config.get(KEY_HANDLERS, {}).values():
+            handler[KEY_FORMATTER] = log_format
+
+    config.dictConfig(logging_config)
+
+    if preset not in presets:
+        logging.getLogger(__name__).warning("Unknown logging preset: %s", preset)
+
+    listener = start_queue_listener(
+        logging.getLogger(),
+        int(os.getenv(ENV_LOG_QUEUE_SIZE, str(VALUE_LOG_QUEUE_SIZE_DEFAULT))),
+    )
+
+    if listener is not None:
+        atexit.register(listener.stop)
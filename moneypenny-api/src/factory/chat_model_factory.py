@@ -0,0 +1,87 @@
+"""
+Factory for creating chat model instances.
+"""
+
+from logging import getLogger
+
+from langchain.chat_models import init_chat_model
+
+from langchain_core.language_models import BaseChatModel
+
+from metrics.instruments import LLMMetricsHandler
+
+
+logger = getLogger(__name__)
+
+
+class ChatModelFactory:
+    """
+    Factory for creating chat model instances.
+
+    Chat models are shared between runs so that their HTTP clients, and the
+    connections pooled by them, are reused instead of being rebuilt per request.
+    Their own retries are disabled: failed calls are retried by the resilience
+    layer of the agents, which also keeps track of failing providers.
+    """
+
+    CACHE = {}
+
+    @classmethod
+    def create(
+        cls,
+        model: str,
+    ) -> BaseChatModel:
+        """
+        Create a chat model instance.
+
+        Args:
+            model (str): Name of the model (e.g., "gpt-5-mini").
+
+        Returns:
+            BaseChatModel: The chat model instance.
+        """
+        if model not in cls.CACHE:
+            logger.debug("Creating new chat model instance for model: %s", model)
+
+            cls.CACHE[model] = init_chat_model(
+                model, callbacks=[LLMMetricsHandler(model)], max_retries=0,
+            )
+
+        return cls.CACHE[model]
+
+    @classmethod
+    async def connect(
+        cls,
+        model: str,
+    ) -> None:
+        """
+        Open a connection to the provider of a chat model.
+
+        Performs a cheap metadata request so that the TLS handshake and connection
+        pool set-up are paid before the first model call.
+
+        Args:
+            model (str): Name of the model (e.g., "gpt-5-mini").
+        """
+        chat_model = cls.create(model)
+        client = getattr(chat_model, "root_async_client", None)
+
+        if client is None:
+            logger.debug("Chat model '%s' does not expose a client to connect.", model)
+
+            return
+
+        await client.models.retrieve(model)
+
+        logger.debug("Connected to the provider of chat model: %s", model)
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """
+        Clear the cache of chat model instances.
+        """
+        logger.debug("Clearing the cache of chat models...")
+
+        cls.CACHE.clear()
+
+        logger.debug("Cache of chat models cleared.")
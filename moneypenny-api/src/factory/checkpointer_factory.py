@@ -0,0 +1,127 @@
+"""
+Factory for creating the LangGraph checkpointer.
+"""
+
+from logging import getLogger
+
+import os
+
+import asyncio
+
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from common.constants import (
+    DIR_CACHE,
+    DIR_CHECKPOINT,
+    FILE_CHECKPOINTS,
+    ENV_CHECKPOINTER,
+    ENV_CHECKPOINT_PATH,
+    VALUE_CHECKPOINTER_DEFAULT,
+    CHECKPOINTER_SQLITE,
+    CHECKPOINTER_MEMORY,
+    CHECKPOINTER_NONE,
+)
+from common.exception import ServerException
+
+from util.path import get_resource_path
+
+
+logger = getLogger(__name__)
+
+
+class CheckpointerFactory:
+    """
+    Factory for creating the LangGraph checkpointer.
+
+    The backend is selected by `CHECKPOINTER`: "sqlite" (default) persists
+    checkpoints in a local SQLite database at `CHECKPOINT_PATH`, "memory" keeps
+    them for the lifetime of the process and "none" disables checkpointing.
+    The checkpointer is shared between runs.
+    """
+
+    CACHE: dict[str, Optional[BaseCheckpointSaver]] = {}
+
+    LOCK = asyncio.Lock()
+
+    @classmethod
+    async def create(cls) -> Optional[BaseCheckpointSaver]:
+        """
+        Create the checkpointer.
+
+        Returns:
+            Optional[BaseCheckpointSaver]: The checkpointer or None if checkpointing is disabled.
+
+        Raises:
+            ServerException: If the backend is unknown or its dependencies are missing.
+        """
+        backend = os.getenv(ENV_CHECKPOINTER, VALUE_CHECKPOINTER_DEFAULT).lower()
+
+        if backend in cls.CACHE:
+            return cls.CACHE[backend]
+
+        async with cls.LOCK:
+            if backend not in cls.CACHE:
+                logger.debug("Creating checkpointer: %s", backend)
+
+                cls.CACHE[backend] = await cls._create(backend)
+
+        return cls.CACHE[backend]
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        Close the checkpointers and clear the cache.
+        """
+        for checkpointer in cls.CACHE.values():
+            connection = getattr(checkpointer, "conn", None)
+
+            if connection is not None:
+                await connection.close()
+
+        cls.CACHE.clear()
+
+        logger.debug("Checkpointers closed.")
+
+    @staticmethod
+    async def _create(backend: str) -> Optional[BaseCheckpointSaver]:
+        """
+        Create the checkpointer of a backend.
+
+        Args:
+            backend (str): The backend.
+
+        Returns:
+            Optional[BaseCheckpointSaver]: The checkpointer or None for no checkpointing.
+        """
+        if backend == CHECKPOINTER_NONE:
+            return None
+
+        if backend == CHECKPOINTER_MEMORY:
+            return InMemorySaver()
+
+        if backend != CHECKPOINTER_SQLITE:
+            raise ServerException(f"Unknown checkpointer: {backend}")
+
+        try:
+            import aiosqlite # pylint: disable=import-outside-toplevel
+
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ServerException(
+                "SQLite checkpointing requires the 'langgraph-checkpoint-sqlite' package."
+            ) from e
+
+        path = os.getenv(ENV_CHECKPOINT_PATH) or get_resource_path(
+            DIR_CACHE, DIR_CHECKPOINT, FILE_CHECKPOINTS, ensure_parent_exists=True,
+        )
+
+        checkpointer = AsyncSqliteSaver(await aiosqlite.connect(path))
+
+        await checkpointer.setup()
+
+        logger.info("Checkpoints are persisted in: %s", path)
+
+        return checkpointer
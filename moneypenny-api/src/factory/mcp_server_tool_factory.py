@@ -6,30 +6,126 @@ from logging import getLogger
 
 import os
 
-from typing import Any
+import asyncio
 
-from langchain_core.tools import BaseTool
+import json
+
+import time
+
+import hashlib
+
+import functools
+
+from typing import Any, Optional
+
+from dataclasses import dataclass, field
+
+from langchain_core.tools import BaseTool, StructuredTool
 
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+
+from mcp.types import Tool as MCPTool
 
 from common.constants import (
     KEY_TRANSPORT,
     KEY_COMMAND,
     KEY_ARGS,
     KEY_ENV,
+    KEY_TOOLS,
+    KEY_SAVED_ON,
+    KEY_FINGERPRINT,
     TRANSPORT_STDIO,
+    DIR_CACHE,
+    DIR_SHARED,
+    NAMESPACE_MCP_TOOL_CATALOG,
+    ENCODING_UTF8,
+    ENV_MCP_TOOL_CACHE_TTL_SECONDS,
+    ENV_MCP_TOOL_CACHE_BACKOFF_SECONDS,
+    ENV_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS,
+    VALUE_MCP_TOOL_CACHE_TTL_SECONDS_DEFAULT,
+    VALUE_MCP_TOOL_CACHE_BACKOFF_SECONDS_DEFAULT,
+    VALUE_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS_DEFAULT,
+    ENV_MCP_MAX_SESSIONS,
+    VALUE_MCP_MAX_SESSIONS_DEFAULT,
+    ENV_UPSTREAM_RETRY_TOOLS,
+    VALUE_UPSTREAM_RETRY_TOOLS_DEFAULT,
+    VALUE_MCP_DISCOVERY_LEASE_SECONDS,
 )
+from common.exception import ServerException
+
+from cache.shared_store import shared_store
+
+from metrics.instruments import instrument_mcp_tool, mcp_sessions
+
+from util.lock import HostSemaphore
+from util.path import get_resource_path
+from util.resilience import get_upstream
 
 
 logger = getLogger(__name__)
 
+# Seconds between checks for a catalog discovered by another worker
+DISCOVERY_POLL_SECONDS = 0.25
+
+
+@dataclass
+class ToolCatalogEntry:
+    """
+    Cached tool catalog of a single MCP server.
+
+    Attributes:
+        tools: LangChain tools built from the catalog (empty for a failed lookup).
+        loaded_on: Monotonic time at which the catalog was loaded.
+        expires_on: Monotonic time after which the catalog is considered stale.
+        failures: Number of consecutive failed lookups.
+        retry_on: Monotonic time before which a failed lookup is not retried.
+    """
+
+    tools: list[BaseTool] = field(default_factory=list)
+    loaded_on: float = 0.0
+    expires_on: float = 0.0
+    failures: int = 0
+    retry_on: float = 0.0
+
+    def is_fresh(self, now: float) -> bool:
+        """
+        Check whether the catalog can be served without refreshing.
+        """
+        return bool(self.tools) and now < self.expires_on
+
+    def is_backing_off(self, now: float) -> bool:
+        """
+        Check whether a failed lookup should not be retried yet.
+        """
+        return self.failures > 0 and now < self.retry_on
+
 
 class MCPServerToolFactory:
     """
     Factory for creating MCP server tool instances.
+
+    Tool discovery is single-flight per server: concurrent callers share one
+    lookup. Catalogs are cached with a TTL and refreshed in the background
+    once stale, failed lookups are negatively cached with exponential backoff
+    and tool schemas are persisted to the shared store, so that the workers of
+    a host and restarted workers build their tools without spawning the MCP
+    server first. Across workers, discovery is single-flight too: the worker
+    holding the discovery lease of a server spawns it, the others wait for the
+    catalog it stores.
+
+    MCP sessions, i.e. MCP server processes, are bounded per host rather than
+    per worker by `MCP_MAX_SESSIONS` (0 for no bound).
+
+    Tool calls go through the circuit breaker of their MCP server, and calls of
+    the idempotent tools listed in `UPSTREAM_RETRY_TOOLS` are retried after
+    transient failures.
     """
 
-    CACHE = {}
+    CACHE: dict[str, ToolCatalogEntry] = {}
+    LOCKS: dict[str, asyncio.Lock] = {}
+    REFRESH_TASKS: dict[str, asyncio.Task] = {}
+    SESSIONS: Optional[HostSemaphore] = None
 
     @classmethod
     async def create(
@@ -51,57 +147,548 @@ class MCPServerToolFactory:
             env (dict[str, Any]): Environment variables for the command.
 
         Returns:
-            A list of BaseTool instances or None if creation fails.
+            A list of BaseTool instances.
+
+        Raises:
+            ServerException: If no tools could be retrieved and none are cached.
         """
         logger.debug("Retrieving MCP server tool instance(s) for server: %s", name)
 
-        if not cls.CACHE.get(name, None):
-            logger.debug("Creating new MCP server tool instance(s) for server: %s", name)
+        connection = {
+            KEY_TRANSPORT: transport,
+            KEY_COMMAND: command,
+            KEY_ARGS: args or [],
+            KEY_ENV: env or os.environ.copy(),
+        }
 
-            try:
-                client = MultiServerMCPClient(
-                    {
-                        name: {
-                            KEY_TRANSPORT: transport,
-                            KEY_COMMAND: command,
-                            KEY_ARGS: args or [],
-                            KEY_ENV: env or os.environ.copy(),
-                        }
-                    }
-                )
+        entry = cls.CACHE.get(name)
 
-                tools = await client.get_tools()
+        if entry is None:
+            entry = cls._load_catalog(name, connection)
 
-                logger.debug("Successfully retrieved %d tools from MCP server.", len(tools))
+        now = time.monotonic()
 
-                cls.CACHE[name] = tools
-            except Exception as e: # pylint: disable=broad-except
-                logger.error(
-                    "Failed to retrieve MCP server tool instance(s) for server '%s': %s",
-                    name, e, exc_info=True
-                )
-                logger.warning("Continuing without MCP tools...")
+        if entry is None or not (entry.tools or entry.is_backing_off(now)):
+            entry = await cls._discover(name, connection)
+        elif not entry.is_fresh(now) and not entry.is_backing_off(now):
+            cls._schedule_refresh(name, connection)
 
-        tools = cls.CACHE.get(name, [])
+        if not entry.tools:
+            raise ServerException(
+                f"No MCP server tools available for server '{name}', "
+                f"retrying in {max(0.0, entry.retry_on - time.monotonic()):.0f}s."
+            )
 
         logger.debug(
             "Retrieved %1d MCP server tool %2s for server '%3s'.",
-            len(tools), "instance" if len(tools) == 1 else "instances", name,
+            len(entry.tools), "instance" if len(entry.tools) == 1 else "instances", name,
         )
 
-        return tools
+        return entry.tools
+
+    @classmethod
+    async def refresh(
+        cls,
+        name: str,
+        command: str,
+        transport: str = TRANSPORT_STDIO,
+        args: list[str] = None,
+        env: dict[str, Any] = None,
+    ) -> list[BaseTool]:
+        """
+        Spawn an MCP server and rediscover its tools, regardless of the cached catalog.
+
+        Args:
+            name (str): Name of the MCP server.
+            command (str): Command to run the MCP server.
+            transport (str): Transport protocol (e.g., "stdio").
+            args (list[str]): Arguments for the command.
+            env (dict[str, Any]): Environment variables for the command.
+
+        Returns:
+            A list of BaseTool instances.
+
+        Raises:
+            ServerException: If no tools could be retrieved and none are cached.
+        """
+        connection = {
+            KEY_TRANSPORT: transport,
+            KEY_COMMAND: command,
+            KEY_ARGS: args or [],
+            KEY_ENV: env or os.environ.copy(),
+        }
+
+        entry = await cls._discover(name, connection, force=True)
+
+        if not entry.tools:
+            raise ServerException(f"No MCP server tools available for server '{name}'.")
+
+        return entry.tools
 
-    
     @classmethod
     def clear_cache(cls) -> None:
         """
         Clear the cache of MCP server tools.
 
         This method clears the internal cache that stores MCP server tool instances,
-        forcing the factory to create new instances on the next request.
+        forcing the factory to create new instances on the next request. Catalogs
+        persisted to the shared store are left intact.
         """
         logger.debug("Clearing the cache of MCP server tools...")
 
+        for task in cls.REFRESH_TASKS.values():
+            task.cancel()
+
+        cls.REFRESH_TASKS.clear()
         cls.CACHE.clear()
 
         logger.debug("Cache of MCP server tools cleared.")
+
+    # ------------------------------------ Discovery ------------------------------------
+
+    @classmethod
+    async def _discover(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+        force: bool = False,
+    ) -> ToolCatalogEntry:
+        """
+        Discover the tools of an MCP server, sharing one lookup between concurrent callers.
+
+        A forced discovery is shared too, with the lookups started after it was requested.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+            force (bool): Whether to discover even if a fresh catalog is cached.
+
+        Returns:
+            ToolCatalogEntry: The resulting cache entry.
+        """
+        requested_on = time.monotonic()
+        lock = cls.LOCKS.setdefault(name, asyncio.Lock())
+
+        async with lock:
+            # Another caller may have completed the lookup while we were waiting.
+            now = time.monotonic()
+            entry = cls.CACHE.get(name)
+
+            if entry is not None and (
+                entry.is_fresh(now) and entry.loaded_on >= requested_on
+                if force
+                else entry.is_fresh(now) or entry.is_backing_off(now)
+            ):
+                return entry
+
+            # Another worker may have completed the lookup.
+            stored, leased = await cls._wait_for_catalog(
+                name, connection, newer_than=requested_on if force else None,
+            )
+
+            if stored is not None:
+                return stored
+
+            logger.debug("Creating new MCP server tool instance(s) for server: %s", name)
+
+            lease = f"{NAMESPACE_MCP_TOOL_CATALOG}:{name}"
+
+            try:
+                mcp_tools = await cls._list_tools(name, connection)
+
+                logger.debug("Successfully retrieved %d tools from MCP server.", len(mcp_tools))
+
+                entry = cls._build_entry(name, connection, mcp_tools)
+
+                await asyncio.to_thread(cls._save_catalog, name, connection, mcp_tools)
+            except Exception as e: # pylint: disable=broad-except
+                logger.error(
+                    "Failed to retrieve MCP server tool instance(s) for server '%s': %s",
+                    name, e, exc_info=True
+                )
+
+                entry = cls._build_failed_entry(cls.CACHE.get(name))
+
+                logger.warning(
+                    "Backing off MCP server '%s' tool discovery for %.0fs after %d failure(s).",
+                    name, entry.retry_on - time.monotonic(), entry.failures,
+                )
+            finally:
+                if leased:
+                    await asyncio.to_thread(shared_store.release, lease)
+
+            cls.CACHE[name] = entry
+
+            return entry
+
+    @classmethod
+    async def _wait_for_catalog(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+        newer_than: Optional[float] = None,
+    ) -> tuple[Optional[ToolCatalogEntry], bool]:
+        """
+        Get a fresh catalog from the shared store, waiting for it while another
+        worker holds the discovery lease of the server.
+
+        Returns with the lease acquired if no fresh catalog is stored, unless
+        waiting for it timed out.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+            newer_than (Optional[float]): Monotonic time before which a stored catalog is not used.
+
+        Returns:
+            tuple[Optional[ToolCatalogEntry], bool]: The stored catalog or None if it
+            is to be discovered, and whether the lease was acquired.
+        """
+        lease = f"{NAMESPACE_MCP_TOOL_CATALOG}:{name}"
+        deadline = time.monotonic() + VALUE_MCP_DISCOVERY_LEASE_SECONDS
+
+        while True:
+            stored = await asyncio.to_thread(cls._load_catalog, name, connection)
+
+            if (
+                stored is not None
+                and stored.is_fresh(time.monotonic())
+                and (newer_than is None or stored.loaded_on >= newer_than)
+            ):
+                logger.debug("Using the MCP tool catalog stored by another worker for server: %s", name)
+
+                return stored, False
+
+            if await asyncio.to_thread(shared_store.acquire, lease, VALUE_MCP_DISCOVERY_LEASE_SECONDS):
+                return None, True
+
+            if time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for another worker to discover the tools of server: %s", name)
+
+                return None, False
+
+            await asyncio.sleep(DISCOVERY_POLL_SECONDS)
+
+    @classmethod
+    async def _list_tools(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+    ) -> list[MCPTool]:
+        """
+        List all tools exposed by an MCP server.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+
+        Returns:
+            list[MCPTool]: The raw MCP tool definitions.
+        """
+        client = MultiServerMCPClient({name: connection})
+        mcp_tools = []
+
+        await cls._get_sessions().acquire()
+
+        mcp_sessions.inc()
+
+        try:
+            async with client.session(name) as session:
+                cursor = None
+
+                while True:
+                    result = await session.list_tools(cursor=cursor)
+                    mcp_tools.extend(result.tools or [])
+                    cursor = result.nextCursor
+
+                    if not cursor:
+                        break
+        finally:
+            mcp_sessions.dec()
+
+            cls._get_sessions().release()
+
+        return mcp_tools
+
+    @classmethod
+    def _get_sessions(cls) -> HostSemaphore:
+        """
+        Get the semaphore bounding the MCP sessions of the host.
+        """
+        if cls.SESSIONS is None:
+            cls.SESSIONS = HostSemaphore(
+                get_resource_path(DIR_CACHE, DIR_SHARED),
+                "mcp-session",
+                int(cls._get_setting(ENV_MCP_MAX_SESSIONS, VALUE_MCP_MAX_SESSIONS_DEFAULT)),
+            )
+
+        return cls.SESSIONS
+
+    @classmethod
+    def _limit_sessions(cls, tool: StructuredTool) -> StructuredTool:
+        """
+        Bound the MCP sessions the calls of a tool open by those of the host.
+
+        Args:
+            tool (StructuredTool): The MCP server tool.
+
+        Returns:
+            StructuredTool: The same tool, bounded.
+        """
+        coroutine = tool.coroutine
+
+        if coroutine is None:
+            return tool
+
+        @functools.wraps(coroutine)
+        async def call_tool(*args, **kwargs):
+            async with cls._get_sessions():
+                return await coroutine(*args, **kwargs)
+
+        tool.coroutine = call_tool
+
+        return tool
+
+    @staticmethod
+    def _make_resilient(
+        tool: StructuredTool,
+        name: str,
+    ) -> StructuredTool:
+        """
+        Make the calls of a tool through the resilience layer of its MCP server.
+
+        Retries wait outside of the session bound, so that backing off does not
+        hold a session.
+
+        Args:
+            tool (StructuredTool): The MCP server tool.
+            name (str): Name of the MCP server.
+
+        Returns:
+            StructuredTool: The same tool, made resilient.
+        """
+        coroutine = tool.coroutine
+
+        if coroutine is None:
+            return tool
+
+        upstream = get_upstream(name)
+        retry = tool.name in {
+            retry_tool.strip()
+            for retry_tool in os.getenv(ENV_UPSTREAM_RETRY_TOOLS, VALUE_UPSTREAM_RETRY_TOOLS_DEFAULT).split(",")
+        }
+
+        @functools.wraps(coroutine)
+        async def call_tool(*args, **kwargs):
+            return await upstream.call(lambda: coroutine(*args, **kwargs), retry=retry)
+
+        tool.coroutine = call_tool
+
+        return tool
+
+    @classmethod
+    def _schedule_refresh(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+    ) -> None:
+        """
+        Refresh a stale catalog in the background while the stale one keeps being served.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+        """
+        task = cls.REFRESH_TASKS.get(name)
+
+        if task is not None and not task.done():
+            return
+
+        logger.debug("Scheduling background refresh of MCP server tools for server: %s", name)
+
+        task = asyncio.create_task(cls._discover(name, connection))
+        task.add_done_callback(lambda _: cls.REFRESH_TASKS.pop(name, None))
+
+        cls.REFRESH_TASKS[name] = task
+
+    # ------------------------------------- Entries -------------------------------------
+
+    @classmethod
+    def _build_entry(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+        mcp_tools: list[MCPTool],
+        age: float = 0.0,
+    ) -> ToolCatalogEntry:
+        """
+        Build a cache entry from raw MCP tool definitions.
+
+        Tools are bound to the connection rather than to a session, so each tool
+        call opens its own session and no server is spawned just to build them.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+            mcp_tools (list[MCPTool]): The raw MCP tool definitions.
+            age (float): Age of the catalog in seconds.
+
+        Returns:
+            ToolCatalogEntry: The cache entry.
+        """
+        now = time.monotonic()
+        tools = [
+            cls._make_resilient(
+                cls._limit_sessions(
+                    instrument_mcp_tool(
+                        convert_mcp_tool_to_langchain_tool(
+                            None,
+                            mcp_tool,
+                            connection=connection,
+                            server_name=name,
+                        )
+                    )
+                ),
+                name,
+            )
+            for mcp_tool in mcp_tools
+        ]
+
+        return ToolCatalogEntry(
+            tools=tools,
+            loaded_on=now - age,
+            expires_on=now - age + cls._get_setting(
+                ENV_MCP_TOOL_CACHE_TTL_SECONDS, VALUE_MCP_TOOL_CACHE_TTL_SECONDS_DEFAULT,
+            ),
+        )
+
+    @classmethod
+    def _build_failed_entry(
+        cls,
+        previous: Optional[ToolCatalogEntry],
+    ) -> ToolCatalogEntry:
+        """
+        Build a negative cache entry, keeping previously known tools if there are any.
+
+        Args:
+            previous (Optional[ToolCatalogEntry]): The entry cached before the failure.
+
+        Returns:
+            ToolCatalogEntry: The cache entry.
+        """
+        previous = previous or ToolCatalogEntry()
+        failures = previous.failures + 1
+        backoff = min(
+            cls._get_setting(
+                ENV_MCP_TOOL_CACHE_BACKOFF_SECONDS, VALUE_MCP_TOOL_CACHE_BACKOFF_SECONDS_DEFAULT,
+            ) * 2 ** (failures - 1),
+            cls._get_setting(
+                ENV_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS, VALUE_MCP_TOOL_CACHE_MAX_BACKOFF_SECONDS_DEFAULT,
+            ),
+        )
+
+        return ToolCatalogEntry(
+            tools=previous.tools,
+            loaded_on=previous.loaded_on,
+            expires_on=previous.expires_on,
+            failures=failures,
+            retry_on=time.monotonic() + backoff,
+        )
+
+    # ------------------------------------ Persistence ----------------------------------
+
+    @classmethod
+    def _load_catalog(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+    ) -> Optional[ToolCatalogEntry]:
+        """
+        Load a persisted tool catalog from the shared store and cache it.
+
+        A stale catalog keeps the failure count and retry time of the cached
+        entry, so that polling the store does not reset the backoff.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+
+        Returns:
+            Optional[ToolCatalogEntry]: The cache entry or None if no usable catalog exists.
+        """
+        catalog = shared_store.get(NAMESPACE_MCP_TOOL_CATALOG, name)
+
+        if catalog is None:
+            return None
+
+        try:
+            if catalog.get(KEY_FINGERPRINT) != cls._get_fingerprint(connection):
+                logger.debug("Ignoring outdated MCP tool catalog for server: %s", name)
+
+                return None
+
+            mcp_tools = [MCPTool.model_validate(tool) for tool in catalog[KEY_TOOLS]]
+            entry = cls._build_entry(
+                name,
+                connection,
+                mcp_tools,
+                age=max(0.0, time.time() - catalog[KEY_SAVED_ON]),
+            )
+        except Exception as e: # pylint: disable=broad-except
+            logger.warning("Failed to load MCP tool catalog of server '%s': %s", name, e)
+
+            return None
+
+        logger.debug("Loaded %d MCP server tools for server '%s' from the shared store.", len(entry.tools), name)
+
+        previous = cls.CACHE.get(name)
+
+        # A stale catalog is no successful lookup, the backoff of failed ones goes on.
+        if previous is not None and not entry.is_fresh(time.monotonic()):
+            entry.failures = previous.failures
+            entry.retry_on = previous.retry_on
+
+        cls.CACHE[name] = entry
+
+        return entry
+
+    @classmethod
+    def _save_catalog(
+        cls,
+        name: str,
+        connection: dict[str, Any],
+        mcp_tools: list[MCPTool],
+    ) -> None:
+        """
+        Persist the tool schemas of an MCP server to the shared store.
+
+        Args:
+            name (str): Name of the MCP server.
+            connection (dict[str, Any]): Connection configuration of the MCP server.
+            mcp_tools (list[MCPTool]): The raw MCP tool definitions.
+        """
+        shared_store.put(
+            NAMESPACE_MCP_TOOL_CATALOG,
+            name,
+            {
+                KEY_SAVED_ON: time.time(),
+                KEY_FINGERPRINT: cls._get_fingerprint(connection),
+                KEY_TOOLS: [mcp_tool.model_dump(mode="json") for mcp_tool in mcp_tools],
+            },
+        )
+
+    @staticmethod
+    def _get_fingerprint(connection: dict[str, Any]) -> str:
+        """
+        Get a fingerprint of the connection, excluding the (secret bearing) environment.
+        """
+        identity = [connection[KEY_TRANSPORT], connection[KEY_COMMAND], *connection[KEY_ARGS]]
+
+        return hashlib.sha256(json.dumps(identity).encode(ENCODING_UTF8)).hexdigest()
+
+    @staticmethod
+    def _get_setting(key: str, default: float) -> float:
+        """
+        Get a numeric setting from the environment.
+        """
+        return float(os.getenv(key, str(default)))
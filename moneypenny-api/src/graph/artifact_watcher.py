@@ -0,0 +1,355 @@
+"""
+Live events of the documents produced by a run.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+import asyncio
+
+import threading
+
+from contextvars import ContextVar
+
+from pathlib import PurePath
+
+from typing import Annotated, Any, AsyncIterator, Optional
+
+from langchain_core.tools import BaseTool, InjectedToolArg, StructuredTool
+
+from common.constants import (
+    KEY_ARTIFACT,
+    KEY_STATUS,
+    KEY_NAME,
+    KEY_SIZE,
+    KEY_CONTENT_TYPE,
+    KEY_PATH,
+    STATUS_CREATED,
+    STATUS_UPDATED,
+    STATUS_FINALIZED,
+    STATUS_DELETED,
+    STREAM_MODE_CUSTOM,
+    ENV_ARTIFACT_EVENTS_INTERVAL_SECONDS,
+    VALUE_ARTIFACT_EVENTS_INTERVAL_SECONDS_DEFAULT,
+)
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+from util.tool import get_output_paths
+
+
+logger = getLogger(__name__)
+
+# Output files claimed by the tool calls of the run in the current context
+run_outputs: ContextVar[Optional[set[str]]] = ContextVar("run_outputs", default=None)
+
+
+class ArtifactWatcher:
+    """
+    Watches the sandbox for the documents a run creates or modifies, its artifacts,
+    while the run streams.
+
+    The sandbox is shared by concurrent runs and uploads, so only the files the
+    tool calls of the run name as their outputs are its artifacts, see
+    `claim_outputs`. Every `ARTIFACT_EVENTS_INTERVAL_SECONDS` their metadata is
+    compared, off the event loop, with a snapshot taken when the run started.
+    An artifact is reported `created` when it first shows up, `finalized` once
+    its size and modification time hold between two snapshots or the run ends,
+    `updated` if it changes again after that and `deleted` if it disappears.
+    Files still being written are not reported again until they settle.
+    """
+
+    def __init__(
+        self,
+        repository: DocumentRepository,
+        interval: float = None,
+    ):
+        """
+        Initialize the watcher.
+
+        Args:
+            repository (DocumentRepository): Repository of the sandbox.
+            interval (float): Seconds between snapshots, 0 for no live events.
+        """
+        self.repository = repository
+        self.interval = interval if interval is not None else float(
+            os.getenv(ENV_ARTIFACT_EVENTS_INTERVAL_SECONDS, str(VALUE_ARTIFACT_EVENTS_INTERVAL_SECONDS_DEFAULT))
+        )
+        self.baseline: Optional[dict[str, Document]] = None
+        # Metadata of the artifacts as last seen, and the ones reported finalized
+        self.seen: dict[str, Document] = {}
+        self.finalized: set[str] = set()
+        # Output files claimed by the tool calls of the run
+        self.outputs: set[str] = set()
+        # The run finalizes its artifacts from its last node, which may run in a thread
+        self.lock = threading.Lock()
+
+    async def watch(
+        self,
+        updates: AsyncIterator[tuple[str, dict[str, Any]]],
+    ) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        """
+        Pass the updates of a run through, interleaved with the artifact events
+        of the run as custom updates.
+
+        The updates are consumed by a task of their own, which is cancelled when
+        the stream is, so that the run is cancelled with it. The tool calls of
+        the run claim their outputs in the context of that task.
+
+        Args:
+            updates (AsyncIterator[tuple[str, dict[str, Any]]]): The updates of the run and their stream modes.
+
+        Yields:
+            tuple[str, dict[str, Any]]: The updates and the artifact events.
+        """
+        self.baseline = await asyncio.to_thread(self.repository.snapshot)
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def forward() -> None:
+            run_outputs.set(self.outputs)
+
+            try:
+                async for item in updates:
+                    await queue.put((item, None))
+
+                await queue.put((None, None))
+            except Exception as e: # pylint: disable=broad-except
+                await queue.put((None, e))
+
+        forwarder = asyncio.create_task(forward())
+        getter: Optional[asyncio.Future] = None
+        poll_on = time.monotonic() + self.interval if self.interval > 0 else None
+
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(queue.get())
+
+                done, _ = await asyncio.wait(
+                    {getter}, timeout=max(0, poll_on - time.monotonic()) if poll_on is not None else None,
+                )
+
+                if poll_on is not None and time.monotonic() >= poll_on:
+                    for event in await self._poll():
+                        yield STREAM_MODE_CUSTOM, event
+
+                    poll_on = time.monotonic() + self.interval
+
+                if not done:
+                    continue
+
+                item, error = getter.result()
+                getter = None
+
+                if error is not None:
+                    raise error
+
+                if item is None:
+                    return
+
+                yield item
+        finally:
+            for task in (getter, forwarder):
+                if task is not None and not task.done():
+                    task.cancel()
+
+            await asyncio.gather(*(task for task in (getter, forwarder) if task is not None), return_exceptions=True)
+
+    def finish(self) -> list[dict[str, Any]]:
+        """
+        Finalize the artifacts of a run that has done its work.
+
+        Returns:
+            list[dict[str, Any]]: The artifact events not reported yet.
+        """
+        if self.baseline is None:
+            return []
+
+        return self._diff(self.repository.snapshot(), final=True)
+
+    def get_artifacts(self) -> list[dict[str, Any]]:
+        """
+        Get the finalized artifacts of the run.
+
+        Returns:
+            list[dict[str, Any]]: The artifacts, by name.
+        """
+        return [to_artifact(self.seen[name]) for name in sorted(self.finalized)]
+
+    async def _poll(self) -> list[dict[str, Any]]:
+        """
+        Take a snapshot of the sandbox and get the artifact events since the last one.
+
+        Returns:
+            list[dict[str, Any]]: The artifact events.
+        """
+        try:
+            current = await asyncio.to_thread(self.repository.snapshot)
+        except Exception as e: # pylint: disable=broad-except
+            logger.warning("Could not take a snapshot of the documents: %s", e)
+
+            return []
+
+        return self._diff(current)
+
+    def _diff(
+        self,
+        current: dict[str, Document],
+        final: bool = False,
+    ) -> list[dict[str, Any]]:
+        """
+        Get the artifact events of a snapshot of the sandbox.
+
+        Args:
+            current (dict[str, Document]): The snapshot.
+            final (bool): Whether the run is done, which finalizes every artifact.
+
+        Returns:
+            list[dict[str, Any]]: The artifact events.
+        """
+        with self.lock:
+            events = self._get_events(current, final)
+
+        if events:
+            logger.debug("Artifact events: %s", [(event[KEY_ARTIFACT], event[KEY_STATUS]) for event in events])
+
+        return events
+
+    def _get_events(
+        self,
+        current: dict[str, Document],
+        final: bool,
+    ) -> list[dict[str, Any]]:
+        """
+        Get the artifact events of a snapshot, recording the artifacts seen.
+
+        Args:
+            current (dict[str, Document]): The snapshot.
+            final (bool): Whether the run is done.
+
+        Returns:
+            list[dict[str, Any]]: The artifact events.
+        """
+        events = []
+
+        for name, document in current.items():
+            if name not in self.outputs or document == self.baseline.get(name):
+                continue
+
+            previous = self.seen.get(name)
+
+            if final:
+                status = STATUS_FINALIZED if previous != document or name not in self.finalized else None
+            elif previous is None:
+                status = STATUS_CREATED
+            elif previous != document:
+                status = STATUS_UPDATED if name in self.finalized else None
+            else:
+                status = STATUS_FINALIZED if name not in self.finalized else None
+
+            self.seen[name] = document
+
+            if status is None:
+                continue
+
+            if status == STATUS_FINALIZED:
+                self.finalized.add(name)
+            else:
+                self.finalized.discard(name)
+
+            events.append({KEY_ARTIFACT: name, KEY_STATUS: status, **_describe(document)})
+
+        for name in [name for name in self.seen if name not in current]:
+            del self.seen[name]
+            self.finalized.discard(name)
+
+            events.append({KEY_ARTIFACT: name, KEY_STATUS: STATUS_DELETED})
+
+        return events
+
+
+def claim_outputs(tools: list[BaseTool]) -> list[BaseTool]:
+    """
+    Wrap tools so that their calls claim the files named by their `output*`
+    arguments as outputs of the run they are made for.
+
+    Args:
+        tools (list[BaseTool]): The tools to wrap.
+
+    Returns:
+        list[BaseTool]: The tools, wrapped where they are async structured tools.
+    """
+    return [
+        _claim_tool_outputs(tool)
+        if isinstance(tool, StructuredTool) and tool.coroutine
+        else tool
+        for tool in tools
+    ]
+
+
+def _claim_tool_outputs(tool: StructuredTool) -> BaseTool:
+    """
+    Wrap a single tool so that its calls claim their outputs.
+
+    Args:
+        tool (StructuredTool): The tool to wrap.
+
+    Returns:
+        BaseTool: The wrapped tool.
+    """
+    async def call_tool(
+        runtime: Annotated[object | None, InjectedToolArg()] = None,
+        **arguments: Any,
+    ) -> Any:
+        outputs = run_outputs.get()
+
+        if outputs is not None:
+            outputs.update(str(PurePath(output)) for output in get_output_paths(arguments))
+
+        return await tool.coroutine(runtime=runtime, **arguments)
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call_tool,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+        handle_tool_error=tool.handle_tool_error,
+    )
+
+
+def to_artifact(document: Document) -> dict[str, Any]:
+    """
+    Describe a document produced by a run.
+
+    Args:
+        document (Document): The document.
+
+    Returns:
+        dict[str, Any]: Its name, size, content type and download path.
+    """
+    return {KEY_NAME: document.name, **_describe(document)}
+
+
+def _describe(document: Document) -> dict[str, Any]:
+    """
+    Get the size, content type and download path of a document.
+
+    Args:
+        document (Document): The document.
+
+    Returns:
+        dict[str, Any]: The description.
+    """
+    return {
+        KEY_SIZE: document.size,
+        KEY_CONTENT_TYPE: document.content_type,
+        KEY_PATH: f"/documents/{document.name}",
+    }
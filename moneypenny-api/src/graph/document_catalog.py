@@ -0,0 +1,211 @@
+"""
+Catalog of the documents available to the agent, injected into its context.
+"""
+
+from logging import getLogger
+
+import os
+
+import re
+
+import difflib
+
+from pathlib import PurePath
+
+from typing import Optional
+
+from common.constants import (
+    APPLICATION_PDF,
+    ENV_CATALOG_MAX_TOKENS,
+    VALUE_CATALOG_MAX_TOKENS_DEFAULT,
+)
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+from cache.session_store import estimate_tokens
+
+
+logger = getLogger(__name__)
+
+# Minimum similarity of a word of the prompt and a document name to match them
+MATCH_RATIO = 0.8
+
+# Words of the prompt compared to document names, shorter ones are too ambiguous
+WORD_PATTERN = re.compile(r"[\w.-]{4,}")
+
+# Separators of the words of document names
+SEPARATOR_PATTERN = re.compile(r"[\s_.-]+")
+
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
+def match_documents(
+    prompt: str,
+    documents: list[Document],
+) -> list[Document]:
+    """
+    Match the documents mentioned in a prompt.
+
+    A document is mentioned when its name, or its name without the extension,
+    appears in the prompt, or when a word of the prompt is close to either, e.g.
+    "invoice" or "invoce.pdf" for "invoice.pdf".
+
+    Args:
+        prompt (str): The prompt.
+        documents (list[Document]): The documents.
+
+    Returns:
+        list[Document]: The mentioned documents, in the given order.
+    """
+    text = _normalize(prompt)
+    words = set(WORD_PATTERN.findall(prompt.lower()))
+    candidates: dict[str, set[str]] = {}
+    matched = set()
+
+    for document in documents:
+        name = document.name.lower()
+        stem = _normalize(PurePath(name).stem)
+
+        if name in prompt.lower() or (len(stem) >= 3 and re.search(rf"\b{re.escape(stem)}\b", text)):
+            matched.add(document.name)
+
+            continue
+
+        candidates.setdefault(name, set()).add(document.name)
+        candidates.setdefault(stem, set()).add(document.name)
+
+    for word in words if candidates else ():
+        for candidate in difflib.get_close_matches(word, candidates, n=len(candidates), cutoff=MATCH_RATIO):
+            matched.update(candidates[candidate])
+
+    return [document for document in documents if document.name in matched]
+
+
+def build_catalog(
+    prompt: str,
+    repository: DocumentRepository,
+    documents: list[Document] = None,
+    max_tokens: int = None,
+) -> Optional[str]:
+    """
+    Build a compact catalog of the documents relevant to a prompt: their names,
+    types, sizes and page counts, when known.
+
+    Only the documents mentioned in the prompt are listed, or, if it mentions
+    none, the most recently modified documents. The catalog is held to
+    `CATALOG_MAX_TOKENS`, the documents that do not fit are only counted.
+
+    Args:
+        prompt (str): The prompt.
+        repository (DocumentRepository): The document repository.
+        documents (list[Document]): The documents, all documents of the repository if not given.
+        max_tokens (int): Token budget of the catalog, 0 disables the catalog.
+
+    Returns:
+        Optional[str]: The catalog or None if disabled.
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv(ENV_CATALOG_MAX_TOKENS, str(VALUE_CATALOG_MAX_TOKENS_DEFAULT)))
+
+    if max_tokens <= 0:
+        return None
+
+    if documents is None:
+        documents = repository.list_documents()
+
+    if not documents:
+        return "There are no documents in the sandbox."
+
+    matched = match_documents(prompt, documents)
+    selected = matched or sorted(documents, key=lambda document: document.modified_on, reverse=True)
+
+    header = (
+        f"Documents in the sandbox mentioned in the prompt ({len(matched)} of {len(documents)}):"
+        if matched
+        else f"Documents in the sandbox, most recent first ({len(documents)}):"
+    )
+    lines = [header]
+    tokens = estimate_tokens(header)
+    # Room for the line counting the documents left out
+    reserve = estimate_tokens(f"- ... and {len(documents)} more documents.")
+
+    for index, document in enumerate(selected):
+        line = _describe(document, repository)
+        tokens += estimate_tokens(line)
+
+        if tokens + reserve > max_tokens:
+            lines.append(f"- ... and {len(selected) - index} more documents.")
+
+            break
+
+        lines.append(line)
+
+    logger.debug("Document catalog: %d of %d documents listed.", len(lines) - 1, len(documents))
+
+    return "\n".join(lines)
+
+
+def _describe(
+    document: Document,
+    repository: DocumentRepository,
+) -> str:
+    """
+    Describe a document in a catalog line.
+
+    Args:
+        document (Document): The document.
+        repository (DocumentRepository): The document repository.
+
+    Returns:
+        str: The catalog line.
+    """
+    fields = [document.name, document.content_type, _format_size(document.size)]
+
+    if document.content_type == APPLICATION_PDF:
+        pages = repository.get_document_page_count(document.name)
+
+        if pages is not None:
+            fields.append(f"{pages} pages")
+
+    return f"- {' | '.join(fields)}"
+
+
+def _format_size(size: int) -> str:
+    """
+    Format a size in bytes for humans, e.g. "1.2 MB".
+
+    Args:
+        size (int): The size in bytes.
+
+    Returns:
+        str: The formatted size.
+    """
+    if size < 1024:
+        return f"{size} {SIZE_UNITS[0]}"
+
+    value = size / 1024
+
+    for unit in SIZE_UNITS[1:-1]:
+        if value < 1024:
+            break
+
+        value /= 1024
+    else:
+        unit = SIZE_UNITS[-1]
+
+    return f"{value:.1f} {unit}"
+
+
+def _normalize(text: str) -> str:
+    """
+    Normalize a text for matching: lowercase, with words separated by single spaces.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The normalized text.
+    """
+    return SEPARATOR_PATTERN.sub(" ", text.lower()).strip()
@@ -0,0 +1,95 @@
+"""
+Selection of the documents targeted by set-based prompts.
+"""
+
+from logging import getLogger
+
+import re
+
+from typing import Optional
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+
+logger = getLogger(__name__)
+
+# Document kinds a set-based prompt can refer to, mapped to their file extensions.
+# An empty tuple selects every document.
+DOCUMENT_KINDS = {
+    "documents": (),
+    "files": (),
+    "pdfs": (".pdf",),
+    "pdf files": (".pdf",),
+    "pdf documents": (".pdf",),
+    "word documents": (".doc", ".docx"),
+    "word files": (".doc", ".docx"),
+    "docx files": (".docx",),
+    "docx documents": (".docx",),
+    "excel files": (".xls", ".xlsx"),
+    "spreadsheets": (".xls", ".xlsx", ".ods", ".csv"),
+    "presentations": (".ppt", ".pptx", ".odp"),
+    "images": (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp"),
+    "scans": (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff"),
+    "scanned documents": (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff"),
+}
+
+SET_PATTERN = re.compile(
+    r"\b(?:all|every|each)(?: of)?(?: the)?(?: my)? "
+    rf"(?P<kind>{'|'.join(sorted((re.escape(kind) for kind in DOCUMENT_KINDS), key=len, reverse=True))})\b",
+    re.IGNORECASE,
+)
+
+
+def select_documents(
+    prompt: str,
+    repository: DocumentRepository,
+) -> Optional[list[Document]]:
+    """
+    Select the documents targeted by a set-based prompt, such as
+    "Add 'CONFIDENTIAL' watermark to all PDFs".
+
+    Args:
+        prompt (str): The prompt.
+        repository (DocumentRepository): The document repository.
+
+    Returns:
+        Optional[list[Document]]: The targeted documents or None if the prompt is not set-based.
+    """
+    match = SET_PATTERN.search(prompt)
+
+    if match is None:
+        return None
+
+    extensions = DOCUMENT_KINDS[match.group("kind").lower()]
+    documents = [
+        document for document in repository.list_documents()
+        if not extensions or document.name.lower().endswith(extensions)
+    ]
+
+    logger.debug(
+        "Prompt targets all %s: %d document(s) selected.", match.group("kind"), len(documents),
+    )
+
+    return documents
+
+
+def get_document_prompt(
+    prompt: str,
+    document: str,
+) -> str:
+    """
+    Get the prompt of a sub-run that processes a single document of a set.
+
+    Args:
+        prompt (str): The set-based prompt.
+        document (str): Name of the document.
+
+    Returns:
+        str: The prompt of the sub-run.
+    """
+    return (
+        f"{prompt} Only process the document '{document}', ignore all other documents; "
+        "the others are processed separately."
+    )
@@ -0,0 +1,456 @@
+"""
+Execution budgets of agent runs: step and tool call caps, timeouts and deadlines.
+"""
+
+from logging import getLogger
+
+import os
+
+import json
+
+import time
+
+import asyncio
+
+from dataclasses import dataclass, asdict, fields
+
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain.agents.middleware.types import ToolCallRequest
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from common.constants import (
+    KEY_BUDGET,
+    KEY_LIMIT,
+    KEY_USED,
+    VALUE_ERROR,
+    BUDGET_MAX_STEPS,
+    BUDGET_MAX_TOOL_CALLS,
+    BUDGET_TOOL_TIMEOUT_SECONDS,
+    BUDGET_DEADLINE_SECONDS,
+    BUDGET_MAX_TOKENS,
+    ENV_BUDGET_MAX_STEPS,
+    ENV_BUDGET_MAX_TOOL_CALLS,
+    ENV_BUDGET_TOOL_TIMEOUT_SECONDS,
+    ENV_BUDGET_DEADLINE_SECONDS,
+    ENV_BUDGET_MAX_TOKENS,
+    ENV_BUDGET_TENANTS,
+    VALUE_BUDGET_MAX_STEPS_DEFAULT,
+    VALUE_BUDGET_MAX_TOOL_CALLS_DEFAULT,
+    VALUE_BUDGET_TOOL_TIMEOUT_SECONDS_DEFAULT,
+    VALUE_BUDGET_DEADLINE_SECONDS_DEFAULT,
+    VALUE_BUDGET_MAX_TOKENS_DEFAULT,
+)
+
+from metrics.instruments import budgets_exceeded
+
+from util.tool import call_with_timeout
+
+
+logger = getLogger(__name__)
+
+# Descriptions of the budgets, as shown in responses
+BUDGET_DESCRIPTIONS = {
+    BUDGET_MAX_STEPS: "agent steps",
+    BUDGET_MAX_TOOL_CALLS: "tool calls",
+    BUDGET_TOOL_TIMEOUT_SECONDS: "seconds per tool call",
+    BUDGET_DEADLINE_SECONDS: "seconds",
+    BUDGET_MAX_TOKENS: "tokens",
+}
+
+
+@dataclass
+class ExecutionBudget:
+    """
+    Limits of a run, 0 for no limit.
+
+    Attributes:
+        max_steps: Maximum number of agent steps, i.e. model calls.
+        max_tool_calls: Maximum number of tool calls.
+        tool_timeout_seconds: Maximum duration of a single tool call.
+        deadline_seconds: Maximum wall-clock duration of the run.
+        max_tokens: Maximum number of tokens used by model calls, as reported by the provider.
+    """
+
+    max_steps: int = 0
+    max_tool_calls: int = 0
+    tool_timeout_seconds: float = 0
+    deadline_seconds: float = 0
+    max_tokens: int = 0
+
+    @classmethod
+    def create(
+        cls,
+        tenant: Optional[str] = None,
+        requested: Optional[dict[str, Any]] = None,
+    ) -> "ExecutionBudget":
+        """
+        Create the budget of a run.
+
+        The defaults are read from the `BUDGET_*` environment variables and can
+        be overridden per tenant with `BUDGET_TENANTS`, e.g.
+        `{"acme": {"max_tool_calls": 50, "deadline_seconds": 600}}`. Limits
+        requested with the run can only tighten the resulting budget.
+
+        Args:
+            tenant (Optional[str]): The tenant the run is made for.
+            requested (Optional[dict[str, Any]]): Limits requested with the run.
+
+        Returns:
+            ExecutionBudget: The budget.
+        """
+        budget = cls(
+            max_steps=int(os.getenv(ENV_BUDGET_MAX_STEPS, str(VALUE_BUDGET_MAX_STEPS_DEFAULT))),
+            max_tool_calls=int(os.getenv(ENV_BUDGET_MAX_TOOL_CALLS, str(VALUE_BUDGET_MAX_TOOL_CALLS_DEFAULT))),
+            tool_timeout_seconds=float(
+                os.getenv(ENV_BUDGET_TOOL_TIMEOUT_SECONDS, str(VALUE_BUDGET_TOOL_TIMEOUT_SECONDS_DEFAULT))
+            ),
+            deadline_seconds=float(
+                os.getenv(ENV_BUDGET_DEADLINE_SECONDS, str(VALUE_BUDGET_DEADLINE_SECONDS_DEFAULT))
+            ),
+            max_tokens=int(os.getenv(ENV_BUDGET_MAX_TOKENS, str(VALUE_BUDGET_MAX_TOKENS_DEFAULT))),
+        )
+        names = {field.name for field in fields(cls)}
+
+        if tenant:
+            overrides = json.loads(os.getenv(ENV_BUDGET_TENANTS, "{}")).get(tenant, {})
+
+            for name, value in overrides.items():
+                if name not in names:
+                    logger.warning("Ignoring unknown budget '%s' of tenant '%s'.", name, tenant)
+
+                    continue
+
+                setattr(budget, name, value)
+
+        for name, value in (requested or {}).items():
+            if name not in names or not value:
+                continue
+
+            limit = getattr(budget, name)
+
+            setattr(budget, name, min(value, limit) if limit else value)
+
+        return budget
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Convert the budget to a dictionary.
+
+        Returns:
+            dict[str, Any]: The limits, keyed by budget.
+        """
+        return asdict(self)
+
+
+@dataclass
+class BudgetExceeded:
+    """
+    A budget exceeded by a run.
+
+    Attributes:
+        budget: Name of the budget, e.g. `max_tool_calls`.
+        limit: The limit.
+        used: How much of the budget the run used.
+        final: Whether the run was stopped, rather than only the tool call.
+    """
+
+    budget: str
+    limit: float
+    used: float
+    final: bool = True
+
+    @property
+    def message(self) -> str:
+        """
+        Explanation of the budget exceeded, as shown to the model and the client.
+        """
+        description = BUDGET_DESCRIPTIONS.get(self.budget, self.budget)
+
+        if not self.final:
+            return f"The tool call was stopped: it exceeded the limit of {self.limit:g} {description}."
+
+        return (
+            f"Stopped: the run exceeded its budget of {self.limit:g} {description}"
+            f" ({self.used:g} used). The work done so far is kept."
+        )
+
+    def to_event(self) -> dict[str, Any]:
+        """
+        Convert to the custom stream event reporting it.
+
+        Returns:
+            dict[str, Any]: The event.
+        """
+        return {KEY_BUDGET: self.budget, KEY_LIMIT: self.limit, KEY_USED: self.used}
+
+
+class ExecutionBudgetMiddleware(AgentMiddleware):
+    """
+    Agent middleware enforcing the execution budget of a run.
+
+    A single instance serves all agents of a run, so that the budget covers the
+    run as a whole, across per-document sub-runs and model tier escalations.
+
+    Once the steps, tool calls, tokens or deadline of the run are used up, the
+    next model call is replaced by a final message explaining which budget was
+    exceeded, ending the agent with the results of the tool calls made so far.
+    Tool calls over the budget are not made, and tool calls taking longer than
+    the per-tool timeout, or than what is left of the deadline, are cancelled.
+    """
+
+    def __init__(
+        self,
+        budget: ExecutionBudget,
+        started_on: float = None,
+        used: Optional[dict[str, float]] = None,
+    ):
+        """
+        Initialize the middleware.
+
+        Args:
+            budget (ExecutionBudget): The budget of the run.
+            started_on (float): When the run started, per `time.monotonic`, now if not given.
+            used (Optional[dict[str, float]]): Budget the run used before it was resumed, as
+                returned by `get_used`; the time it was interrupted for is not counted.
+        """
+        super().__init__()
+
+        used = used or {}
+
+        self.budget = budget
+        self.started_on = (
+            started_on if started_on is not None else time.monotonic()
+        ) - used.get(BUDGET_DEADLINE_SECONDS, 0)
+        self.steps = int(used.get(BUDGET_MAX_STEPS, 0))
+        self.tool_calls = int(used.get(BUDGET_MAX_TOOL_CALLS, 0))
+        self.tokens = int(used.get(BUDGET_MAX_TOKENS, 0))
+        self.exceeded: Optional[BudgetExceeded] = None
+        self.events: list[BudgetExceeded] = []
+
+    def get_used(self) -> dict[str, float]:
+        """
+        Get how much of its budget the run used so far.
+
+        Returns:
+            dict[str, float]: The steps, tool calls, tokens and seconds used, keyed by budget.
+        """
+        return {
+            BUDGET_MAX_STEPS: self.steps,
+            BUDGET_MAX_TOOL_CALLS: self.tool_calls,
+            BUDGET_MAX_TOKENS: self.tokens,
+            BUDGET_DEADLINE_SECONDS: round(time.monotonic() - self.started_on, 3),
+        }
+
+    def get_remaining_seconds(self) -> Optional[float]:
+        """
+        Get the time left until the deadline of the run.
+
+        Returns:
+            Optional[float]: The seconds left, None if the run has no deadline.
+        """
+        if not self.budget.deadline_seconds:
+            return None
+
+        return self.budget.deadline_seconds - (time.monotonic() - self.started_on)
+
+    def check(self) -> Optional[BudgetExceeded]:
+        """
+        Check whether the run is over its budget or past its deadline.
+
+        Returns:
+            Optional[BudgetExceeded]: The budget exceeded, None if the run can go on.
+        """
+        if self.exceeded is not None:
+            return self.exceeded
+
+        remaining = self.get_remaining_seconds()
+
+        if remaining is not None and remaining <= 0:
+            return self._exceed_deadline()
+
+        return None
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse | AIMessage:
+        """
+        Make a model call within the budget, or end the agent once it is used up.
+
+        Args:
+            request (ModelRequest): The model request.
+            handler (Callable[[ModelRequest], Awaitable[ModelResponse]]): Makes the model call.
+
+        Returns:
+            ModelResponse | AIMessage: The model response, or the final message if a budget is exceeded.
+        """
+        exceeded = self.check()
+
+        if exceeded is None and self.budget.max_steps and self.steps >= self.budget.max_steps:
+            exceeded = self._exceed(BUDGET_MAX_STEPS, self.budget.max_steps, self.steps)
+
+        if exceeded is None and self.budget.max_tokens and self.tokens >= self.budget.max_tokens:
+            exceeded = self._exceed(BUDGET_MAX_TOKENS, self.budget.max_tokens, self.tokens)
+
+        if exceeded is not None:
+            return AIMessage(content=exceeded.message)
+
+        self.steps += 1
+
+        try:
+            response = await call_with_timeout(handler(request), self.get_remaining_seconds())
+        except asyncio.TimeoutError:
+            return AIMessage(content=self._exceed_deadline().message)
+
+        for message in response.result:
+            usage = getattr(message, "usage_metadata", None)
+
+            if usage:
+                self.tokens += usage.get("total_tokens", 0)
+
+        return response
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        """
+        Make a tool call within the budget, cancelling it once it takes too long.
+
+        Args:
+            request (ToolCallRequest): The tool call request.
+            handler (Callable[[ToolCallRequest], Awaitable[Any]]): Makes the tool call.
+
+        Returns:
+            Any: The tool result, or an error tool message if a budget is exceeded.
+        """
+        exceeded = self.check()
+
+        if exceeded is None and self.budget.max_tool_calls and self.tool_calls >= self.budget.max_tool_calls:
+            exceeded = self._exceed(BUDGET_MAX_TOOL_CALLS, self.budget.max_tool_calls, self.tool_calls)
+
+        if exceeded is not None:
+            return self._get_error_message(request, exceeded)
+
+        self.tool_calls += 1
+
+        try:
+            return await call_with_timeout(handler(request), self.get_tool_timeout())
+        except asyncio.TimeoutError:
+            return self._get_error_message(request, self.time_out(request.tool_call["name"]))
+
+    def get_tool_timeout(self) -> Optional[float]:
+        """
+        Get the time a tool call may take: the per-tool timeout, or what is left
+        of the deadline if that is sooner.
+
+        Returns:
+            Optional[float]: The seconds, None if tool calls may take any time.
+        """
+        remaining = self.get_remaining_seconds()
+        timeout = self.budget.tool_timeout_seconds or None
+
+        if remaining is not None and (timeout is None or remaining < timeout):
+            timeout = max(0, remaining)
+
+        return timeout
+
+    def time_out(self, tool: str) -> BudgetExceeded:
+        """
+        Record that a tool call timed out, per `get_tool_timeout`.
+
+        A tool call that took longer than the per-tool timeout is stopped on
+        its own, the run goes on. One that ran into the deadline stops the run.
+
+        Args:
+            tool (str): Name of the tool, or of the node making the call, for the logs.
+
+        Returns:
+            BudgetExceeded: The budget exceeded.
+        """
+        remaining = self.get_remaining_seconds()
+
+        if remaining is not None and remaining <= 0:
+            return self._exceed_deadline()
+
+        logger.warning("Tool call '%s' timed out after %s seconds.", tool, self.budget.tool_timeout_seconds)
+
+        exceeded = BudgetExceeded(
+            budget=BUDGET_TOOL_TIMEOUT_SECONDS,
+            limit=self.budget.tool_timeout_seconds,
+            used=self.budget.tool_timeout_seconds,
+            final=False,
+        )
+
+        self.events.append(exceeded)
+        budgets_exceeded.inc(BUDGET_TOOL_TIMEOUT_SECONDS)
+
+        return exceeded
+
+    def _exceed(
+        self,
+        budget: str,
+        limit: float,
+        used: float,
+    ) -> BudgetExceeded:
+        """
+        Record that a budget of the run is used up.
+
+        Args:
+            budget (str): Name of the budget.
+            limit (float): The limit.
+            used (float): How much of the budget the run used.
+
+        Returns:
+            BudgetExceeded: The budget exceeded.
+        """
+        logger.info("Run exceeded its %s budget: %s of %s.", budget, used, limit)
+
+        self.exceeded = BudgetExceeded(budget=budget, limit=limit, used=used)
+        self.events.append(self.exceeded)
+        budgets_exceeded.inc(budget)
+
+        return self.exceeded
+
+    def _exceed_deadline(self) -> BudgetExceeded:
+        """
+        Record that the deadline of the run has passed.
+
+        Returns:
+            BudgetExceeded: The budget exceeded.
+        """
+        if self.exceeded is not None:
+            return self.exceeded
+
+        return self._exceed(
+            BUDGET_DEADLINE_SECONDS,
+            self.budget.deadline_seconds,
+            round(time.monotonic() - self.started_on, 3),
+        )
+
+    @staticmethod
+    def _get_error_message(
+        request: ToolCallRequest,
+        exceeded: BudgetExceeded,
+    ) -> ToolMessage:
+        """
+        Get the tool message answering a tool call stopped by a budget.
+
+        Args:
+            request (ToolCallRequest): The tool call request.
+            exceeded (BudgetExceeded): The budget exceeded.
+
+        Returns:
+            ToolMessage: The tool message.
+        """
+        return ToolMessage(
+            content=exceeded.message,
+            name=request.tool_call["name"],
+            tool_call_id=request.tool_call["id"],
+            status=VALUE_ERROR,
+        )
@@ -0,0 +1,51 @@
+"""
+Resilience of the model calls of agents.
+"""
+
+from typing import Awaitable, Callable
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+
+from util.resilience import get_upstream
+
+
+class ModelResilienceMiddleware(AgentMiddleware):
+    """
+    Agent middleware making model calls through the circuit breaker of their
+    model, retrying transient provider failures and, if enabled, hedging slow
+    calls.
+
+    Model calls have no side effects, so they are safe to repeat. The breaker,
+    retry policy and latencies are per model and shared by all agents.
+    """
+
+    def __init__(self, model: str):
+        """
+        Initialize the middleware.
+
+        Args:
+            model (str): Name of the model the agent calls.
+        """
+        super().__init__()
+
+        self.upstream = get_upstream(model)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """
+        Make a model call through the resilience layer.
+
+        Args:
+            request (ModelRequest): The model request.
+            handler (Callable[[ModelRequest], Awaitable[ModelResponse]]): Makes the model call.
+
+        Returns:
+            ModelResponse: The model response.
+
+        Raises:
+            UpstreamUnavailableException: If the circuit of the model is open.
+        """
+        return await self.upstream.call(lambda: handler(request), hedge=True)
@@ -0,0 +1,293 @@
+"""
+Model routing and tiering for the process agent.
+"""
+
+from logging import getLogger
+
+import os
+
+import re
+
+import json
+
+import importlib
+
+from dataclasses import dataclass
+
+from typing import Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from common.constants import (
+    TIER_SMALL,
+    TIER_MEDIUM,
+    TIER_LARGE,
+    MODEL_GPT_5_NANO,
+    MODEL_GPT_5_MINI,
+    MODEL_GPT_5,
+    VALUE_TOOL,
+    ENV_MODEL_ROUTER,
+    ENV_MODEL_SMALL,
+    ENV_MODEL_MEDIUM,
+    ENV_MODEL_LARGE,
+    ENV_MODEL_TENANT_TIERS,
+)
+
+from metrics.instruments import agent_run_duration, agent_run_failures, agent_escalations, model_tokens
+
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ModelSelection:
+    """
+    The model selected for a request.
+
+    Attributes:
+        tier: The model tier.
+        model: The model.
+        expected_tool_calls: Number of tool calls the request is expected to need.
+        reason: Why the tier was selected.
+    """
+
+    tier: str
+    model: str
+    expected_tool_calls: int
+    reason: str
+
+
+class ModelRouter:
+    """
+    Base model router.
+
+    Subclasses pick the tier of a request in `select`. The base class maps tiers
+    to models, applies the minimum tier configured for a tenant, escalates to
+    the next larger tier and records the latency, token usage, failures and
+    escalations of the agent runs per model and tier in the metrics registry.
+    """
+
+    TIERS = [TIER_SMALL, TIER_MEDIUM, TIER_LARGE]
+
+    def __init__(self):
+        """
+        Initialize the router.
+        """
+        self.models = {
+            TIER_SMALL: os.getenv(ENV_MODEL_SMALL, MODEL_GPT_5_NANO),
+            TIER_MEDIUM: os.getenv(ENV_MODEL_MEDIUM, MODEL_GPT_5_MINI),
+            TIER_LARGE: os.getenv(ENV_MODEL_LARGE, MODEL_GPT_5),
+        }
+        self.tenant_tiers: dict[str, str] = json.loads(os.getenv(ENV_MODEL_TENANT_TIERS, "{}"))
+
+    @property
+    def default_model(self) -> str:
+        """
+        The model of the medium tier.
+        """
+        return self.models[TIER_MEDIUM]
+
+    def select(
+        self,
+        prompt: str,
+        tenant: Optional[str] = None,
+    ) -> ModelSelection:
+        """
+        Select the model for a request.
+
+        Args:
+            prompt (str): The prompt.
+            tenant (Optional[str]): The tenant the request is made for.
+
+        Returns:
+            ModelSelection: The selected model.
+        """
+        return self._apply_tenant(
+            ModelSelection(TIER_MEDIUM, self.default_model, 1, "default"),
+            tenant,
+        )
+
+    def escalate(
+        self,
+        selection: ModelSelection,
+    ) -> Optional[ModelSelection]:
+        """
+        Get the selection of the next larger tier.
+
+        Args:
+            selection (ModelSelection): The current selection.
+
+        Returns:
+            Optional[ModelSelection]: The next larger tier or None if already the largest.
+        """
+        index = self.TIERS.index(selection.tier)
+
+        if index == len(self.TIERS) - 1:
+            return None
+
+        agent_escalations.inc(selection.model, selection.tier)
+
+        tier = self.TIERS[index + 1]
+
+        return ModelSelection(tier, self.models[tier], selection.expected_tool_calls, "escalation")
+
+    def is_confident(
+        self,
+        selection: ModelSelection,
+        messages: list[BaseMessage],
+    ) -> bool:
+        """
+        Check whether a run looks successful enough to not escalate it.
+
+        A run is not trusted if it ended without a response, or if it was
+        expected to call tools and did not call any.
+
+        Args:
+            selection (ModelSelection): The selection the run was made with.
+            messages (list[BaseMessage]): Messages of the run.
+
+        Returns:
+            bool: Whether the run is trusted.
+        """
+        if not messages or not messages[-1].content:
+            return False
+
+        return selection.expected_tool_calls == 0 or any(
+            message.type == VALUE_TOOL for message in messages
+        )
+
+    def record(
+        self,
+        selection: ModelSelection,
+        latency: float,
+        messages: list[BaseMessage] = None,
+        failed: bool = False,
+    ) -> None:
+        """
+        Record latency and token usage of an agent run.
+
+        Args:
+            selection (ModelSelection): The selection the run was made with.
+            latency (float): Latency of the run in seconds.
+            messages (list[BaseMessage]): Messages of the run.
+            failed (bool): Whether the run failed.
+        """
+        agent_run_duration.observe(latency, selection.model, selection.tier)
+
+        if failed:
+            agent_run_failures.inc(selection.model, selection.tier)
+
+        for message in messages or []:
+            usage = getattr(message, "usage_metadata", None) if isinstance(message, AIMessage) else None
+
+            if usage:
+                model_tokens.inc(selection.model, selection.tier, "input", amount=usage.get("input_tokens", 0))
+                model_tokens.inc(selection.model, selection.tier, "output", amount=usage.get("output_tokens", 0))
+
+    def _apply_tenant(
+        self,
+        selection: ModelSelection,
+        tenant: Optional[str],
+    ) -> ModelSelection:
+        """
+        Raise a selection to the minimum tier configured for the tenant.
+
+        Args:
+            selection (ModelSelection): The selection.
+            tenant (Optional[str]): The tenant.
+
+        Returns:
+            ModelSelection: The selection, at least of the tenant's minimum tier.
+        """
+        tier = self.tenant_tiers.get(tenant) if tenant else None
+
+        if tier not in self.TIERS or self.TIERS.index(tier) <= self.TIERS.index(selection.tier):
+            return selection
+
+        return ModelSelection(tier, self.models[tier], selection.expected_tool_calls, f"tenant {tenant}")
+
+
+class HeuristicModelRouter(ModelRouter):
+    """
+    Model router that picks the tier from prompt complexity heuristics.
+
+    Prompts naming a single operation or none go to the small tier, prompts
+    involving several operations to the medium tier, and long prompts,
+    multi-step workflows and operations that need judgement (redaction,
+    signing, forms, ...) to the large tier. Runs of prompts naming no operation
+    are not escalated for answering without calling a tool.
+    """
+
+    OPERATION_PATTERN = re.compile(
+        r"\b(watermark|ocr|redact|sign|convert|rotate|merge|split|extract|flatten|compress"
+        r"|optimi[sz]e|annotate|stamp|crop|compare)\w*",
+        re.IGNORECASE,
+    )
+    STEP_PATTERN = re.compile(r"\b(then|afterwards|after that|finally|next)\b", re.IGNORECASE)
+    COMPLEX_PATTERN = re.compile(
+        r"\b(redact\w*|sign\w*|forms?|compare|summar\w*|translat\w*|if|unless|depending|each page)\b",
+        re.IGNORECASE,
+    )
+
+    # Prompt lengths (in characters) above which a prompt is no longer simple, resp. is complex
+    SIMPLE_PROMPT_LENGTH = 120
+    COMPLEX_PROMPT_LENGTH = 400
+
+    def select(
+        self,
+        prompt: str,
+        tenant: Optional[str] = None,
+    ) -> ModelSelection:
+        """
+        Select the model for a request from prompt complexity heuristics.
+
+        Args:
+            prompt (str): The prompt.
+            tenant (Optional[str]): The tenant the request is made for.
+
+        Returns:
+            ModelSelection: The selected model.
+        """
+        operations = {match.lower() for match in self.OPERATION_PATTERN.findall(prompt)}
+        # Prompts naming no operation, e.g. questions about the documents, need not call tools
+        expected_tool_calls = max(
+            len(operations), len(self.STEP_PATTERN.findall(prompt)) + 1,
+        ) if operations else 0
+
+        if self.COMPLEX_PATTERN.search(prompt):
+            tier, reason = TIER_LARGE, "complex operation"
+        elif expected_tool_calls >= 3 or len(prompt) > self.COMPLEX_PROMPT_LENGTH:
+            tier, reason = TIER_LARGE, f"{expected_tool_calls} expected tool calls"
+        elif expected_tool_calls <= 1 and len(prompt) <= self.SIMPLE_PROMPT_LENGTH:
+            tier, reason = TIER_SMALL, "single operation" if expected_tool_calls else "no operation"
+        else:
+            tier, reason = TIER_MEDIUM, f"{expected_tool_calls} expected tool calls"
+
+        selection = self._apply_tenant(
+            ModelSelection(tier, self.models[tier], expected_tool_calls, reason),
+            tenant,
+        )
+
+        logger.debug(
+            "Selected model '%s' (%s tier, %s).", selection.model, selection.tier, selection.reason,
+        )
+
+        return selection
+
+
+def create_model_router() -> ModelRouter:
+    """
+    Create the model router configured by `MODEL_ROUTER` ("module:Class"),
+    defaulting to the heuristic router.
+
+    Returns:
+        ModelRouter: The model router.
+    """
+    router_path = os.getenv(ENV_MODEL_ROUTER)
+
+    if not router_path:
+        return HeuristicModelRouter()
+
+    module_name, class_name = router_path.split(":")
+
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,320 @@
+"""
+Page-range sharding of operations on very large documents.
+"""
+
+from logging import getLogger
+
+import os
+
+import copy
+
+import uuid
+
+import asyncio
+
+from pathlib import PurePath
+
+from typing import Annotated, Any, Callable, Optional
+
+from langchain_core.tools import BaseTool, InjectedToolArg, StructuredTool, ToolException
+
+from langgraph.config import get_stream_writer
+
+from common.constants import (
+    TOOL_DOCUMENT_PROCESSOR,
+    KEY_DOCUMENT,
+    KEY_CHUNK,
+    KEY_PAGES,
+    KEY_STATUS,
+    STATUS_PROCESSING,
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    STATUS_RETRYING,
+    STATUS_MERGING,
+    ENV_SHARDING_MIN_PAGES,
+    ENV_SHARDING_CHUNK_PAGES,
+    ENV_SHARDING_CONCURRENCY,
+    ENV_SHARDING_RETRIES,
+    VALUE_SHARDING_MIN_PAGES_DEFAULT,
+    VALUE_SHARDING_CHUNK_PAGES_DEFAULT,
+    VALUE_SHARDING_CONCURRENCY_DEFAULT,
+    VALUE_SHARDING_RETRIES_DEFAULT,
+)
+
+from repository.document_repository import DocumentRepository
+
+from util.tool import invoke_tool
+
+
+logger = getLogger(__name__)
+
+
+class PageSharder:
+    """
+    Runs page-local Build API operations on large PDFs in page-range chunks.
+
+    The document is split into chunks of consecutive pages which are processed
+    concurrently, each chunk retried on its own if it fails, and the chunk
+    outputs are then merged back in order. Only instructions made of page-local
+    actions (watermark, rotation, OCR, ...) on a single PDF part are sharded;
+    output conversions, such as to PDF/A, have to see the whole document.
+
+    The document processor tool is wrapped with the sharder, so that calls made
+    by the agent and routed calls alike are sharded.
+    """
+
+    # Actions whose result on a page does not depend on the other pages
+    PAGE_LOCAL_ACTIONS = {"watermark", "rotate", "ocr", "flatten"}
+
+    def __init__(
+        self,
+        min_pages: int = None,
+        chunk_pages: int = None,
+        concurrency: int = None,
+        retries: int = None,
+    ):
+        """
+        Initialize the sharder.
+
+        Args:
+            min_pages (int): Minimum number of pages of a document to shard it.
+            chunk_pages (int): Number of pages per chunk.
+            concurrency (int): Maximum number of chunks processed concurrently.
+            retries (int): Number of retries of a failed chunk.
+        """
+        self.min_pages = min_pages or int(
+            os.getenv(ENV_SHARDING_MIN_PAGES, str(VALUE_SHARDING_MIN_PAGES_DEFAULT))
+        )
+        self.chunk_pages = chunk_pages or int(
+            os.getenv(ENV_SHARDING_CHUNK_PAGES, str(VALUE_SHARDING_CHUNK_PAGES_DEFAULT))
+        )
+        self.concurrency = concurrency or int(
+            os.getenv(ENV_SHARDING_CONCURRENCY, str(VALUE_SHARDING_CONCURRENCY_DEFAULT))
+        )
+        self.retries = retries if retries is not None else int(
+            os.getenv(ENV_SHARDING_RETRIES, str(VALUE_SHARDING_RETRIES_DEFAULT))
+        )
+
+    def wrap(
+        self,
+        tools: list[BaseTool],
+        repository: DocumentRepository,
+    ) -> list[BaseTool]:
+        """
+        Wrap the document processor tool so that its calls on large documents are sharded.
+
+        Args:
+            tools (list[BaseTool]): The tools to wrap.
+            repository (DocumentRepository): Repository of the sandbox the tools work in.
+
+        Returns:
+            list[BaseTool]: The tools, the document processor wrapped.
+        """
+        return [
+            self._wrap_tool(tool, repository)
+            if tool.name == TOOL_DOCUMENT_PROCESSOR and isinstance(tool, StructuredTool) and tool.coroutine
+            else tool
+            for tool in tools
+        ]
+
+    def get_page_count(
+        self,
+        args: dict[str, Any],
+        repository: DocumentRepository,
+    ) -> Optional[int]:
+        """
+        Get the page count of the document if the tool call should be sharded.
+
+        Args:
+            args (dict[str, Any]): Arguments of the document processor call.
+            repository (DocumentRepository): Repository of the sandbox.
+
+        Returns:
+            Optional[int]: The page count or None if the call should not be sharded.
+        """
+        instructions = args.get("instructions") or {}
+
+        # Calls made by the agent may come with arguments of any shape
+        if not isinstance(instructions, dict) or not isinstance(args.get("outputPath"), str):
+            return None
+
+        parts = instructions.get("parts") or []
+        actions = instructions.get("actions") or []
+
+        if (
+            len(parts) != 1
+            or not isinstance(parts[0], dict)
+            or "pages" in parts[0]
+            or "output" in instructions
+            or not actions
+            or any(
+                not isinstance(action, dict) or action.get("type") not in self.PAGE_LOCAL_ACTIONS
+                for action in actions
+            )
+        ):
+            return None
+
+        page_count = repository.get_document_page_count(parts[0].get("file", ""))
+
+        return page_count if page_count and page_count >= self.min_pages else None
+
+    async def run(
+        self,
+        tool: BaseTool,
+        args: dict[str, Any],
+        page_count: int,
+        repository: DocumentRepository,
+    ) -> str:
+        """
+        Run a document processor call in page-range chunks and merge the outputs.
+
+        Args:
+            tool (BaseTool): The document processor tool.
+            args (dict[str, Any]): Arguments of the document processor call.
+            page_count (int): Page count of the document.
+            repository (DocumentRepository): Repository of the sandbox.
+
+        Returns:
+            str: The response of the merge call.
+
+        Raises:
+            ToolException: If a chunk failed on all attempts or the merge failed.
+        """
+        write = _get_writer()
+        document = args["instructions"]["parts"][0]["file"]
+        output = PurePath(args["outputPath"])
+        ranges = [
+            (start, min(start + self.chunk_pages, page_count) - 1)
+            for start in range(0, page_count, self.chunk_pages)
+        ]
+        # Unique per call, concurrent runs and sub-runs may write outputs of the same name
+        prefix = f"{output.stem}.{uuid.uuid4().hex[:12]}"
+        chunk_paths = [str(output.with_name(f"{prefix}.part{index:04d}.pdf")) for index in range(len(ranges))]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        logger.debug(
+            "Sharding '%s' (%d pages) into %d chunks of up to %d pages.",
+            document, page_count, len(ranges), self.chunk_pages,
+        )
+
+        async def run_chunk(index: int) -> None:
+            start, end = ranges[index]
+            chunk_args = copy.deepcopy(args)
+            chunk_args["instructions"]["parts"][0]["pages"] = {"start": start, "end": end}
+            chunk_args["outputPath"] = chunk_paths[index]
+            event = {KEY_DOCUMENT: document, KEY_CHUNK: index, KEY_PAGES: f"{start + 1}-{end + 1}"}
+
+            async with semaphore:
+                for attempt in range(self.retries + 1):
+                    write({**event, KEY_STATUS: STATUS_PROCESSING if attempt == 0 else STATUS_RETRYING})
+
+                    try:
+                        await invoke_tool(tool, chunk_args)
+                    except Exception as e: # pylint: disable=broad-except
+                        logger.warning(
+                            "Chunk %d of '%s' failed on attempt %d: %s", index, document, attempt + 1, e,
+                        )
+
+                        if attempt == self.retries:
+                            write({**event, KEY_STATUS: STATUS_FAILED})
+
+                            raise
+
+                        await asyncio.sleep(attempt + 1)
+
+                        continue
+
+                    write({**event, KEY_STATUS: STATUS_COMPLETED})
+
+                    return
+
+        try:
+            # A task group cancels the remaining chunks as soon as one has failed for good.
+            async with asyncio.TaskGroup() as group:
+                for index in range(len(ranges)):
+                    group.create_task(run_chunk(index))
+
+            write({KEY_DOCUMENT: document, KEY_STATUS: STATUS_MERGING})
+
+            return await invoke_tool(
+                tool,
+                {
+                    "instructions": {"parts": [{"file": chunk_path} for chunk_path in chunk_paths]},
+                    "outputPath": str(output),
+                },
+            )
+        except Exception as e:
+            raise ToolException(f"Sharded processing of '{document}' failed: {e}") from e
+        finally:
+            await asyncio.to_thread(_remove_chunks, chunk_paths, repository)
+
+
+    def _wrap_tool(
+        self,
+        tool: StructuredTool,
+        repository: DocumentRepository,
+    ) -> BaseTool:
+        """
+        Wrap the document processor tool with the sharder.
+
+        Args:
+            tool (StructuredTool): The document processor tool.
+            repository (DocumentRepository): Repository of the sandbox the tool works in.
+
+        Returns:
+            BaseTool: The wrapped tool.
+        """
+        async def call_tool(
+            runtime: Annotated[object | None, InjectedToolArg()] = None,
+            **arguments: Any,
+        ) -> Any:
+            # Counting the pages reads the document, off the event loop
+            page_count = await asyncio.to_thread(self.get_page_count, arguments, repository)
+
+            if page_count is None:
+                return await tool.coroutine(runtime=runtime, **arguments)
+
+            content = await self.run(tool, arguments, page_count, repository)
+
+            return (content, None) if tool.response_format == "content_and_artifact" else content
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=call_tool,
+            response_format=tool.response_format,
+            metadata=tool.metadata,
+            handle_tool_error=tool.handle_tool_error,
+        )
+
+
+def _remove_chunks(
+    chunk_paths: list[str],
+    repository: DocumentRepository,
+) -> None:
+    """
+    Remove the chunk outputs of a sharded call that were written.
+
+    Args:
+        chunk_paths (list[str]): Paths of the chunk outputs, relative to the sandbox.
+        repository (DocumentRepository): Repository of the sandbox.
+    """
+    for chunk_path in chunk_paths:
+        path = repository.base_path / chunk_path
+
+        try:
+            if path.is_file():
+                path.unlink()
+        except OSError as e:
+            logger.warning("Could not remove chunk '%s': %s", chunk_path, e)
+
+
+def _get_writer() -> Callable[[dict[str, Any]], None]:
+    """
+    Get the graph stream writer, or a no-op outside of a graph run.
+    """
+    try:
+        return get_stream_writer()
+    except (RuntimeError, KeyError):
+        return lambda _: None
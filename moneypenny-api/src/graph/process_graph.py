@@ -8,39 +8,123 @@ import os
 
 import gc
 
-from typing import Any, Type, Union, get_type_hints
+import time
+
+import asyncio
+
+import uuid
+
+import shlex
+
+from dataclasses import asdict
+
+from typing import Any, Optional, Type, Union, get_type_hints
 
 from langchain.agents import create_agent
 
+from langchain_core.tools import BaseTool
+
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 
 from common.constants import (
     NODE_ENTRY_POINT,
     NODE_VALIDATE_STATE,
+    NODE_CHECK_CACHE,
+    NODE_ROUTE,
     NODE_SET_UP,
+    NODE_CATALOG,
     NODE_PROCESS,
+    NODE_PROCESS_DOCUMENT,
+    NODE_AGGREGATE,
     NODE_EXIT_POINT,
-    MODEL_GPT_5_MINI,
+    MCP_SERVER_NUTRIENT_DWS,
+    MCP_COMMAND_NUTRIENT_DWS,
+    ENV_MCP_COMMAND_NUTRIENT_DWS,
     KEY_PROMPT,
+    KEY_TENANT,
+    KEY_SESSION_ID,
+    KEY_BUDGET,
+    KEY_ARTIFACTS,
+    KEY_RUN_ID,
+    KEY_CONFIGURABLE,
+    KEY_THREAD_ID,
     KEY_RESPONSE,
+    KEY_CACHED,
+    KEY_CATALOG,
+    KEY_DOCUMENT,
+    KEY_DOCUMENTS,
+    KEY_STATUS,
     KEY_MESSAGES,
     KEY_ROLE,
     KEY_CONTENT,
+    KEY_CACHE_KEY,
+    KEY_SELECTION,
+    KEY_SNAPSHOT,
+    KEY_TARGETS,
+    KEY_DONE,
+    KEY_BUDGET_USED,
+    STREAM_MODE_VALUES,
+    STREAM_MODE_CUSTOM,
     VALUE_USER,
+    VALUE_SYSTEM,
     VALUE_TOOL,
     VALUE_AGENT,
+    VALUE_ERROR,
+    STATUS_PROCESSING,
+    STATUS_COMPLETED,
+    STATUS_FAILED,
     PROMPT_APPENDIX_NO_QUESTIONS,
     ENV_DOCUMENT_BASE_PATH,
     VALUE_DOCUMENT_BASE_PATH_DEFAULT,
+    ENV_FAN_OUT_CONCURRENCY,
+    VALUE_FAN_OUT_CONCURRENCY_DEFAULT,
 )
+from common.exception import ObjectNotFoundException, ClientException, UpstreamUnavailableException
 
 from schema.process_graph_state_schema import ProcessGraphState
 
 from factory.mcp_server_tool_factory import MCPServerToolFactory
+from factory.chat_model_factory import ChatModelFactory
+from factory.checkpointer_factory import CheckpointerFactory
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+from cache.result_cache import ResultCache
+from cache.shared_store import shared_store
+from cache.tool_call_cache import ToolCallCache
+from cache.session_store import SessionStore
+
+from graph.prompt_router import PromptRouter
+from graph.page_sharder import PageSharder
+from graph.model_router import ModelSelection, create_model_router
+from graph.document_selector import select_documents, get_document_prompt
+from graph.document_catalog import build_catalog
+from graph.execution_budget import ExecutionBudget, ExecutionBudgetMiddleware
+from graph.model_resilience import ModelResilienceMiddleware
+from graph.artifact_watcher import ArtifactWatcher, claim_outputs, to_artifact
+
+from metrics.instruments import time_node, runs_in_flight, runs_cancelled
+
+from util.tool import clean_up_on_cancel, get_completed_tool_steps, get_text
 
 
 logger = getLogger(__name__)
 
+repository = DocumentRepository(os.getenv(ENV_DOCUMENT_BASE_PATH, VALUE_DOCUMENT_BASE_PATH_DEFAULT))
+result_cache = ResultCache(store=shared_store)
+tool_call_cache = ToolCallCache()
+session_store = SessionStore()
+prompt_router = PromptRouter()
+page_sharder = PageSharder()
+model_router = create_model_router()
+
+# State of a run kept for the graph and its resumption, not streamed to the client
+INTERNAL_STATE_KEYS = (KEY_CACHE_KEY, KEY_SELECTION, KEY_SNAPSHOT, KEY_TARGETS, KEY_DONE, KEY_BUDGET_USED)
+
 
 class ProcessGraph(StateGraph):
     """
@@ -51,9 +135,24 @@ class ProcessGraph(StateGraph):
 
     agent: Any
 
+    agents: dict[str, Any] = None
+
+    snapshot: dict[str, Document] = None
+
+    failed: bool = False
+
+    history: list[dict[str, str]] = None
+
+    artifacts: list[Document] = None
+
+    budget: ExecutionBudgetMiddleware = None
+
+    watcher: ArtifactWatcher = None
+
     def __init__(
         self,
         data: dict = None,
+        run_id: str = None,
     ) -> None:
         """
         Initialize the process graph.
@@ -61,6 +160,7 @@ class ProcessGraph(StateGraph):
         Args:
             session: The session to use.
             data: The data to use.
+            run_id: Id of the run, used to checkpoint it and to resume it; generated if not given.
 
         Returns:
             None
@@ -68,27 +168,212 @@ class ProcessGraph(StateGraph):
         super().__init__(self.state_schema)
 
         self.data = data
+        self.run_id = run_id or uuid.uuid4().hex
+        self.repository = repository
+        self.started_on = time.monotonic()
 
         self._build()
 
     async def stream(
         self,
         state: Union[dict[str, Any], Any] = None,
+        resume: bool = False,
     ):
         """
-        Stream the graph execution, yielding state updates.
+        Stream the graph execution, yielding state updates and per-document progress.
+
+        Updates are yielded as (mode, update) pairs: full states with the `values`
+        mode and per-document progress, exceeded budgets and the artifacts of the
+        run as they are written with the `custom` mode.
+
+        The run is checkpointed after every node, and its agents after every
+        step, so that an interrupted run can be resumed from its last checkpoint.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The initial state, the graph data if not given.
+            resume (bool): Whether to resume the run from its last checkpoint instead.
+
+        Raises:
+            asyncio.CancelledError: If the run is cancelled, e.g. when its client disconnects.
+            ClientException: If resuming while checkpointing is disabled.
+            ObjectNotFoundException: If resuming a run that has no checkpoints.
         """
         logger.debug("Streaming the graph...")
 
-        if state is None:
-            state = self.data
+        checkpointer = await CheckpointerFactory.create()
+        graph = self.compile(checkpointer=checkpointer)
+        config = {
+            KEY_CONFIGURABLE: {KEY_THREAD_ID: self.run_id},
+            "max_concurrency": max(
+                1, int(os.getenv(ENV_FAN_OUT_CONCURRENCY, str(VALUE_FAN_OUT_CONCURRENCY_DEFAULT)))
+            ),
+        }
+
+        if resume:
+            if checkpointer is None:
+                raise ClientException("Runs cannot be resumed, checkpointing is disabled.")
+
+            snapshot = await graph.aget_state(config)
+
+            if not snapshot.values:
+                raise ObjectNotFoundException(f"Run '{self.run_id}' not found.")
+
+            logger.debug("Resuming run '%s' before node(s): %s", self.run_id, snapshot.next)
+
+            if not snapshot.next:
+                # The run has completed already.
+                yield STREAM_MODE_VALUES, _get_public_state(snapshot.values)
+
+                return
+
+            state = None
+        else:
+            if state is None:
+                state = self.data
+
+            for key, _ in get_type_hints(self.state_schema).items():
+                if key not in state:
+                    state[key] = None
+
+            state[KEY_RUN_ID] = self.run_id
+
+            if session_store.enabled and not state[KEY_SESSION_ID]:
+                state[KEY_SESSION_ID] = uuid.uuid4().hex
+
+        runs_in_flight.inc()
+
+        self.watcher = ArtifactWatcher(self.repository)
+
+        try:
+            # State updates ("values") are interleaved with per-document progress ("custom").
+            # Checkpoints are written before moving on to the next node, so that none is lost.
+            # Without a checkpointer there is nothing to write, and LangGraph fails on the option.
+            options = {"durability": "sync"} if checkpointer is not None else {}
+
+            async for mode, update in self.watcher.watch(graph.astream(
+                state,
+                config=config,
+                stream_mode=[STREAM_MODE_VALUES, STREAM_MODE_CUSTOM],
+                **options,
+            )):
+                yield mode, _get_public_state(update) if mode == STREAM_MODE_VALUES else update
+        except asyncio.CancelledError:
+            # The client went away: the cancellation reaches the running nodes, and with
+            # them the provider requests and the MCP tool calls in flight.
+            logger.info("Run '%s' cancelled.", self.run_id)
+
+            runs_cancelled.inc()
+
+            raise
+        finally:
+            runs_in_flight.dec()
+
+    @staticmethod
+    async def check_resumable(run_id: str) -> None:
+        """
+        Check that a run can be resumed, i.e. that it has been checkpointed.
+
+        Only the latest checkpoint of the run is looked up, none of its nodes runs.
+
+        Args:
+            run_id (str): Id of the run.
+
+        Raises:
+            ClientException: If checkpointing is disabled.
+            ObjectNotFoundException: If the run has no checkpoints.
+        """
+        checkpointer = await CheckpointerFactory.create()
+
+        if checkpointer is None:
+            raise ClientException("Runs cannot be resumed, checkpointing is disabled.")
+
+        if await checkpointer.aget_tuple({KEY_CONFIGURABLE: {KEY_THREAD_ID: run_id}}) is None:
+            raise ObjectNotFoundException(f"Run '{run_id}' not found.")
+
+    def add_node(
+        self,
+        node: str,
+        action: Any = None,
+        **kwargs,
+    ) -> "ProcessGraph":
+        """
+        Add a node to the graph, timing its runs.
+
+        Args:
+            node (str): Name of the node.
+            action (Any): The node function.
+
+        Returns:
+            ProcessGraph: The graph.
+        """
+        return super().add_node(node, time_node(node, action), **kwargs)
+
+    @staticmethod
+    async def get_tools(refresh: bool = False) -> list[BaseTool]:
+        """
+        Get the MCP server tools available to the agent.
+
+        Calls of deterministic tools are wrapped in the tool call cache, calls on
+        very large documents are sharded by page range, cancelled calls remove
+        the partial output they left behind, and the output files of calls are
+        claimed by the run they are made for. The MCP
+        server command can be overridden with `MCP_COMMAND_NUTRIENT_DWS`, e.g. to
+        run against a stand-in server.
+
+        Args:
+            refresh (bool): Whether to spawn the MCP server and rediscover its tools.
+
+        Returns:
+            list[BaseTool]: The tools.
+        """
+        create = MCPServerToolFactory.refresh if refresh else MCPServerToolFactory.create
+        command, *args = shlex.split(
+            os.getenv(ENV_MCP_COMMAND_NUTRIENT_DWS, MCP_COMMAND_NUTRIENT_DWS)
+        )
+        tools = await create(
+            name=MCP_SERVER_NUTRIENT_DWS,
+            command=command,
+            args=[*args, "--sandbox", str(repository.base_path)],
+        )
+
+        return claim_outputs(
+            clean_up_on_cancel(
+                page_sharder.wrap(tool_call_cache.wrap(tools, repository), repository),
+                repository,
+            )
+        )
+
+    async def build_agent(
+        self,
+        model: str = None,
+    ) -> Any:
+        """
+        Build the agent used by the process node, once per model.
+
+        The agents of a run share the middleware enforcing its execution budget,
+        within which model calls are retried and hedged per model.
+
+        Args:
+            model (str): The model, the default model of the model router if not given.
+
+        Returns:
+            Any: The agent.
+        """
+        model = model or model_router.default_model
+
+        if self.agents is None:
+            self.agents = {}
+
+        if model not in self.agents:
+            self.agents[model] = create_agent(
+                model=ChatModelFactory.create(model),
+                tools=await self.get_tools(),
+                middleware=[self._get_budget(), ModelResilienceMiddleware(model)],
+            )
 
-        for key, _ in get_type_hints(self.state_schema).items():
-            if key not in state:
-                state[key] = None
+        self.agent = self.agents[model]
 
-        async for update in self.compile().astream(state, stream_mode="values"):
-            yield update
+        return self.agent
 
     def _build(self) -> None:
         """
@@ -109,18 +394,41 @@ class ProcessGraph(StateGraph):
                ╰────────┬─────────╯
                         │
                         v
-                   ╭──────────╮
-                   │  set_up  │
-                   ╰────┬─────╯
-                        │
-                        v
-                  ╭────────────╮
-                  │  process   │
-                  ╰─────┬──────╯
-                        │
-                        v
-                 ╭──────────────╮
-                 │  exit_point  │
+                ╭───────────────╮
+                │  check_cache  │──────────────────╮
+                ╰───────┬───────╯  hit             │
+                        │ miss                     │
+                        v                          │
+                   ╭─────────╮                     │
+                   │  route  │────────────────────>│
+                   ╰────┬────╯  routed             │
+                        │                          │
+                        v                          │
+                   ╭──────────╮                    │
+                   │  set_up  │                    │
+                   ╰────┬─────╯                    │
+                        │                          │
+                        v                          │
+                   ╭───────────╮                   │
+                   │  catalog  │                   │
+                   ╰────┬──────╯                   │
+                        │                          │
+           single ╭─────┴──────╮ set (one per      │
+                  │            │ document)         │
+                  v            v                   │
+          ╭───────────╮  ╭────────────────────╮    │
+          │  process  │  │  process_document  │    │
+          ╰─────┬─────╯  ╰─────────┬──────────╯    │
+                │                  │               │
+                │                  v               │
+                │           ╭─────────────╮        │
+                │           │  aggregate  │        │
+                │           ╰──────┬──────╯        │
+                │                  │               │
+                ╰───────╮    ╭─────╯               │
+                        v    v                     │
+                 ╭──────────────╮                  │
+                 │  exit_point  │<─────────────────╯
                  ╰──────┬───────╯
                         │
                         v
@@ -135,15 +443,37 @@ class ProcessGraph(StateGraph):
 
         self.add_node(NODE_ENTRY_POINT, self._entry_point)
         self.add_node(NODE_VALIDATE_STATE, self._validate_state)
+        self.add_node(NODE_CHECK_CACHE, self._check_cache)
+        self.add_node(NODE_ROUTE, self._route)
         self.add_node(NODE_SET_UP, self._set_up)
+        self.add_node(NODE_CATALOG, self._catalog)
         self.add_node(NODE_PROCESS, self._process)
+        self.add_node(NODE_PROCESS_DOCUMENT, self._process_document)
+        self.add_node(NODE_AGGREGATE, self._aggregate)
         self.add_node(NODE_EXIT_POINT, self._exit_point)
 
         self.add_edge(START, NODE_ENTRY_POINT)
         self.add_edge(NODE_ENTRY_POINT, NODE_VALIDATE_STATE)
-        self.add_edge(NODE_VALIDATE_STATE, NODE_SET_UP)
-        self.add_edge(NODE_SET_UP, NODE_PROCESS)
+        self.add_edge(NODE_VALIDATE_STATE, NODE_CHECK_CACHE)
+        self.add_conditional_edges(
+            NODE_CHECK_CACHE,
+            self._is_done,
+            {True: NODE_EXIT_POINT, False: NODE_ROUTE},
+        )
+        self.add_conditional_edges(
+            NODE_ROUTE,
+            self._is_done,
+            {True: NODE_EXIT_POINT, False: NODE_SET_UP},
+        )
+        self.add_edge(NODE_SET_UP, NODE_CATALOG)
+        self.add_conditional_edges(
+            NODE_CATALOG,
+            self._dispatch,
+            [NODE_PROCESS, NODE_PROCESS_DOCUMENT],
+        )
         self.add_edge(NODE_PROCESS, NODE_EXIT_POINT)
+        self.add_edge(NODE_PROCESS_DOCUMENT, NODE_AGGREGATE)
+        self.add_edge(NODE_AGGREGATE, NODE_EXIT_POINT)
         self.add_edge(NODE_EXIT_POINT, END)
 
         logger.debug("The process graph created.")
@@ -195,6 +525,106 @@ class ProcessGraph(StateGraph):
 
         return state
 
+    async def _check_cache(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Union[dict[str, Any], Any]:
+        """
+        Serve the result of an identical earlier run, if there is one.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Union[dict[str, Any], Any]: The state after the node is run.
+        """
+        state[KEY_CACHED] = False
+
+        # Follow-up prompts depend on the conversation, not only on the prompt.
+        if not result_cache.enabled or self._get_history(state[KEY_SESSION_ID]):
+            return state
+
+        # The documents the prompt names are hashed off the event loop, large ones take a while.
+        state[KEY_CACHE_KEY] = await asyncio.to_thread(
+            result_cache.get_key,
+            prompt=state[KEY_PROMPT],
+            model=self._select_model(state).model,
+            tools=await self.get_tools(),
+            repository=self.repository,
+        )
+
+        result = result_cache.get(state[KEY_CACHE_KEY], self.repository)
+
+        if result is not None:
+            logger.debug("Serving cached result: %s", state[KEY_CACHE_KEY])
+
+            state[KEY_RESPONSE] = result.response
+            state[KEY_CACHED] = True
+            state[KEY_DONE] = True
+
+        return state
+
+    async def _route(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Union[dict[str, Any], Any]:
+        """
+        Run formulaic prompts as a single direct tool call, bypassing the agent.
+
+        The tool call is held to the per-tool timeout and the deadline of the run.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Union[dict[str, Any], Any]: The state after the node is run.
+        """
+        # The sandbox is walked off the event loop, as are the document lookups of the router.
+        await self._take_snapshot(state)
+        budget = self._get_budget(state)
+
+        try:
+            content = await prompt_router.route(
+                state[KEY_PROMPT], await self.get_tools(), self.repository, budget.get_tool_timeout(),
+            )
+        except asyncio.TimeoutError:
+            state[KEY_DONE] = True
+            state[KEY_RESPONSE] = budget.time_out(NODE_ROUTE).message
+
+            self._report_budget(state)
+
+            return state
+
+        if content is None:
+            return state
+
+        state[KEY_DONE] = True
+        state[KEY_RESPONSE] = f"Tool used: {content}"
+
+        if state[KEY_CACHE_KEY] is not None:
+            result_cache.put(
+                state[KEY_CACHE_KEY],
+                state[KEY_RESPONSE],
+                await asyncio.to_thread(self._get_artifacts, state),
+            )
+
+        return state
+
+    def _is_done(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> bool:
+        """
+        Check whether the response is complete and the rest of the graph can be skipped.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            bool: Whether the response is complete.
+        """
+        return bool(state[KEY_DONE])
+
     async def _set_up(
         self,
         state: Union[dict[str, Any], Any],
@@ -210,26 +640,56 @@ class ProcessGraph(StateGraph):
         """
         logger.debug("Setting up the graph...")
 
-        # 1. Modify prompt to avoid additional questions.
+        # 1. Select the model tier from the prompt as given.
+        selection = self._select_model(state)
+
+        # 2. Modify prompt to avoid additional questions.
         state[KEY_PROMPT] += PROMPT_APPENDIX_NO_QUESTIONS
 
-        # 2. Set up MCP server tools and agent.
-        document_base_path = os.getenv(ENV_DOCUMENT_BASE_PATH, VALUE_DOCUMENT_BASE_PATH_DEFAULT)
-        tools = await MCPServerToolFactory.create(
-            name="nutrient-dws",
-            command="dws-mcp-wrapper.sh",
-            args=["--sandbox", document_base_path],
-        )
+        # 3. Set up MCP server tools and the agent of the selected model tier, within the run's budget.
+        self._get_budget(state)
 
-        self.agent = create_agent(
-            model=MODEL_GPT_5_MINI,
-            tools=tools,
-        )
+        await self.build_agent(selection.model)
+
+        # 4. Resolve the documents targeted by set-based prompts.
+        documents = await asyncio.to_thread(select_documents, state[KEY_PROMPT], self.repository)
+
+        if documents is not None and len(documents) > 1:
+            state[KEY_TARGETS] = [document.name for document in documents]
+
+        await self._take_snapshot(state)
 
         logger.debug("Graph set up.")
 
         return state
 
+    def _catalog(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Union[dict[str, Any], Any]:
+        """
+        Catalog the documents relevant to the prompt for the agent, so that it
+        does not have to spend a model call and a tool call finding them.
+
+        Sub-runs of set-based prompts get the catalog of their document instead.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Union[dict[str, Any], Any]: The state after the node is run.
+        """
+        if not state[KEY_TARGETS]:
+            snapshot = self._get_snapshot(state)
+
+            state[KEY_CATALOG] = build_catalog(
+                state[KEY_PROMPT].removesuffix(PROMPT_APPENDIX_NO_QUESTIONS),
+                self.repository,
+                list(snapshot.values()) if snapshot is not None else None,
+            )
+
+        return state
+
     async def _process(
         self,
         state: Union[dict[str, Any], Any],
@@ -245,22 +705,322 @@ class ProcessGraph(StateGraph):
         """
         logger.debug("Processing documents...")
 
-        prompt = state[KEY_PROMPT]
+        self._get_budget(state)
 
-        response = await self.agent.ainvoke(
-            {
-                KEY_MESSAGES: [
-                    {
-                        KEY_ROLE: VALUE_USER,
-                        KEY_CONTENT: prompt
-                    }
-                ]
-            }
+        state[KEY_RESPONSE] = await self._invoke_agent(
+            state[KEY_PROMPT], self._select_model(state), state[KEY_SESSION_ID], state[KEY_CATALOG],
         )
 
         logger.debug("Processing completed.")
 
-        for message in response[KEY_MESSAGES]:
+        self._report_budget(state)
+
+        if self.budget.exceeded is None:
+            # The sandbox is walked for the outputs off the event loop, they are memoized.
+            await asyncio.to_thread(self._get_artifacts, state)
+
+            self._cache_result(state)
+
+        return state
+
+    def _dispatch(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Union[str, list[Send]]:
+        """
+        Dispatch set-based prompts to one sub-run per targeted document.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Union[str, list[Send]]: The process node or one send per targeted document.
+        """
+        if not state[KEY_TARGETS]:
+            return NODE_PROCESS
+
+        logger.debug("Fanning out to %d documents.", len(state[KEY_TARGETS]))
+
+        snapshot = self._get_snapshot(state)
+
+        return [
+            Send(
+                NODE_PROCESS_DOCUMENT,
+                {
+                    KEY_PROMPT: get_document_prompt(state[KEY_PROMPT], document),
+                    KEY_DOCUMENT: document,
+                    KEY_SESSION_ID: state[KEY_SESSION_ID],
+                    KEY_TENANT: state[KEY_TENANT],
+                    KEY_BUDGET: state[KEY_BUDGET],
+                    KEY_BUDGET_USED: state[KEY_BUDGET_USED],
+                    KEY_SELECTION: state[KEY_SELECTION],
+                    KEY_CATALOG: build_catalog(document, self.repository, [snapshot[document]]),
+                },
+            )
+            for document in state[KEY_TARGETS]
+        ]
+
+    async def _process_document(
+        self,
+        state: dict[str, Any],
+    ) -> dict[str, Any]:
+        """
+        Process a single document of a set-based prompt.
+
+        Args:
+            state (dict[str, Any]): The sub-run state with the prompt, the document, the session id,
+                the tenant, the requested and used budget, the model selection and the catalog of the document.
+
+        Returns:
+            dict[str, Any]: The response of the sub-run, keyed by the document, and the budget used.
+        """
+        document = state[KEY_DOCUMENT]
+        write = get_stream_writer()
+
+        write({KEY_DOCUMENT: document, KEY_STATUS: STATUS_PROCESSING})
+
+        self._get_budget(state)
+
+        try:
+            response = await self._invoke_agent(
+                state[KEY_PROMPT], self._select_model(state), state[KEY_SESSION_ID], state.get(KEY_CATALOG),
+            )
+            status = STATUS_COMPLETED
+        except Exception as e: # pylint: disable=broad-except
+            logger.error("Processing document '%s' failed: %s", document, e, exc_info=True)
+
+            response = f"Failed: {e}"
+            status = STATUS_FAILED
+
+            self.failed = True
+
+        self._report_budget()
+
+        write({KEY_DOCUMENT: document, KEY_STATUS: status, KEY_RESPONSE: response})
+
+        return {KEY_DOCUMENTS: {document: response}, KEY_BUDGET_USED: self.budget.get_used()}
+
+    def _aggregate(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Union[dict[str, Any], Any]:
+        """
+        Aggregate the responses of the per-document sub-runs.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Union[dict[str, Any], Any]: The state after the node is run.
+        """
+        documents = state[KEY_DOCUMENTS] or {}
+        lines = [f"Processed {len(documents)} documents:"]
+        lines.extend(f"- {document}: {documents[document]}" for document in sorted(documents))
+
+        state[KEY_RESPONSE] = "\n".join(lines)
+
+        if not self.failed and self._get_budget(state).exceeded is None:
+            self._cache_result(state)
+
+        return state
+
+    def _select_model(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> ModelSelection:
+        """
+        Select the model tier of the run, once per run: the selection is kept in the state.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            ModelSelection: The selected model.
+        """
+        if state.get(KEY_SELECTION) is None:
+            selection = model_router.select(state[KEY_PROMPT], state.get(KEY_TENANT))
+
+            logger.debug(
+                "Using model '%s' (%s tier): %s.", selection.model, selection.tier, selection.reason,
+            )
+
+            state[KEY_SELECTION] = asdict(selection)
+
+        return ModelSelection(**state[KEY_SELECTION])
+
+    def _get_history(
+        self,
+        session_id: str,
+    ) -> list[dict[str, str]]:
+        """
+        Get the history of the session of the run, once per run.
+
+        Args:
+            session_id (str): Id of the session.
+
+        Returns:
+            list[dict[str, str]]: The history messages, empty for a new session.
+        """
+        if self.history is None:
+            self.history = session_store.get_messages(session_id)
+
+        return self.history
+
+    def _get_budget(
+        self,
+        state: Union[dict[str, Any], Any] = None,
+    ) -> ExecutionBudgetMiddleware:
+        """
+        Get the middleware enforcing the execution budget of the run, once per run.
+
+        A resumed run goes on with the budget it used before it was interrupted.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state, with the tenant, the requested
+                budget and the budget used.
+
+        Returns:
+            ExecutionBudgetMiddleware: The middleware.
+        """
+        if self.budget is None:
+            state = state or {}
+            budget = ExecutionBudget.create(state.get(KEY_TENANT), state.get(KEY_BUDGET))
+
+            logger.debug("Execution budget of run '%s': %s", self.run_id, budget)
+
+            self.budget = ExecutionBudgetMiddleware(budget, self.started_on, state.get(KEY_BUDGET_USED))
+
+        return self.budget
+
+    def _report_budget(
+        self,
+        state: Union[dict[str, Any], Any] = None,
+    ) -> None:
+        """
+        Report the budgets exceeded since the last report as custom stream events,
+        and record the budget used in the state.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state, None for sub-runs.
+        """
+        if state is not None:
+            state[KEY_BUDGET_USED] = self.budget.get_used()
+
+        write = get_stream_writer()
+
+        while self.budget.events:
+            write(self.budget.events.pop(0).to_event())
+
+    async def _invoke_agent(
+        self,
+        prompt: str,
+        selection: ModelSelection,
+        session_id: str = None,
+        catalog: str = None,
+    ) -> str:
+        """
+        Invoke the agent with a prompt, following the history of the session
+        and the catalog of the documents relevant to the prompt.
+
+        A run that fails, or that does not look trustworthy (no response, or no
+        tool call where one was expected), is retried on the next larger model
+        tier. The retry continues from the tool calls the run completed, if any
+        succeeded, rather than repeating them. The last tier's outcome is final. A run failing on the open
+        circuit of an MCP server is not retried. A run stopped by its execution
+        budget is not retried, and its response is the result of the last tool
+        call made, if any, followed by the budget exceeded.
+
+        Args:
+            prompt (str): The prompt.
+            selection (ModelSelection): The model tier selected for the run.
+            session_id (str): Id of the session.
+            catalog (str): Catalog of the documents, given to the agent as a system message.
+
+        Returns:
+            str: The response, i.e. the content of the last message.
+        """
+        history = self._get_history(session_id)
+
+        if catalog:
+            # After the history, which stays a stable prefix of the conversation
+            history = [*history, {KEY_ROLE: VALUE_SYSTEM, KEY_CONTENT: catalog}]
+
+        # Completed tool calling steps of the runs escalated from
+        steps = []
+
+        while True:
+            agent = await self.build_agent(selection.model)
+            start = time.perf_counter()
+            response = None
+
+            try:
+                # Streamed, so that the steps completed before a failure are known
+                async for response in agent.astream(
+                    {
+                        KEY_MESSAGES: [
+                            *history,
+                            {
+                                KEY_ROLE: VALUE_USER,
+                                KEY_CONTENT: prompt
+                            },
+                            *steps,
+                        ]
+                    },
+                    stream_mode=STREAM_MODE_VALUES,
+                ):
+                    pass
+            except Exception as e: # pylint: disable=broad-except
+                model_router.record(selection, time.perf_counter() - start, failed=True)
+                fallback = model_router.escalate(selection)
+                # A failing tool upstream, unlike a failing model, fails every tier alike
+                tool_outage = isinstance(e, UpstreamUnavailableException) and e.upstream != selection.model
+
+                if fallback is None or self.budget.exceeded is not None or tool_outage:
+                    raise
+
+                logger.warning(
+                    "Model '%s' failed, escalating to '%s': %s", selection.model, fallback.model, e,
+                )
+
+                if response is not None:
+                    steps = get_completed_tool_steps(response[KEY_MESSAGES][len(history) + 1:])
+
+                selection = fallback
+
+                continue
+
+            messages = response[KEY_MESSAGES][len(history):]
+
+            model_router.record(selection, time.perf_counter() - start, messages)
+
+            if self.budget.exceeded is not None or model_router.is_confident(selection, messages):
+                break
+
+            fallback = model_router.escalate(selection)
+
+            if fallback is None:
+                break
+
+            logger.warning(
+                "Response of model '%s' is not reliable, escalating to '%s'.",
+                selection.model, fallback.model,
+            )
+
+            steps = get_completed_tool_steps(messages[1:])
+            selection = fallback
+
+        if self.budget.exceeded is not None:
+            tool_messages = [
+                message for message in messages
+                if message.type == VALUE_TOOL and getattr(message, KEY_STATUS, None) != VALUE_ERROR
+            ]
+            partial = f"Tool used: {get_text(tool_messages[-1].content)}\n" if tool_messages else ""
+
+            return f"{partial}{self.budget.exceeded.message}"
+
+        result = None
+
+        for message in messages:
             message_prefix = ""
 
             if message.type == VALUE_TOOL:
@@ -268,9 +1028,85 @@ class ProcessGraph(StateGraph):
             elif message.type == VALUE_AGENT:
                 message_prefix = "Agent response:"
 
-            state[KEY_RESPONSE] = f"{message_prefix} {message.content}"
+            result = f"{message_prefix} {message.content}"
 
-        return state
+        return result
+
+    def _cache_result(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> None:
+        """
+        Cache the response of the run together with the documents it created or modified.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state, with the response and the cache key.
+        """
+        if state[KEY_CACHE_KEY] is not None:
+            result_cache.put(
+                state[KEY_CACHE_KEY],
+                state[KEY_RESPONSE],
+                self._get_artifacts(state),
+            )
+
+    async def _take_snapshot(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> None:
+        """
+        Take a snapshot of the sandbox before the run touches it, off the event loop,
+        and keep it in the state.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+        """
+        self.snapshot = await asyncio.to_thread(self.repository.snapshot)
+
+        state[KEY_SNAPSHOT] = {name: asdict(document) for name, document in self.snapshot.items()}
+
+    def _get_snapshot(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> Optional[dict[str, Document]]:
+        """
+        Get the snapshot of the sandbox taken before the run touched it, from the
+        state if the run was resumed.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            Optional[dict[str, Document]]: The documents by name, None if no snapshot was taken.
+        """
+        if self.snapshot is None and state.get(KEY_SNAPSHOT) is not None:
+            self.snapshot = {name: Document(**document) for name, document in state[KEY_SNAPSHOT].items()}
+
+        return self.snapshot
+
+    def _get_artifacts(
+        self,
+        state: Union[dict[str, Any], Any],
+    ) -> list[Document]:
+        """
+        Get the documents the run created or modified, once per run.
+
+        Other runs and uploads write to the sandbox too, so only the output
+        files claimed by the tool calls of the run are taken.
+
+        Args:
+            state (Union[dict[str, Any], Any]): The graph state.
+
+        Returns:
+            list[Document]: The documents, empty if the run did not get to touch any.
+        """
+        if self.artifacts is None:
+            snapshot = self._get_snapshot(state)
+            self.artifacts = [
+                document for document in self.repository.get_changed_documents(snapshot)
+                if self.watcher is None or document.name in self.watcher.outputs
+            ] if snapshot is not None else []
+
+        return self.artifacts
 
     def _exit_point(
         self,
@@ -287,8 +1123,39 @@ class ProcessGraph(StateGraph):
         """
         logger.debug("Exiting the process graph.")
 
+        session_store.append(
+            state[KEY_SESSION_ID],
+            state[KEY_PROMPT].removesuffix(PROMPT_APPENDIX_NO_QUESTIONS),
+            state[KEY_RESPONSE],
+            self._get_artifacts(state),
+        )
+
+        if self.watcher is not None:
+            write = get_stream_writer()
+
+            # Artifacts still settling when the run finished are finalized now
+            for event in self.watcher.finish():
+                write(event)
+
+            state[KEY_ARTIFACTS] = self.watcher.get_artifacts()
+        else:
+            state[KEY_ARTIFACTS] = [to_artifact(document) for document in self._get_artifacts(state)]
+
         del state[KEY_PROMPT]
 
         gc.collect()
 
         return state
+
+
+def _get_public_state(state: dict[str, Any]) -> dict[str, Any]:
+    """
+    Get the state of a run as streamed to the client, without its internal state.
+
+    Args:
+        state (dict[str, Any]): The graph state.
+
+    Returns:
+        dict[str, Any]: The state without its internal keys.
+    """
+    return {key: value for key, value in state.items() if key not in INTERNAL_STATE_KEYS}
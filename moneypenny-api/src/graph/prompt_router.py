@@ -0,0 +1,348 @@
+"""
+Rule-based prompt router that maps formulaic prompts directly to tool calls.
+"""
+
+from logging import getLogger
+
+import re
+
+import asyncio
+
+from dataclasses import dataclass
+
+from pathlib import PurePath
+
+from typing import Any, Callable, Optional
+
+from langchain_core.tools import BaseTool
+
+from common.constants import (
+    TOOL_DOCUMENT_PROCESSOR,
+    PROMPT_ROUTER_HIT,
+    PROMPT_ROUTER_MISS,
+    PROMPT_ROUTER_FAILURE,
+)
+
+from repository.document_repository import DocumentRepository
+
+from metrics.instruments import prompt_router_requests
+
+from util.tool import invoke_tool, call_with_timeout
+
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ToolInvocation:
+    """
+    A direct tool invocation a prompt was routed to.
+
+    Attributes:
+        rule: Name of the rule that matched the prompt.
+        tool: Name of the tool to invoke.
+        args: Arguments of the tool call.
+    """
+
+    rule: str
+    tool: str
+    args: dict[str, Any]
+
+
+@dataclass
+class Rule:
+    """
+    A prompt routing rule.
+
+    Attributes:
+        name: Name of the rule.
+        pattern: Pattern the whole prompt has to match.
+        build: Builds the Build API instructions and output file name from the match.
+    """
+
+    name: str
+    pattern: re.Pattern
+    build: Callable[[dict[str, str], PurePath], tuple[dict[str, Any], str]]
+
+
+def _build_watermark(groups: dict[str, str], file: PurePath) -> tuple[dict[str, Any], str]:
+    """
+    Build instructions for adding a text watermark.
+    """
+    return {
+        "parts": [{"file": file.name}],
+        "actions": [
+            {
+                "type": "watermark",
+                "text": groups["text"],
+                "width": "50%",
+                "height": "50%",
+                "opacity": 0.5,
+                "rotation": 45,
+            }
+        ],
+    }, f"{file.stem}_watermarked.pdf"
+
+
+def _build_rotate(groups: dict[str, str], file: PurePath) -> tuple[dict[str, Any], str]:
+    """
+    Build instructions for rotating all pages.
+    """
+    return {
+        "parts": [{"file": file.name}],
+        "actions": [{"type": "rotate", "rotateBy": int(groups["angle"])}],
+    }, f"{file.stem}_rotated.pdf"
+
+
+def _build_ocr(groups: dict[str, str], file: PurePath) -> tuple[dict[str, Any], str]: # pylint: disable=unused-argument
+    """
+    Build instructions for making a scanned document searchable.
+    """
+    return {
+        "parts": [{"file": file.name}],
+        "actions": [{"type": "ocr", "language": "english"}],
+    }, f"{file.stem}_ocr.pdf"
+
+
+def _build_convert(groups: dict[str, str], file: PurePath) -> tuple[dict[str, Any], str]:
+    """
+    Build instructions for converting a document to PDF or PDF/A.
+    """
+    if groups["format"].lower() == "pdf":
+        return {
+            "parts": [{"file": file.name}],
+            "output": {"type": "pdf"},
+        }, f"{file.stem}.pdf"
+
+    return {
+        "parts": [{"file": file.name}],
+        "output": {"type": "pdfa"},
+    }, f"{file.stem}_pdfa.pdf"
+
+
+_FILE = r"['\"]?(?P<file>[^\s'\"]+)['\"]?"
+
+RULES = [
+    Rule(
+        name="watermark",
+        pattern=re.compile(
+            rf"add (?:a )?(?:text )?watermark ['\"](?P<text>[^'\"]+)['\"] to {_FILE}",
+            re.IGNORECASE,
+        ),
+        build=_build_watermark,
+    ),
+    Rule(
+        name="watermark",
+        pattern=re.compile(
+            rf"add (?:an? )?['\"](?P<text>[^'\"]+)['\"] (?:text )?watermark to {_FILE}",
+            re.IGNORECASE,
+        ),
+        build=_build_watermark,
+    ),
+    Rule(
+        name="rotate",
+        pattern=re.compile(
+            rf"rotate (?:all pages (?:of|in) )?{_FILE} (?:by )?(?P<angle>90|180|270)(?: ?degrees| ?°)?",
+            re.IGNORECASE,
+        ),
+        build=_build_rotate,
+    ),
+    Rule(
+        name="ocr",
+        pattern=re.compile(rf"(?:run )?ocr(?: on)? {_FILE}", re.IGNORECASE),
+        build=_build_ocr,
+    ),
+    Rule(
+        name="ocr",
+        pattern=re.compile(rf"extract text from {_FILE} using ocr", re.IGNORECASE),
+        build=_build_ocr,
+    ),
+    Rule(
+        name="convert",
+        pattern=re.compile(rf"convert {_FILE} to (?P<format>pdf/a|pdfa|pdf)", re.IGNORECASE),
+        build=_build_convert,
+    ),
+]
+
+
+class PromptRouter:
+    """
+    Routes formulaic prompts directly to a tool call, bypassing the agent.
+
+    Only prompts matching a rule in full, naming an existing document and not
+    overwriting any document are routed; anything ambiguous is left to the
+    agent. Routed operations on very
+    large documents are sharded by page range by the document processor tool
+    itself, see `PageSharder`. Hits and misses are counted, and
+    exported as `moneypenny_prompt_router_requests_total`, so that the hit rate
+    of the router can be tracked.
+    """
+
+    def __init__(
+        self,
+        rules: list[Rule] = None,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            rules (list[Rule]): The routing rules.
+        """
+        self.rules = rules if rules is not None else RULES
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of routed prompts among all prompts seen by the router.
+        """
+        total = self.hits + self.misses + self.failures
+
+        return self.hits / total if total else 0.0
+
+    def match(
+        self,
+        prompt: str,
+        repository: DocumentRepository,
+    ) -> Optional[ToolInvocation]:
+        """
+        Match a prompt against the routing rules.
+
+        Args:
+            prompt (str): The prompt.
+            repository (DocumentRepository): Repository of the sandbox.
+
+        Returns:
+            Optional[ToolInvocation]: The tool invocation or None if no rule matched.
+        """
+        prompt = re.sub(r"\s+", " ", prompt).strip(" .!")
+
+        for rule in self.rules:
+            match = rule.pattern.fullmatch(prompt)
+
+            if match is None:
+                continue
+
+            groups = match.groupdict()
+            file = self._resolve_file(groups["file"], repository)
+
+            if file is None:
+                logger.debug("Prompt matched rule '%s', but names no known document.", rule.name)
+
+                return None
+
+            instructions, output_path = rule.build(groups, file)
+
+            if output_path.lower() == file.name.lower():
+                logger.debug("Prompt matched rule '%s', but would overwrite its input.", rule.name)
+
+                return None
+
+            # E.g. the result of an earlier run, only the agent may decide to replace it
+            if repository.has_document(output_path):
+                logger.debug("Prompt matched rule '%s', but would overwrite '%s'.", rule.name, output_path)
+
+                return None
+
+            return ToolInvocation(
+                rule=rule.name,
+                tool=TOOL_DOCUMENT_PROCESSOR,
+                args={
+                    "instructions": instructions,
+                    "outputPath": output_path,
+                },
+            )
+
+        return None
+
+    async def route(
+        self,
+        prompt: str,
+        tools: list[BaseTool],
+        repository: DocumentRepository,
+        timeout: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Route a prompt to a direct tool call if it matches a rule.
+
+        Args:
+            prompt (str): The prompt.
+            tools (list[BaseTool]): The tools available to the agent.
+            repository (DocumentRepository): Repository of the sandbox.
+            timeout (Optional[float]): Seconds the tool call, sharded or not, may take.
+
+        Returns:
+            Optional[str]: The tool response or None if the prompt has to go to the agent.
+
+        Raises:
+            asyncio.TimeoutError: If the tool call takes longer than the timeout.
+        """
+        invocation = await asyncio.to_thread(self.match, prompt, repository)
+        tool = next((tool for tool in tools if invocation and tool.name == invocation.tool), None)
+
+        if tool is None:
+            self.misses += 1
+
+            prompt_router_requests.inc(PROMPT_ROUTER_MISS)
+
+            logger.debug("Prompt not routed (hit rate %.2f).", self.hit_rate)
+
+            return None
+
+        logger.debug("Routing prompt via rule '%s' to tool '%s'.", invocation.rule, invocation.tool)
+
+        try:
+            content = await call_with_timeout(invoke_tool(tool, invocation.args), timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+
+            prompt_router_requests.inc(PROMPT_ROUTER_FAILURE)
+
+            logger.warning("Routed tool call via rule '%s' timed out after %.1f seconds.", invocation.rule, timeout)
+
+            raise
+        except Exception as e: # pylint: disable=broad-except
+            self.failures += 1
+
+            prompt_router_requests.inc(PROMPT_ROUTER_FAILURE)
+
+            logger.warning(
+                "Routed tool call via rule '%s' failed, falling back to the agent: %s",
+                invocation.rule, e,
+            )
+
+            return None
+
+        self.hits += 1
+
+        prompt_router_requests.inc(PROMPT_ROUTER_HIT)
+
+        logger.debug("Prompt routed via rule '%s' (hit rate %.2f).", invocation.rule, self.hit_rate)
+
+        return content
+
+    @staticmethod
+    def _resolve_file(
+        name: str,
+        repository: DocumentRepository,
+    ) -> Optional[PurePath]:
+        """
+        Resolve a file name mentioned in a prompt to an existing document.
+
+        The name is matched case-insensitively, since rules match case-insensitively.
+
+        Args:
+            name (str): The file name as mentioned in the prompt.
+            repository (DocumentRepository): Repository of the sandbox.
+
+        Returns:
+            Optional[PurePath]: The document file name or None if there is no such document.
+        """
+        matches = [
+            document.name for document in repository.list_documents()
+            if document.name.lower() == name.lower()
+        ]
+
+        return PurePath(matches[0]) if len(matches) == 1 else None
@@ -0,0 +1,268 @@
+"""
+The metrics recorded by the service, and helpers to record them.
+"""
+
+import time
+
+import asyncio
+
+import functools
+
+import inspect
+
+from typing import Any, Callable
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import StructuredTool
+
+from common.constants import (
+    METRIC_NODE_DURATION,
+    METRIC_LLM_CALL_DURATION,
+    METRIC_MCP_TOOL_CALL_DURATION,
+    METRIC_SSE_TIME_TO_FIRST_EVENT,
+    METRIC_DOCUMENT_REQUEST_DURATION,
+    METRIC_DOCUMENT_BYTES_SERVED,
+    METRIC_RUNS_IN_FLIGHT,
+    METRIC_RUNS_CANCELLED,
+    METRIC_SSE_QUEUE_DEPTH,
+    METRIC_SSE_STREAMS,
+    METRIC_SSE_BUFFER_OVERFLOWS,
+    METRIC_MCP_SESSIONS,
+    METRIC_BUDGETS_EXCEEDED,
+    METRIC_WS_CONNECTIONS,
+    METRIC_RESOURCE_CACHE_REQUESTS,
+    METRIC_CIRCUIT_BREAKER_STATE,
+    METRIC_UPSTREAM_RETRIES,
+    METRIC_HEDGED_REQUESTS,
+    METRIC_PROMPT_ROUTER_REQUESTS,
+    METRIC_AGENT_RUN_DURATION,
+    METRIC_AGENT_RUN_FAILURES,
+    METRIC_AGENT_ESCALATIONS,
+    METRIC_MODEL_TOKENS,
+)
+
+from metrics.registry import registry, BYTE_BUCKETS
+
+
+node_duration = registry.histogram(
+    METRIC_NODE_DURATION, "Duration of process graph node runs.", ("node",),
+)
+llm_call_duration = registry.histogram(
+    METRIC_LLM_CALL_DURATION, "Latency of chat model calls.", ("model",),
+)
+mcp_tool_call_duration = registry.histogram(
+    METRIC_MCP_TOOL_CALL_DURATION, "Latency of MCP server tool calls.", ("tool", "status"),
+)
+sse_time_to_first_event = registry.histogram(
+    METRIC_SSE_TIME_TO_FIRST_EVENT, "Time from a process request to its first SSE event.",
+)
+document_request_duration = registry.histogram(
+    METRIC_DOCUMENT_REQUEST_DURATION, "Latency of document endpoint requests.", ("endpoint",),
+)
+document_bytes_served = registry.histogram(
+    METRIC_DOCUMENT_BYTES_SERVED, "Size of documents served.", buckets=BYTE_BUCKETS,
+)
+runs_in_flight = registry.gauge(
+    METRIC_RUNS_IN_FLIGHT, "Number of process graph runs in flight.",
+)
+runs_cancelled = registry.counter(
+    METRIC_RUNS_CANCELLED, "Number of process graph runs cancelled before completion.",
+)
+sse_queue_depth = registry.gauge(
+    METRIC_SSE_QUEUE_DEPTH, "Number of SSE events queued and not yet sent, over all streams.",
+)
+sse_streams = registry.gauge(
+    METRIC_SSE_STREAMS, "Number of open SSE streams.",
+)
+sse_buffer_overflows = registry.counter(
+    METRIC_SSE_BUFFER_OVERFLOWS, "Number of SSE stream buffer overflows.", ("policy",),
+)
+mcp_sessions = registry.gauge(
+    METRIC_MCP_SESSIONS, "Number of open MCP server sessions.",
+)
+budgets_exceeded = registry.counter(
+    METRIC_BUDGETS_EXCEEDED, "Number of execution budgets exceeded by process graph runs.", ("budget",),
+)
+ws_connections = registry.gauge(
+    METRIC_WS_CONNECTIONS, "Number of open process WebSocket connections.",
+)
+resource_cache_requests = registry.counter(
+    METRIC_RESOURCE_CACHE_REQUESTS, "Number of resource cache lookups, by result.", ("result",),
+)
+circuit_breaker_state = registry.gauge(
+    METRIC_CIRCUIT_BREAKER_STATE, "State of the circuit breaker of an upstream: 0 closed, 1 half-open, 2 open.",
+    ("upstream",),
+)
+upstream_retries = registry.counter(
+    METRIC_UPSTREAM_RETRIES, "Number of calls to an upstream retried after a transient failure.", ("upstream",),
+)
+hedged_requests = registry.counter(
+    METRIC_HEDGED_REQUESTS, "Number of hedged upstream requests, by the request that won.", ("upstream", "winner"),
+)
+prompt_router_requests = registry.counter(
+    METRIC_PROMPT_ROUTER_REQUESTS, "Number of prompts seen by the prompt router, by result.", ("result",),
+)
+agent_run_duration = registry.histogram(
+    METRIC_AGENT_RUN_DURATION, "Latency of agent runs, by model and tier.", ("model", "tier"),
+)
+agent_run_failures = registry.counter(
+    METRIC_AGENT_RUN_FAILURES, "Number of failed agent runs, by model and tier.", ("model", "tier"),
+)
+agent_escalations = registry.counter(
+    METRIC_AGENT_ESCALATIONS, "Number of agent runs escalated to a larger model, by model and tier.",
+    ("model", "tier"),
+)
+model_tokens = registry.counter(
+    METRIC_MODEL_TOKENS, "Number of tokens used by agent runs, by model, tier and type.", ("model", "tier", "type"),
+)
+
+
+def time_node(
+    node: str,
+    action: Callable,
+) -> Callable:
+    """
+    Wrap a graph node function so that its runs are timed.
+
+    Args:
+        node (str): Name of the node.
+        action (Callable): The node function, sync or async.
+
+    Returns:
+        Callable: The timed node function, of the same kind.
+    """
+    if inspect.iscoroutinefunction(action):
+        @functools.wraps(action)
+        async def timed_async_node(*args, **kwargs):
+            start = time.perf_counter()
+
+            try:
+                return await action(*args, **kwargs)
+            finally:
+                node_duration.observe(time.perf_counter() - start, node)
+
+        return timed_async_node
+
+    @functools.wraps(action)
+    def timed_node(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return action(*args, **kwargs)
+        finally:
+            node_duration.observe(time.perf_counter() - start, node)
+
+    return timed_node
+
+
+def time_request(endpoint: str) -> Callable:
+    """
+    Decorator timing the requests of a document endpoint.
+
+    Args:
+        endpoint (str): Name of the endpoint.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        async def timed_handler(*args, **kwargs):
+            start = time.perf_counter()
+
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                document_request_duration.observe(time.perf_counter() - start, endpoint)
+
+        return timed_handler
+
+    return decorator
+
+
+def instrument_mcp_tool(tool: StructuredTool) -> StructuredTool:
+    """
+    Time the calls of an MCP server tool and count the sessions they open.
+
+    MCP tools bound to a connection open a session per call, so a call in
+    flight is an open session.
+
+    Args:
+        tool (StructuredTool): The MCP server tool.
+
+    Returns:
+        StructuredTool: The same tool, instrumented.
+    """
+    coroutine = tool.coroutine
+
+    if coroutine is None:
+        return tool
+
+    @functools.wraps(coroutine)
+    async def call_tool(*args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+
+        mcp_sessions.inc()
+
+        try:
+            result = await coroutine(*args, **kwargs)
+            status = "success"
+
+            return result
+        except asyncio.CancelledError:
+            status = "cancelled"
+
+            raise
+        finally:
+            mcp_sessions.dec()
+            mcp_tool_call_duration.observe(time.perf_counter() - start, tool.name, status)
+
+    tool.coroutine = call_tool
+
+    return tool
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler timing the calls of a chat model.
+    """
+
+    # Record in the calling coroutine instead of a thread pool executor.
+    run_inline = True
+
+    def __init__(self, model: str):
+        """
+        Initialize the handler.
+
+        Args:
+            model (str): Name of the model.
+        """
+        self.model = model
+        self.started_on: dict[UUID, float] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        self.started_on[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id)
+
+    def _observe(self, run_id: UUID) -> None:
+        """
+        Record the latency of a finished call.
+        """
+        start = self.started_on.pop(run_id, None)
+
+        if start is not None:
+            llm_call_duration.observe(time.perf_counter() - start, self.model)
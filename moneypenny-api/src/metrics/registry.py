@@ -0,0 +1,360 @@
+"""
+A minimal, dependency-free metrics registry rendering the Prometheus text format.
+
+Recording is a dictionary lookup and an increment under a per-metric lock, so
+metrics stay on in production. Metrics are recorded on the event loop and from
+the threads running sync graph nodes; series are created on first use per label
+combination and rendered on scrape from a snapshot.
+"""
+
+import threading
+
+from bisect import bisect_left
+
+from typing import Callable, Optional
+
+
+# Latency buckets in seconds, from fast in-process nodes to long agent runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Size buckets in bytes, from 1 KiB to 1 GiB
+BYTE_BUCKETS = tuple(1024 * 4 ** exponent for exponent in range(11))
+
+
+class Metric:
+    """
+    Base metric.
+
+    Attributes:
+        name: Name of the metric.
+        documentation: Help text of the metric.
+        labels: Names of the labels of the metric.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+    ):
+        """
+        Initialize the metric.
+
+        Args:
+            name (str): Name of the metric.
+            documentation (str): Help text of the metric.
+            labels (tuple[str, ...]): Names of the labels of the metric.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        """
+        Render the metric in the Prometheus text format.
+
+        Returns:
+            list[str]: The lines of the metric.
+        """
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+            *self._render_samples(),
+        ]
+
+    def _render_samples(self) -> list[str]:
+        """
+        Render the samples of the metric.
+        """
+        raise NotImplementedError
+
+    def _format_labels(
+        self,
+        values: tuple[str, ...],
+        extra: Optional[str] = None,
+    ) -> str:
+        """
+        Format label values as a Prometheus label set.
+
+        Args:
+            values (tuple[str, ...]): Values of the labels, in the order of the label names.
+            extra (Optional[str]): An already formatted label to append, such as `le="0.1"`.
+
+        Returns:
+            str: The label set, empty if there are no labels.
+        """
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labels, values)]
+
+        if extra:
+            pairs.append(extra)
+
+        return f"{{{','.join(pairs)}}}" if pairs else ""
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter.
+    """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            values (str): Values of the labels.
+            amount (float): The amount to increase by.
+        """
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + amount
+
+    def _render_samples(self) -> list[str]:
+        with self.lock:
+            samples = list(self.values.items())
+
+        return [
+            f"{self.name}{self._format_labels(values)} {_format_number(value)}"
+            for values, value in samples
+        ]
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down.
+
+    A gauge is either set explicitly or read from a callback on every scrape.
+    """
+
+    TYPE = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        collect: Callable[[], dict[tuple[str, ...], float]] = None,
+    ):
+        """
+        Initialize the gauge.
+
+        Args:
+            name (str): Name of the metric.
+            documentation (str): Help text of the metric.
+            labels (tuple[str, ...]): Names of the labels of the metric.
+            collect (Callable[[], dict[tuple[str, ...], float]]): Callback returning the
+                values per label values on scrape.
+        """
+        super().__init__(name, documentation, labels)
+
+        self.values: dict[tuple[str, ...], float] = {}
+        self.collect = collect
+
+    def set(self, value: float, *values: str) -> None:
+        """
+        Set the gauge.
+
+        Args:
+            value (float): The value.
+            values (str): Values of the labels.
+        """
+        with self.lock:
+            self.values[values] = value
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        """
+        Increase the gauge.
+
+        Args:
+            values (str): Values of the labels.
+            amount (float): The amount to increase by.
+        """
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + amount
+
+    def dec(self, *values: str, amount: float = 1) -> None:
+        """
+        Decrease the gauge.
+
+        Args:
+            values (str): Values of the labels.
+            amount (float): The amount to decrease by.
+        """
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) - amount
+
+    def _render_samples(self) -> list[str]:
+        if self.collect is not None:
+            samples = list(self.collect().items())
+        else:
+            with self.lock:
+                samples = list(self.values.items())
+
+        if not samples and not self.labels:
+            samples = [((), 0)]
+
+        return [
+            f"{self.name}{self._format_labels(label_values)} {_format_number(value)}"
+            for label_values, value in samples
+        ]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        """
+        Initialize the histogram.
+
+        Args:
+            name (str): Name of the metric.
+            documentation (str): Help text of the metric.
+            labels (tuple[str, ...]): Names of the labels of the metric.
+            buckets (tuple[float, ...]): Upper bounds of the buckets, without +Inf.
+        """
+        super().__init__(name, documentation, labels)
+
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: non-cumulative bucket counts (the last one is +Inf) and the sum
+        self.series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *values: str) -> None:
+        """
+        Observe a value.
+
+        Args:
+            value (float): The value.
+            values (str): Values of the labels.
+        """
+        bucket = bisect_left(self.buckets, value)
+
+        with self.lock:
+            series = self.series.get(values)
+
+            if series is None:
+                series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            series[0][bucket] += 1
+            series[1] += value
+
+    def _render_samples(self) -> list[str]:
+        with self.lock:
+            samples = [(values, list(counts), total) for values, (counts, total) in self.series.items()]
+
+        lines = []
+
+        for values, counts, total in samples:
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                bucket = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(values, bucket)} {cumulative}")
+
+            lines.append(f"{self.name}_sum{self._format_labels(values)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(values)} {cumulative}")
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registry of the metrics exposed by the service.
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        """
+        Register a counter.
+        """
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        collect: Callable[[], dict[tuple[str, ...], float]] = None,
+    ) -> Gauge:
+        """
+        Register a gauge.
+        """
+        return self._register(Gauge(name, documentation, labels, collect))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Register a histogram.
+        """
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition.
+        """
+        lines = []
+
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Metric) -> Metric:
+        """
+        Register a metric.
+
+        Raises:
+            ValueError: If a metric of the same name is already registered.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+
+        self.metrics[metric.name] = metric
+
+        return metric
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    """
+    Format a sample value, without a trailing ".0" for integral values.
+    """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = MetricsRegistry()
@@ -8,6 +8,8 @@ from typing import List, Optional
 
 import mimetypes
 
+import hashlib
+
 from datetime import datetime
 
 from pathlib import Path
@@ -16,6 +18,8 @@ from common.constants import APPLICATION_OCTET_STREAM
 
 from domain.document import Document
 
+from util.pdf import get_page_count
+
 
 logger = getLogger(__name__)
 
@@ -36,6 +40,9 @@ class DocumentRepository:
         '.gitignore',     # Git ignore rules
     }
 
+    # Chunk size used when hashing document content
+    DIGEST_CHUNK_SIZE = 1024 * 1024
+
     def __init__(self, base_path: str):
         """
         Initialize repository with base path.
@@ -44,6 +51,8 @@ class DocumentRepository:
             base_path: Base directory path for documents
         """
         self.base_path = Path(base_path)
+        self._digests: dict[str, tuple[int, int, str]] = {}
+        self._page_counts: dict[str, tuple[int, int, Optional[int]]] = {}
 
         if not self.base_path.exists():
             raise ValueError(f"Document base path does not exist: {base_path}")
@@ -75,6 +84,30 @@ class DocumentRepository:
             logger.error("Error listing documents: %s", e, exc_info=True)
             raise
 
+    def snapshot(self) -> dict[str, Document]:
+        """
+        Take a snapshot of the document metadata in the base directory.
+
+        Returns:
+            Document objects by name
+        """
+        return {document.name: document for document in self.list_documents()}
+
+    def get_changed_documents(self, snapshot: dict[str, Document]) -> List[Document]:
+        """
+        Get documents created or modified since a snapshot was taken.
+
+        Args:
+            snapshot: Snapshot taken with `snapshot`
+
+        Returns:
+            List of created or modified Document objects
+        """
+        return [
+            document for document in self.list_documents()
+            if document != snapshot.get(document.name)
+        ]
+
     def get_document(
         self,
         filename: str,
@@ -105,6 +138,90 @@ class DocumentRepository:
 
         return self._create_document_from_path(file_path, include_content)
 
+    def has_document(self, filename: str) -> bool:
+        """
+        Check whether a document exists, without logging a miss.
+
+        Args:
+            filename: Name of the file
+
+        Returns:
+            True if the document exists within the base path, False otherwise
+        """
+        file_path = self.base_path / filename
+
+        return file_path.is_file() and self._is_safe_path(file_path)
+
+    def get_document_digest(self, filename: str) -> Optional[str]:
+        """
+        Get a SHA-256 digest of a document's content.
+
+        Digests are memoized per file name, size and modification time, so
+        unchanged documents are hashed only once.
+
+        Args:
+            filename: Name of the file
+
+        Returns:
+            Hex digest or None if not found
+        """
+        file_path = self.base_path / filename
+
+        if not file_path.is_file() or not self._is_safe_path(file_path):
+            return None
+
+        try:
+            stat = file_path.stat()
+            memo = self._digests.get(filename)
+
+            if memo is None or memo[:2] != (stat.st_size, stat.st_mtime_ns):
+                digest = hashlib.sha256()
+
+                with open(file_path, "rb") as f:
+                    while chunk := f.read(self.DIGEST_CHUNK_SIZE):
+                        digest.update(chunk)
+
+                memo = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+                self._digests[filename] = memo
+
+            return memo[2]
+
+        except OSError as e:
+            logger.error("Error hashing document %s: %s", filename, e)
+
+            return None
+
+    def get_document_page_count(self, filename: str) -> Optional[int]:
+        """
+        Get the number of pages of a PDF document.
+
+        Page counts are memoized per file name, size and modification time, like
+        digests.
+
+        Args:
+            filename: Name of the file
+
+        Returns:
+            Number of pages or None if not found, not a PDF or unknown
+        """
+        file_path = self.base_path / filename
+
+        if not file_path.is_file() or not self._is_safe_path(file_path):
+            return None
+
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return None
+
+        memo = self._page_counts.get(filename)
+
+        if memo is None or memo[:2] != (stat.st_size, stat.st_mtime_ns):
+            memo = (stat.st_size, stat.st_mtime_ns, get_page_count(str(file_path)))
+            self._page_counts[filename] = memo
+
+        return memo[2]
+
     def _create_document_from_path(
         self,
         file_path: Path,
@@ -2,7 +2,44 @@
 The process graph state schema module.
 """
 
-from typing import TypedDict
+from typing import Annotated, Any, Optional, TypedDict
+
+
+def merge_documents(
+    left: Optional[dict[str, str]],
+    right: Optional[dict[str, str]],
+) -> dict[str, str]:
+    """
+    Merge per-document responses of parallel sub-runs.
+
+    Args:
+        left: The responses collected so far.
+        right: The responses to add.
+
+    Returns:
+        dict[str, str]: The merged responses.
+    """
+    return {**(left or {}), **(right or {})}
+
+
+def merge_budget_used(
+    left: Optional[dict[str, float]],
+    right: Optional[dict[str, float]],
+) -> dict[str, float]:
+    """
+    Merge the budget used reported by parallel sub-runs, which share the budget
+    of the run, so that the latest, i.e. largest, figures are kept.
+
+    Args:
+        left: The budget used so far.
+        right: The budget used to add.
+
+    Returns:
+        dict[str, float]: The merged budget used.
+    """
+    left, right = left or {}, right or {}
+
+    return {budget: max(left.get(budget, 0), right.get(budget, 0)) for budget in {*left, *right}}
 
 
 class ProcessGraphState(TypedDict):
@@ -10,9 +47,37 @@ class ProcessGraphState(TypedDict):
     The Process Graph State Schema.
 
     Attributes:
+        run_id: Id of the run.
         prompt: The prompt.
+        tenant: The tenant the request is made for.
+        session_id: Id of the conversation session the run is a turn of.
+        budget: Limits of the execution budget requested for the run.
         response: The response.
+        cached: Whether the response was served from the result cache.
+        catalog: Catalog of the documents relevant to the prompt, given to the agent.
+        documents: Responses of per-document sub-runs of set-based prompts.
+        artifacts: Documents the run created or modified, with their download paths.
+        cache_key: Result cache key of the run, None if its result is not cached.
+        selection: Model tier selected for the run.
+        snapshot: Metadata of the sandbox documents before the run touched them, by name.
+        targets: Documents targeted by set-based prompts, one sub-run each.
+        done: Whether the response is complete and the rest of the graph is skipped.
+        budget_used: How much of its execution budget the run used, by budget.
     """
 
+    run_id: str
     prompt: str
+    tenant: Optional[str]
+    session_id: Optional[str]
+    budget: Optional[dict[str, float]]
     response: str
+    cached: bool
+    catalog: Optional[str]
+    documents: Annotated[dict[str, str], merge_documents]
+    artifacts: Optional[list[dict[str, Any]]]
+    cache_key: Optional[str]
+    selection: Optional[dict[str, Any]]
+    snapshot: Optional[dict[str, dict[str, Any]]]
+    targets: Optional[list[str]]
+    done: bool
+    budget_used: Annotated[dict[str, float], merge_budget_used]
@@ -4,6 +4,30 @@ from dataclasses import dataclass
 from typing import Optional
 
 
+@dataclass
+class ExecutionBudgetSchema:
+    """
+    Execution budget requested for a run.
+
+    Every limit is optional and can only tighten the budget configured for the
+    tenant, i.e. a limit above the configured one has no effect.
+    """
+
+    max_steps: Optional[int] = None
+    max_tool_calls: Optional[int] = None
+    tool_timeout_seconds: Optional[float] = None
+    deadline_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+
+    def __post_init__(self):
+        """
+        Validate that the limits are positive.
+        """
+        for name, value in vars(self).items():
+            if value is not None and value <= 0:
+                raise ValueError(f"Budget '{name}' must be positive.")
+
+
 @dataclass
 class ProcessRequestSchema:
     """
@@ -17,9 +41,17 @@ class ProcessRequestSchema:
     - Redaction (create and apply)
     - Format conversion (PDF, PDF/A, images, Office formats, HTML, Markdown)
     - Page rotation and manipulation
+
+    The optional tenant selects the minimum model tier configured for it. The
+    optional session id continues an earlier conversation, so that follow-up
+    prompts (e.g. "now also rotate it") can refer to earlier turns. The optional
+    budget tightens the execution budget of the run.
     """
 
     prompt: str = None
+    tenant: Optional[str] = None
+    session_id: Optional[str] = None
+    budget: Optional[ExecutionBudgetSchema] = None
 
     def __post_init__(self):
         """
@@ -38,5 +70,9 @@ class ProcessResponseSchema:
     Events are sent in JSON format with `data:` prefix following SSE specification.
     """
 
+    run_id: Optional[str] = None
+    session_id: Optional[str] = None
     response: Optional[str] = None
     prompt: Optional[str] = None
+    cached: Optional[bool] = None
+    budget: Optional[dict[str, float]] = None
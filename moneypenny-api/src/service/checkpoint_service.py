@@ -0,0 +1,168 @@
+"""
+Service for the retention of process graph checkpoints.
+"""
+
+from logging import getLogger
+
+import os
+
+import uuid
+
+import asyncio
+
+from datetime import datetime, timedelta, timezone
+
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from common.constants import (
+    KEY_CONFIGURABLE,
+    KEY_THREAD_ID,
+    KEY_TS,
+    ENV_CHECKPOINT_RETENTION_SECONDS,
+    VALUE_CHECKPOINT_RETENTION_SECONDS_DEFAULT,
+    VALUE_CHECKPOINT_PURGE_INTERVAL_SECONDS,
+)
+
+from factory.checkpointer_factory import CheckpointerFactory
+
+
+logger = getLogger(__name__)
+
+# 100 ns intervals between the UUID epoch, 1582-10-15, and the Unix epoch
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+class CheckpointService:
+    """
+    Service for the retention of process graph checkpoints.
+
+    Checkpoints of runs, including the per-step checkpoints of their agents, are
+    kept until the run has not been checkpointed for the retention period, so
+    that an interrupted run can be resumed in the meantime.
+    """
+
+    def __init__(
+        self,
+        retention_seconds: int = None,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            retention_seconds (int): Retention period of checkpoints in seconds.
+        """
+        self.retention_seconds = retention_seconds or int(
+            os.getenv(
+                ENV_CHECKPOINT_RETENTION_SECONDS, str(VALUE_CHECKPOINT_RETENTION_SECONDS_DEFAULT)
+            )
+        )
+
+    async def purge(self) -> int:
+        """
+        Delete the checkpoints of runs last checkpointed before the retention period.
+
+        Returns:
+            int: The number of runs deleted.
+        """
+        checkpointer = await CheckpointerFactory.create()
+
+        if checkpointer is None:
+            return 0
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        expired = []
+
+        for run_id, checkpoint_id in (await self._get_latest_checkpoint_ids(checkpointer)).items():
+            checkpointed_on = _get_checkpointed_on(checkpoint_id)
+
+            if checkpointed_on is None:
+                checkpoint_tuple = await checkpointer.aget_tuple({KEY_CONFIGURABLE: {KEY_THREAD_ID: run_id}})
+
+                if checkpoint_tuple is None:
+                    continue
+
+                checkpointed_on = datetime.fromisoformat(checkpoint_tuple.checkpoint[KEY_TS])
+
+            if checkpointed_on < cutoff:
+                expired.append(run_id)
+
+        for run_id in expired:
+            await checkpointer.adelete_thread(run_id)
+
+        if expired:
+            logger.info("Deleted checkpoints of %d expired run(s).", len(expired))
+
+        return len(expired)
+
+    @staticmethod
+    async def _get_latest_checkpoint_ids(checkpointer: BaseCheckpointSaver) -> dict[str, str]:
+        """
+        Get the id of the latest checkpoint of every run, in any namespace.
+
+        Checkpoint ids are time-ordered, so only the ids are read, from the keys
+        of the in-memory storage or the checkpoint table of the SQLite database,
+        rather than every checkpoint being loaded.
+
+        Args:
+            checkpointer (BaseCheckpointSaver): The checkpointer.
+
+        Returns:
+            dict[str, str]: The latest checkpoint ids by run id.
+        """
+        if isinstance(checkpointer, InMemorySaver):
+            return {
+                run_id: max(checkpoint_id for checkpoints in namespaces.values() for checkpoint_id in checkpoints)
+                for run_id, namespaces in list(checkpointer.storage.items())
+                if any(namespaces.values())
+            }
+
+        # Creates the tables if no run has been checkpointed yet
+        await checkpointer.setup()
+
+        async with checkpointer.lock, checkpointer.conn.execute(
+            "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+        ) as cursor:
+            return {run_id: checkpoint_id async for run_id, checkpoint_id in cursor}
+
+    async def run_retention(self) -> None:
+        """
+        Purge expired checkpoints periodically, until cancelled.
+        """
+        while True:
+            try:
+                await self.purge()
+            except Exception as e: # pylint: disable=broad-except
+                logger.error("Purging expired checkpoints failed: %s", e, exc_info=True)
+
+            await asyncio.sleep(VALUE_CHECKPOINT_PURGE_INTERVAL_SECONDS)
+
+
+def _get_checkpointed_on(checkpoint_id: str) -> Optional[datetime]:
+    """
+    Get when a checkpoint was written from its id, a version 6 UUID.
+
+    Args:
+        checkpoint_id (str): The checkpoint id.
+
+    Returns:
+        Optional[datetime]: When the checkpoint was written or None if the id is no version 6 UUID.
+    """
+    try:
+        checkpoint_uuid = uuid.UUID(checkpoint_id)
+    except ValueError:
+        return None
+
+    if checkpoint_uuid.version != 6:
+        return None
+
+    # Version 6 UUIDs store the timestamp from its most to its least significant bits.
+    timestamp = (
+        checkpoint_uuid.time_low << 28
+        | checkpoint_uuid.time_mid << 12
+        | checkpoint_uuid.time_hi_version & 0x0FFF
+    )
+
+    return datetime.fromtimestamp((timestamp - UUID_EPOCH_OFFSET) / 10**7, timezone.utc)
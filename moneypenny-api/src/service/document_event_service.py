@@ -0,0 +1,105 @@
+"""
+Service notifying subscribers of changes to the documents of the sandbox.
+"""
+
+from logging import getLogger
+
+import os
+
+import asyncio
+
+from typing import Callable, Optional
+
+from common.constants import (
+    ENV_DOCUMENT_EVENTS_INTERVAL_SECONDS,
+    VALUE_DOCUMENT_EVENTS_INTERVAL_SECONDS_DEFAULT,
+)
+
+from domain.document import Document
+
+from repository.document_repository import DocumentRepository
+
+
+logger = getLogger(__name__)
+
+# Receives the documents created or modified and the names of the documents deleted
+DocumentListener = Callable[[list[Document], list[str]], None]
+
+
+class DocumentEventService:
+    """
+    Service watching the sandbox for created, modified and deleted documents.
+
+    A single watcher serves all subscribers: it takes a snapshot of the
+    document metadata every `DOCUMENT_EVENTS_INTERVAL_SECONDS`, off the event
+    loop, and notifies the subscribers of the differences to the previous one.
+    The watcher runs while anyone is subscribed.
+    """
+
+    def __init__(
+        self,
+        repository: DocumentRepository,
+        interval: float = None,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            repository (DocumentRepository): Repository of the sandbox.
+            interval (float): Seconds between snapshots.
+        """
+        self.repository = repository
+        self.interval = interval or float(
+            os.getenv(ENV_DOCUMENT_EVENTS_INTERVAL_SECONDS, str(VALUE_DOCUMENT_EVENTS_INTERVAL_SECONDS_DEFAULT))
+        )
+        self.listeners: set[DocumentListener] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, listener: DocumentListener) -> None:
+        """
+        Subscribe to document changes, starting the watcher if needed.
+
+        Args:
+            listener (DocumentListener): Called with the changes; must not block.
+        """
+        self.listeners.add(listener)
+
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            self.task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, listener: DocumentListener) -> None:
+        """
+        Unsubscribe from document changes.
+
+        Args:
+            listener (DocumentListener): The listener.
+        """
+        self.listeners.discard(listener)
+
+    async def _run(self) -> None:
+        """
+        Notify the subscribers of document changes, until nobody is subscribed.
+        """
+        snapshot = await asyncio.to_thread(self.repository.snapshot)
+
+        while self.listeners:
+            await asyncio.sleep(self.interval)
+
+            try:
+                current = await asyncio.to_thread(self.repository.snapshot)
+            except Exception as e: # pylint: disable=broad-except
+                logger.warning("Could not take a snapshot of the documents: %s", e)
+
+                continue
+
+            changed = [document for name, document in current.items() if document != snapshot.get(name)]
+            deleted = [name for name in snapshot if name not in current]
+            snapshot = current
+
+            if not changed and not deleted:
+                continue
+
+            logger.debug("Documents changed: %d, deleted: %d.", len(changed), len(deleted))
+
+            for listener in list(self.listeners):
+                listener(changed, deleted)
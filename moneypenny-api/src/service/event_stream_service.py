@@ -0,0 +1,256 @@
+"""
+Service for the buffering and the heartbeats of SSE streams.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+import asyncio
+
+from collections import deque
+
+from typing import Any, Optional
+
+from common.constants import (
+    ENV_SSE_HEARTBEAT_SECONDS,
+    ENV_SSE_BUFFER_SIZE,
+    ENV_SSE_OVERFLOW_POLICY,
+    VALUE_SSE_HEARTBEAT_SECONDS_DEFAULT,
+    VALUE_SSE_HEARTBEAT_TICK_SECONDS,
+    VALUE_SSE_BUFFER_SIZE_DEFAULT,
+    VALUE_SSE_OVERFLOW_POLICY_DEFAULT,
+    OVERFLOW_POLICY_COALESCE,
+    OVERFLOW_POLICY_DISCONNECT,
+    STREAM_MODE_VALUES,
+    EVENT_HEARTBEAT,
+)
+
+from metrics.instruments import sse_queue_depth, sse_streams, sse_buffer_overflows
+
+
+logger = getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    Bounded buffer of the updates of an SSE stream, between the run producing
+    them and the client consuming them.
+
+    Once the buffer is full, the overflow policy applies:
+
+    - `coalesce`: queued state updates are dropped in favour of the new one,
+      which supersedes them, since every state update carries the full state.
+      If only progress updates are queued, the producer waits for the client.
+    - `disconnect`: the stream is ended, the client is too slow to keep up.
+
+    Updates are encoded when they are taken from the buffer, so dropped updates
+    cost no serialization.
+    """
+
+    def __init__(
+        self,
+        capacity: int = None,
+        overflow_policy: str = None,
+    ):
+        """
+        Initialize the buffer.
+
+        Args:
+            capacity (int): Maximum number of queued updates.
+            overflow_policy (str): What to do once the buffer is full, `coalesce` or `disconnect`.
+        """
+        self.capacity = max(1, capacity or int(
+            os.getenv(ENV_SSE_BUFFER_SIZE, str(VALUE_SSE_BUFFER_SIZE_DEFAULT))
+        ))
+        self.overflow_policy = overflow_policy or os.getenv(
+            ENV_SSE_OVERFLOW_POLICY, VALUE_SSE_OVERFLOW_POLICY_DEFAULT
+        )
+        self.items: deque[tuple[str, dict[str, Any]]] = deque()
+        self.closed = False
+        self.overflowed = False
+        self.heartbeat_due = False
+        self.sent_on = time.monotonic()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+        if self.overflow_policy not in (OVERFLOW_POLICY_COALESCE, OVERFLOW_POLICY_DISCONNECT):
+            raise ValueError(f"Unsupported SSE overflow policy: {self.overflow_policy}")
+
+    async def put(
+        self,
+        mode: str,
+        update: dict[str, Any],
+    ) -> None:
+        """
+        Queue an update, applying the overflow policy if the buffer is full.
+
+        Args:
+            mode (str): The stream mode of the update.
+            update (dict[str, Any]): The update.
+        """
+        while len(self.items) >= self.capacity and not self.closed:
+            sse_buffer_overflows.inc(self.overflow_policy)
+
+            if self.overflow_policy == OVERFLOW_POLICY_DISCONNECT:
+                logger.warning("SSE client too slow, %d updates behind; disconnecting.", len(self.items))
+
+                self.overflowed = True
+                self.close()
+
+                return
+
+            if mode == STREAM_MODE_VALUES and self._coalesce():
+                break
+
+            self._space.clear()
+
+            await self._space.wait()
+
+        if self.closed:
+            return
+
+        self.items.append((mode, update))
+        sse_queue_depth.inc()
+        self._ready.set()
+
+    async def get(self) -> Optional[tuple[str, Optional[dict[str, Any]]]]:
+        """
+        Wait for the next update, or for a heartbeat if the stream has been idle.
+
+        Returns:
+            Optional[tuple[str, Optional[dict[str, Any]]]]: The stream mode and the
+                update, `heartbeat` and None for a heartbeat, or None once the
+                buffer is closed and drained or has overflowed.
+        """
+        while True:
+            if self.overflowed:
+                return None
+
+            if self.items:
+                sse_queue_depth.dec()
+                self._space.set()
+                self.sent_on = time.monotonic()
+
+                return self.items.popleft()
+
+            if self.closed:
+                return None
+
+            if self.heartbeat_due:
+                self.heartbeat_due = False
+                self.sent_on = time.monotonic()
+
+                return EVENT_HEARTBEAT, None
+
+            self._ready.clear()
+
+            await self._ready.wait()
+
+    def request_heartbeat(self) -> None:
+        """
+        Have the consumer send a heartbeat, unless updates are queued anyway.
+        """
+        if not self.items:
+            self.heartbeat_due = True
+            self._ready.set()
+
+    def close(self) -> None:
+        """
+        Close the buffer: no more updates are queued, queued ones can still be taken.
+        """
+        self.closed = True
+        self._ready.set()
+        self._space.set()
+
+    def discard(self) -> None:
+        """
+        Close the buffer and drop the queued updates.
+        """
+        self.close()
+
+        sse_queue_depth.dec(amount=len(self.items))
+        self.items.clear()
+
+    def _coalesce(self) -> bool:
+        """
+        Drop the queued state updates.
+
+        Returns:
+            bool: Whether any update was dropped.
+        """
+        kept = deque(item for item in self.items if item[0] != STREAM_MODE_VALUES)
+        dropped = len(self.items) - len(kept)
+
+        self.items = kept
+        sse_queue_depth.dec(amount=dropped)
+
+        return dropped > 0
+
+
+class HeartbeatService:
+    """
+    Service sending keep-alive heartbeats on idle SSE streams.
+
+    A single ticker serves all open streams and only asks the streams that have
+    been idle for longer than the heartbeat interval for a heartbeat, keeping
+    intermediaries from timing out idle connections. The ticker runs while any
+    stream is registered.
+    """
+
+    def __init__(
+        self,
+        interval: float = None,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            interval (float): Idle time in seconds after which a heartbeat is sent.
+        """
+        self.interval = interval or max(
+            1, int(os.getenv(ENV_SSE_HEARTBEAT_SECONDS, str(VALUE_SSE_HEARTBEAT_SECONDS_DEFAULT)))
+        )
+        self.buffers: set[EventBuffer] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def register(self, buffer: EventBuffer) -> None:
+        """
+        Register the buffer of an open stream, starting the ticker if needed.
+
+        Args:
+            buffer (EventBuffer): The buffer.
+        """
+        self.buffers.add(buffer)
+        sse_streams.inc()
+
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            self.task = asyncio.create_task(self._run())
+
+    def unregister(self, buffer: EventBuffer) -> None:
+        """
+        Unregister the buffer of a closed stream.
+
+        Args:
+            buffer (EventBuffer): The buffer.
+        """
+        if buffer in self.buffers:
+            self.buffers.discard(buffer)
+            sse_streams.dec()
+
+    async def _run(self) -> None:
+        """
+        Ask the idle streams for heartbeats, until no stream is registered.
+        """
+        tick = min(self.interval, VALUE_SSE_HEARTBEAT_TICK_SECONDS)
+
+        while self.buffers:
+            await asyncio.sleep(tick)
+
+            idle_since = time.monotonic() - self.interval
+
+            for buffer in list(self.buffers):
+                if buffer.sent_on <= idle_since:
+                    buffer.request_heartbeat()
@@ -0,0 +1,547 @@
+"""
+Service multiplexing processing runs over a single WebSocket connection.
+"""
+
+from logging import getLogger
+
+import os
+
+import json
+
+import asyncio
+
+from dataclasses import dataclass, field, asdict
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from common.constants import (
+    KEY_TYPE,
+    KEY_REF,
+    KEY_RUN_ID,
+    KEY_WINDOW,
+    KEY_COUNT,
+    KEY_TOPIC,
+    KEY_CHANGED,
+    KEY_DELETED,
+    KEY_PROMPT,
+    KEY_TENANT,
+    KEY_SESSION_ID,
+    KEY_BUDGET,
+    ENV_WS_RUN_WINDOW,
+    ENV_WS_MAX_RUNS,
+    VALUE_WS_RUN_WINDOW_DEFAULT,
+    VALUE_WS_MAX_RUNS_DEFAULT,
+    MESSAGE_START,
+    MESSAGE_RESUME,
+    MESSAGE_CANCEL,
+    MESSAGE_ACK,
+    MESSAGE_SUBSCRIBE,
+    MESSAGE_UNSUBSCRIBE,
+    MESSAGE_STARTED,
+    MESSAGE_EVENT,
+    MESSAGE_CANCELLED,
+    MESSAGE_SUBSCRIBED,
+    MESSAGE_UNSUBSCRIBED,
+    MESSAGE_DOCUMENTS,
+    MESSAGE_ERROR,
+    TOPIC_DOCUMENTS,
+    EVENT_HEARTBEAT,
+)
+from common.exception import ObjectNotFoundException, ClientException
+
+from domain.document import Document
+
+from schema.process_schema import ProcessRequestSchema, ExecutionBudgetSchema
+
+from graph.process_graph import ProcessGraph
+
+from service.event_stream_service import EventBuffer
+from service.document_event_service import DocumentEventService
+from service.run_service import RunService
+
+from metrics.instruments import ws_connections
+
+from util.sse import DeltaEncoder, dumps
+
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class RunChannel:
+    """
+    A run observed over a WebSocket connection.
+
+    Attributes:
+        run_id: Id of the run.
+        credits: Number of events the client is ready to receive.
+        buffer: Updates of the run not sent yet.
+        encoder: Encoder of the updates as events.
+        completed: Whether the run completed.
+        task: The task running the run.
+        sender: The task sending the updates of the run.
+        granted: Set when the run is granted credits.
+    """
+
+    run_id: str
+    credits: int
+    buffer: EventBuffer = field(default_factory=EventBuffer)
+    encoder: DeltaEncoder = field(default_factory=DeltaEncoder)
+    completed: bool = False
+    task: Optional[asyncio.Task] = None
+    sender: Optional[asyncio.Task] = None
+    granted: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def grant(self, count: int) -> None:
+        """
+        Grant the run credits to send more events.
+
+        Args:
+            count (int): Number of events.
+        """
+        self.credits += count
+
+        if self.credits > 0:
+            self.granted.set()
+
+    async def acquire(self) -> None:
+        """
+        Wait until the client is ready to receive an event.
+        """
+        while self.credits <= 0:
+            self.granted.clear()
+
+            await self.granted.wait()
+
+
+class MultiplexService:
+    """
+    Service starting, observing and cancelling the processing runs of a single
+    WebSocket connection.
+
+    Client messages are JSON objects with a `type`:
+
+    - `start`: start a run, with the fields of a process request, an optional
+      `ref` echoed in the reply and an optional flow control `window`.
+    - `resume`: resume (or observe the end of) a run by its `run_id`.
+    - `cancel`: cancel a run by its `run_id`.
+    - `ack`: acknowledge `count` events of a run, allowing as many more.
+    - `subscribe` / `unsubscribe`: (un)subscribe from the `documents` topic.
+
+    Server messages are tagged with the `run_id` of their run: `started`,
+    `event` (the typed delta events of SSE protocol 2, with `id`, `event` and
+    `data`), `cancelled` and `error`, as well as untagged `documents` messages
+    with the documents `changed` and `deleted`.
+
+    Flow control is per run: at most `window` events of a run are sent ahead of
+    the acknowledgements of the client. Meanwhile updates wait in the run's
+    buffer, which applies the SSE overflow policy, so a run that is not read
+    does not hold up the others.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        run_service: RunService,
+        document_event_service: DocumentEventService,
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            send (Callable[[str], Awaitable[None]]): Sends a message to the client.
+            run_service (RunService): Service releasing the runs left behind on disconnect.
+            document_event_service (DocumentEventService): Service notifying of document changes.
+        """
+        self.send = send
+        self.run_service = run_service
+        self.document_event_service = document_event_service
+        self.window = max(1, int(os.getenv(ENV_WS_RUN_WINDOW, str(VALUE_WS_RUN_WINDOW_DEFAULT))))
+        self.max_runs = max(1, int(os.getenv(ENV_WS_MAX_RUNS, str(VALUE_WS_MAX_RUNS_DEFAULT))))
+        self.channels: dict[str, RunChannel] = {}
+        self.outbox: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self.writer: Optional[asyncio.Task] = None
+        self.handlers = {
+            MESSAGE_START: self._start,
+            MESSAGE_RESUME: self._resume,
+            MESSAGE_CANCEL: self._cancel,
+            MESSAGE_ACK: self._ack,
+            MESSAGE_SUBSCRIBE: self._subscribe,
+            MESSAGE_UNSUBSCRIBE: self._unsubscribe,
+        }
+
+    async def serve(self, receive: Callable[[], Awaitable[str]]) -> None:
+        """
+        Serve the connection until the client disconnects.
+
+        Args:
+            receive (Callable[[], Awaitable[str]]): Receives a message from the client.
+        """
+        ws_connections.inc()
+
+        self.writer = asyncio.create_task(self._write())
+
+        try:
+            while True:
+                await self.handle(await receive())
+        finally:
+            await self.close()
+
+            ws_connections.dec()
+
+    async def handle(self, raw_message: str) -> None:
+        """
+        Handle a message of the client, replying with an error message if it is invalid.
+
+        Args:
+            raw_message (str): The message.
+        """
+        message: dict[str, Any] = {}
+
+        try:
+            parsed = json.loads(raw_message)
+
+            if not isinstance(parsed, dict):
+                raise ClientException("Messages must be JSON objects.")
+
+            message = parsed
+
+            handler = self.handlers.get(message.get(KEY_TYPE))
+
+            if handler is None:
+                raise ClientException(f"Unsupported message type: {message.get(KEY_TYPE)}")
+
+            await handler(message)
+        except (ClientException, ValueError, TypeError) as e:
+            self._post(MESSAGE_ERROR, run_id=message.get(KEY_RUN_ID), ref=message.get(KEY_REF), message=str(e))
+
+    async def close(self) -> None:
+        """
+        Stop sending, unsubscribe and release the runs of the connection.
+        """
+        self.document_event_service.unsubscribe(self._on_documents)
+
+        for channel in list(self.channels.values()):
+            channel.sender.cancel()
+            channel.buffer.discard()
+
+            await asyncio.gather(channel.sender, return_exceptions=True)
+            await self.run_service.release(channel.run_id, channel.task)
+
+        self.channels.clear()
+
+        if self.writer is not None:
+            self.writer.cancel()
+
+            await asyncio.gather(self.writer, return_exceptions=True)
+
+    # --------------------------------- Message handlers ----------------------------------
+
+    async def _start(self, message: dict[str, Any]) -> None:
+        """
+        Start a run.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        budget = message.get(KEY_BUDGET)
+
+        if budget is not None and not isinstance(budget, dict):
+            raise ClientException("Budget must be a JSON object.")
+
+        request = ProcessRequestSchema(
+            prompt=message.get(KEY_PROMPT),
+            tenant=message.get(KEY_TENANT),
+            session_id=message.get(KEY_SESSION_ID),
+            budget=ExecutionBudgetSchema(**budget) if budget else None,
+        )
+        graph = ProcessGraph(
+            {
+                KEY_PROMPT: request.prompt,
+                KEY_TENANT: request.tenant,
+                KEY_SESSION_ID: request.session_id,
+                KEY_BUDGET: asdict(request.budget) if request.budget else None,
+            }
+        )
+
+        self._open(graph.run_id, graph.stream(), message)
+
+    async def _resume(self, message: dict[str, Any]) -> None:
+        """
+        Resume a run from its last checkpoint.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        run_id = self._get_run_id(message)
+
+        if run_id in self.channels:
+            raise ClientException(f"Run '{run_id}' is observed already.")
+
+        async def resumed_updates() -> AsyncIterator[tuple[str, dict[str, Any]]]:
+            await self.run_service.wait_for(run_id)
+
+            async for update in ProcessGraph(run_id=run_id).stream(resume=True):
+                yield update
+
+        self._open(run_id, resumed_updates(), message)
+
+    async def _cancel(self, message: dict[str, Any]) -> None:
+        """
+        Cancel a run.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        # The run winds down in the background and reports `cancelled` once it has.
+        self._get_channel(message).task.cancel()
+
+    async def _ack(self, message: dict[str, Any]) -> None:
+        """
+        Acknowledge events of a run, allowing as many more to be sent.
+
+        Acknowledgements of runs no longer observed, e.g. completed ones, are ignored.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        count = message.get(KEY_COUNT, 1)
+
+        if not isinstance(count, int) or count < 1:
+            raise ClientException("Acknowledged count must be a positive integer.")
+
+        channel = self.channels.get(self._get_run_id(message))
+
+        if channel is not None:
+            channel.grant(count)
+
+    async def _subscribe(self, message: dict[str, Any]) -> None:
+        """
+        Subscribe to a topic.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        self._check_topic(message)
+        self.document_event_service.subscribe(self._on_documents)
+        self._post(MESSAGE_SUBSCRIBED, ref=message.get(KEY_REF), topic=TOPIC_DOCUMENTS)
+
+    async def _unsubscribe(self, message: dict[str, Any]) -> None:
+        """
+        Unsubscribe from a topic.
+
+        Args:
+            message (dict[str, Any]): The message.
+        """
+        self._check_topic(message)
+        self.document_event_service.unsubscribe(self._on_documents)
+        self._post(MESSAGE_UNSUBSCRIBED, ref=message.get(KEY_REF), topic=TOPIC_DOCUMENTS)
+
+    # ------------------------------------- Runs --------------------------------------
+
+    def _open(
+        self,
+        run_id: str,
+        updates: AsyncIterator[tuple[str, dict[str, Any]]],
+        message: dict[str, Any],
+    ) -> None:
+        """
+        Open the channel of a run, starting to produce and to send its updates.
+
+        Args:
+            run_id (str): Id of the run.
+            updates (AsyncIterator[tuple[str, dict[str, Any]]]): The updates of the run.
+            message (dict[str, Any]): The message starting or resuming the run.
+        """
+        if len(self.channels) >= self.max_runs:
+            raise ClientException(f"At most {self.max_runs} runs can be observed per connection.")
+
+        window = message.get(KEY_WINDOW, self.window)
+
+        if not isinstance(window, int) or window < 1:
+            raise ClientException("Window must be a positive integer.")
+
+        channel = RunChannel(run_id=run_id, credits=window)
+        channel.task = asyncio.create_task(self._produce(channel, updates))
+        channel.sender = asyncio.create_task(self._send_events(channel))
+
+        self.channels[run_id] = channel
+
+        self._post(MESSAGE_STARTED, run_id=run_id, ref=message.get(KEY_REF))
+
+    async def _produce(
+        self,
+        channel: RunChannel,
+        updates: AsyncIterator[tuple[str, dict[str, Any]]],
+    ) -> None:
+        """
+        Run a run, queueing its updates in the buffer of its channel.
+
+        Args:
+            channel (RunChannel): The channel of the run.
+            updates (AsyncIterator[tuple[str, dict[str, Any]]]): The updates of the run.
+        """
+        try:
+            async for mode, update in updates:
+                await channel.buffer.put(mode, update)
+
+            channel.completed = True
+        except asyncio.CancelledError:
+            self._post(MESSAGE_CANCELLED, run_id=channel.run_id)
+
+            raise
+        except (ObjectNotFoundException, ClientException) as e:
+            self._post(MESSAGE_ERROR, run_id=channel.run_id, message=str(e))
+        except Exception as e: # pylint: disable=broad-except
+            logger.error("Run '%s' failed: %s", channel.run_id, e, exc_info=True)
+
+            self._post(MESSAGE_ERROR, run_id=channel.run_id, message=str(e))
+        finally:
+            channel.buffer.close()
+
+    async def _send_events(self, channel: RunChannel) -> None:
+        """
+        Send the updates of a run as events, as the client acknowledges them.
+
+        Args:
+            channel (RunChannel): The channel of the run.
+        """
+        try:
+            while True:
+                await channel.acquire()
+
+                item = await channel.buffer.get()
+
+                if item is None:
+                    break
+
+                mode, update = item
+
+                if mode == EVENT_HEARTBEAT:
+                    continue
+
+                for event_id, event, data in channel.encoder.get_events(mode, update):
+                    channel.credits -= 1
+
+                    self._post(MESSAGE_EVENT, run_id=channel.run_id, id=event_id, event=event, data=data)
+
+            if channel.buffer.overflowed:
+                channel.task.cancel()
+
+                self._post(MESSAGE_ERROR, run_id=channel.run_id, message="Client too slow, run cancelled.")
+            elif channel.completed:
+                event_id, event, data = channel.encoder.get_done_event()
+
+                self._post(MESSAGE_EVENT, run_id=channel.run_id, id=event_id, event=event, data=data)
+        finally:
+            if self.channels.get(channel.run_id) is channel:
+                del self.channels[channel.run_id]
+
+    # ---------------------------------- Messages -----------------------------------
+
+    def _post(self, message_type: str, **fields: Any) -> None:
+        """
+        Queue a message for the client.
+
+        Args:
+            message_type (str): Type of the message.
+            fields (Any): Fields of the message, None values are left out.
+        """
+        message = {KEY_TYPE: message_type}
+        message.update((key, value) for key, value in fields.items() if value is not None)
+
+        self.outbox.put_nowait(message)
+
+    async def _write(self) -> None:
+        """
+        Send the queued messages to the client, in order.
+        """
+        while True:
+            message = await self.outbox.get()
+
+            await self.send(dumps(message))
+
+    def _on_documents(
+        self,
+        changed: list[Document],
+        deleted: list[str],
+    ) -> None:
+        """
+        Notify the client of document changes.
+
+        Args:
+            changed (list[Document]): Documents created or modified.
+            deleted (list[str]): Names of the documents deleted.
+        """
+        self._post(
+            MESSAGE_DOCUMENTS,
+            **{
+                KEY_CHANGED: [
+                    {
+                        "name": document.name,
+                        "size": document.size,
+                        "content_type": document.content_type,
+                        "created_on": document.created_on.isoformat(),
+                        "modified_on": document.modified_on.isoformat(),
+                        "path": f"/documents/{document.name}",
+                    }
+                    for document in changed
+                ],
+                KEY_DELETED: deleted,
+            },
+        )
+
+    def _get_run_id(self, message: dict[str, Any]) -> str:
+        """
+        Get the run id of a message.
+
+        Args:
+            message (dict[str, Any]): The message.
+
+        Returns:
+            str: The run id.
+
+        Raises:
+            ClientException: If the message has no run id.
+        """
+        run_id = message.get(KEY_RUN_ID)
+
+        if not isinstance(run_id, str) or not run_id:
+            raise ClientException("Run id is required.")
+
+        return run_id
+
+    def _get_channel(self, message: dict[str, Any]) -> RunChannel:
+        """
+        Get the channel of the run of a message.
+
+        Args:
+            message (dict[str, Any]): The message.
+
+        Returns:
+            RunChannel: The channel.
+
+        Raises:
+            ClientException: If the run is not observed on this connection.
+        """
+        run_id = self._get_run_id(message)
+        channel = self.channels.get(run_id)
+
+        if channel is None:
+            raise ClientException(f"Run '{run_id}' is not observed on this connection.")
+
+        return channel
+
+    @staticmethod
+    def _check_topic(message: dict[str, Any]) -> None:
+        """
+        Check that the topic of a message is supported.
+
+        Args:
+            message (dict[str, Any]): The message.
+
+        Raises:
+            ClientException: If the topic is not supported.
+        """
+        if message.get(KEY_TOPIC) != TOPIC_DOCUMENTS:
+            raise ClientException(f"Unsupported topic: {message.get(KEY_TOPIC)}")
@@ -0,0 +1,99 @@
+"""
+Service for the processing runs whose client went away.
+"""
+
+from logging import getLogger
+
+import os
+
+import asyncio
+
+from common.constants import (
+    ENV_DISCONNECT_GRACE_SECONDS,
+    VALUE_DISCONNECT_GRACE_SECONDS_DEFAULT,
+)
+
+
+logger = getLogger(__name__)
+
+
+class RunService:
+    """
+    Service releasing the runs whose client disconnected or stopped observing
+    them: a run is cancelled, or given `DISCONNECT_GRACE_SECONDS` to finish in
+    the background, so that its result can be fetched by resuming it.
+    """
+
+    def __init__(self):
+        """
+        Initialize the service.
+        """
+        # Runs finishing in the background, by run id
+        self.background_runs: dict[str, asyncio.Task] = {}
+
+    async def release(
+        self,
+        run_id: str,
+        task: asyncio.Task,
+    ) -> None:
+        """
+        Release a run nobody observes anymore.
+
+        Args:
+            run_id (str): Id of the run.
+            task (asyncio.Task): The task running the run.
+        """
+        if task.done():
+            return
+
+        grace_seconds = float(
+            os.getenv(ENV_DISCONNECT_GRACE_SECONDS, str(VALUE_DISCONNECT_GRACE_SECONDS_DEFAULT))
+        )
+
+        if grace_seconds > 0:
+            self.background_runs[run_id] = asyncio.create_task(
+                self._finish_in_background(run_id, task, grace_seconds)
+            )
+        else:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def wait_for(self, run_id: str) -> None:
+        """
+        Wait for a run to finish, if it is finishing in the background.
+
+        Args:
+            run_id (str): Id of the run.
+        """
+        if run_id in self.background_runs:
+            logger.debug("Waiting for run '%s' to finish in the background.", run_id)
+
+            await asyncio.gather(asyncio.shield(self.background_runs[run_id]), return_exceptions=True)
+
+    async def _finish_in_background(
+        self,
+        run_id: str,
+        task: asyncio.Task,
+        grace_seconds: float,
+    ) -> None:
+        """
+        Let a run whose client disconnected finish, cancelling it after a grace period.
+
+        Args:
+            run_id (str): Id of the run.
+            task (asyncio.Task): The task running the run.
+            grace_seconds (float): How long the run may take to finish.
+        """
+        logger.info("Client of run '%s' disconnected, finishing it in the background.", run_id)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(task), grace_seconds)
+        except asyncio.TimeoutError:
+            logger.info("Run '%s' did not finish within %s seconds, cancelling it.", run_id, grace_seconds)
+
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        except Exception as e: # pylint: disable=broad-except
+            logger.error("Run '%s' failed in the background: %s", run_id, e)
+        finally:
+            self.background_runs.pop(run_id, None)
@@ -0,0 +1,159 @@
+"""
+Warm-up service.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+from typing import Any, Awaitable, Callable
+
+from common.constants import (
+    ENV_WARM_UP_ENABLED,
+    VALUE_TRUE,
+    STAGE_MCP_SERVER,
+    STAGE_MCP_TOOLS,
+    STAGE_PROVIDER,
+    STAGE_AGENT,
+    STAGE_GRAPH,
+    STATUS_PENDING,
+    STATUS_WARMING_UP,
+    STATUS_READY,
+    KEY_STATUS,
+    KEY_STAGES,
+    KEY_DURATION,
+    KEY_ERROR,
+)
+
+from factory.chat_model_factory import ChatModelFactory
+
+from graph.process_graph import ProcessGraph, model_router
+
+
+logger = getLogger(__name__)
+
+
+class WarmUpService:
+    """
+    Service for warming up the processing pipeline before serving.
+
+    Pays for MCP server spawn, tool discovery, agent construction and the first
+    provider connection up front, so the first user request sees steady-state
+    latency. Warm-up is opt-in; when disabled the service reports ready at once.
+    """
+
+    def __init__(self):
+        """
+        Initialize the service.
+        """
+        self.enabled = os.getenv(ENV_WARM_UP_ENABLED, "false").lower() in VALUE_TRUE
+        self.status = STATUS_PENDING if self.enabled else STATUS_READY
+        self.stages: dict[str, dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the warm-up has completed (or is disabled).
+        """
+        return self.status == STATUS_READY
+
+    async def warm_up(self) -> None:
+        """
+        Run all warm-up stages in order.
+
+        A failing stage is logged and recorded, but does not prevent the following
+        stages from running nor the service from becoming ready, since everything
+        warmed up here is also built lazily on the first request.
+
+        Returns:
+            None
+        """
+        if not self.enabled:
+            logger.debug("Warm-up disabled, skipping.")
+
+            return
+
+        logger.info("Warming up the processing pipeline...")
+
+        self.status = STATUS_WARMING_UP
+        started_on = time.perf_counter()
+
+        await self._run_stage(STAGE_MCP_SERVER, lambda: ProcessGraph.get_tools(refresh=True))
+        await self._run_stage(STAGE_MCP_TOOLS, ProcessGraph.get_tools)
+        await self._run_stage(STAGE_PROVIDER, self._connect_models)
+        await self._run_stage(STAGE_AGENT, self._build_agent)
+        await self._run_stage(STAGE_GRAPH, self._compile_graph)
+
+        self.status = STATUS_READY
+
+        logger.info("Processing pipeline warmed up in %.3fs.", time.perf_counter() - started_on)
+
+    def describe(self) -> dict[str, Any]:
+        """
+        Describe the warm-up status and per-stage timings.
+
+        Returns:
+            dict[str, Any]: The description.
+        """
+        return {
+            KEY_STATUS: self.status,
+            KEY_STAGES: self.stages,
+        }
+
+    async def _run_stage(
+        self,
+        name: str,
+        stage: Callable[[], Awaitable[Any]],
+    ) -> None:
+        """
+        Run and time a single warm-up stage.
+
+        Args:
+            name (str): Name of the stage.
+            stage (Callable[[], Awaitable[Any]]): The stage to run.
+
+        Returns:
+            None
+        """
+        started_on = time.perf_counter()
+        error = None
+
+        try:
+            await stage()
+        except Exception as e: # pylint: disable=broad-except
+            error = str(e)
+
+            logger.error("Warm-up stage '%s' failed: %s", name, e, exc_info=True)
+
+        duration = time.perf_counter() - started_on
+
+        self.stages[name] = {
+            KEY_DURATION: round(duration, 3),
+            KEY_ERROR: error,
+        }
+
+        logger.info("Warm-up stage '%s' finished in %.3fs.", name, duration)
+
+    @staticmethod
+    async def _connect_models() -> None:
+        """
+        Connect to the provider with the model of every tier.
+        """
+        for model in dict.fromkeys(model_router.models.values()):
+            await ChatModelFactory.connect(model)
+
+    @staticmethod
+    async def _build_agent() -> None:
+        """
+        Build an agent, warming up the model and agent construction code paths.
+        """
+        await ProcessGraph().build_agent()
+
+    @staticmethod
+    async def _compile_graph() -> None:
+        """
+        Build and compile the process graph.
+        """
+        ProcessGraph().compile()
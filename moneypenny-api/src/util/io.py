@@ -2,15 +2,29 @@
 Utility functions for working with I/O.
 """
 
-from logging import getLogger
+from logging import getLogger, INFO
+
+import os
 
 import pathlib
 
+from typing import Iterable, Optional
+
+import numpy as np
 import pandas as pd
 
-from common.constants import ENCODING_UTF8, NEWLINE, MIA_THRESHOLD
+from numpy.dtypes import StringDType
+
+from common.constants import (
+    ENCODING_UTF8,
+    NEWLINE,
+    ENV_RESOURCE_CACHE_PRELOAD,
+    VALUE_HIGHLIGHT_THRESHOLD_DEFAULT,
+)
 from common.exception import ObjectNotFoundException
 
+from cache.resource_cache import resource_cache
+
 from util.path import get_resource_path, ensure_dir
 
 
@@ -22,6 +36,12 @@ BOLD = "\033[1m"
 RED = "\033[91m"
 RESET = "\033[0m"
 
+# Separator of the columns of a table
+COLUMN_SEPARATOR = " │ "
+
+# Rows per chunk read from a CSV file
+CSV_CHUNK_ROWS = 10000
+
 
 def get_resource_children(
     *children: str,
@@ -29,19 +49,15 @@ def get_resource_children(
     """
     Get names of all children in a resource directory.
 
+    Listings are served from the resource cache while the directory is unchanged.
+
     Args:
         *children (str): Subdirectories to append to the base resource path.
 
     Returns:
         list[str]: Names of all children in the specified directory.
     """
-    dir_path = get_resource_path(*children)
-    p = pathlib.Path(dir_path)
-
-    if not p.exists() or not p.is_dir():
-        return []
-
-    return sorted([f.name for f in p.iterdir()])
+    return resource_cache.list_children(get_resource_path(*children))
 
 
 def read_resource_file(
@@ -51,6 +67,8 @@ def read_resource_file(
     """
     Read the contents of a resource file.
 
+    Contents are served from the resource cache while the file is unchanged.
+
     Args:
         *children (str): Subdirectories or file names to append to the base resource path.
         encoding (str): The encoding to use when reading the file.
@@ -61,7 +79,7 @@ def read_resource_file(
     file_path = get_resource_path(*children)
 
     try:
-        return pathlib.Path(file_path).read_text(encoding=encoding)
+        return resource_cache.read_text(file_path, encoding=encoding)
     except (FileNotFoundError, UnicodeDecodeError, OSError) as e:
         logger.error("Error reading resource file '%s': %s", file_path, e)
 
@@ -93,6 +111,27 @@ def write_resource_file(
 
     pathlib.Path(file_path).write_text(content, encoding=encoding)
 
+    resource_cache.invalidate(file_path)
+
+
+def preload_resources() -> None:
+    """
+    Load the resources listed in the `RESOURCE_CACHE_PRELOAD` manifest, a path
+    relative to the resources, into the resource cache.
+
+    Returns:
+        None
+    """
+    manifest = os.getenv(ENV_RESOURCE_CACHE_PRELOAD)
+
+    if not manifest:
+        return
+
+    try:
+        resource_cache.preload(get_resource_path(manifest), get_resource_path())
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning("Could not read resource cache manifest '%s': %s", manifest, e)
+
 
 def save_table(
     output_path: str,
@@ -102,10 +141,10 @@ def save_table(
     max_column_width: int = 80,
 ) -> None:
     """
-    Log a formatted table to the console.
+    Log a formatted table to the console and save it to a file.
 
     Args:
-        output_path (str): Directory to save the formatted table file.
+        output_path (str): Path of the formatted table file, relative to the resources.
         headers (list[str]): The table headers.
         rows (list[list[str]]): The table rows.
         padding (int): Number of blank lines to log before and after the table.
@@ -114,174 +153,297 @@ def save_table(
     Returns:
         None
     """
-    def truncate_text(text: str, max_width: int) -> str:
-        """
-        Truncate text to max_width, adding '...' if needed.
+    num_columns = len(headers)
+    # Rows are padded with empty strings if too short, or truncated if too long
+    cells = [
+        np.array([str(row[index]) if index < len(row) else "" for row in rows], dtype=StringDType())
+        for index in range(num_columns)
+    ]
+    widths = _measure_columns(cells, [len(_truncate_text(header, max_column_width)) for header in headers])
 
-        Args:
-            text (str): The text to truncate.
-            max_width (int): The maximum allowed width.
+    _write_table(
+        output_path,
+        headers,
+        [(cells, [None] * num_columns)],
+        [min(width, max_column_width) for width in widths],
+        padding,
+    )
 
-        Returns:
-            str: The truncated text.
-        """
-        if len(text) <= max_width:
-            return text
 
-        return text[:max_width - 3] + "..."
+def save_csv_table(
+    csv_path: str,
+    output_path: str,
+    separator: str = ",",
+    max_column_width: int = 80,
+    percentage_columns: list[str] = None,
+    highlight_threshold: float = VALUE_HIGHLIGHT_THRESHOLD_DEFAULT,
+    sample_rows: int = None,
+) -> None:
+    """
+    Log a CSV file as a formatted table to the console and save it to a file.
+
+    The CSV file is read in chunks of `CSV_CHUNK_ROWS` rows and the table is
+    written chunk by chunk, so memory stays bounded whatever the size of the
+    file. Column widths are measured in a first pass over the file, or over its
+    first `sample_rows` rows, in which case longer cells are truncated. Cells
+    are formatted and padded column by column with vectorized string operations.
 
-    def create_line(join_with: str, col_widths: list[int]) -> str:
-        """
-        Create a line of repeated characters for table borders.
+    Args:
+        csv_path (str): Path of the CSV file, relative to the resources.
+        output_path (str): Path of the formatted table file, relative to the resources.
+        separator (str): The delimiter used in the CSV file.
+        max_column_width (int): Maximum width of a table column.
+        percentage_columns (list[str]): Column names to format as percentages for display.
+        highlight_threshold (float): Threshold for highlighting percentage values.
+        sample_rows (int): Number of rows to measure column widths on, None for all rows.
 
-        Args:
-            join_with (str): The string to join the segments with.
-            col_widths (list[int]): The widths of each column.
+    Returns:
+        None
+    """
+    file_path = get_resource_path(csv_path)
 
-        Returns:
-            str: The constructed line.
+    def read_chunks(nrows: int = None):
+        """
+        Read the CSV file in chunks, as strings.
         """
-        return join_with.join("─" * col_width for col_width in col_widths)
+        return pd.read_csv(
+            file_path,
+            sep=separator,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=CSV_CHUNK_ROWS,
+            nrows=nrows,
+        )
 
-    # Ensure all rows have the same number of columns as headers
-    num_columns = len(headers)
-    normalized_rows = []
-    for row in rows:
-        # Pad row with empty strings if it's too short, or truncate if too long
-        normalized_row = row[:num_columns] + [""] * (num_columns - len(row))
-        normalized_rows.append(normalized_row)
-
-    # Truncate all content first
-    truncated_headers = [truncate_text(header, max_column_width) for header in headers]
-    truncated_rows = [
-        [truncate_text(str(item), max_column_width) for item in row]
-        for row in normalized_rows
-    ]
+    try:
+        columns = list(pd.read_csv(file_path, sep=separator, nrows=0).columns)
+        percentage_columns = set(percentage_columns or []) & set(columns)
+        headers = [
+            str(column).strip().capitalize().replace("_", " ") + (" [%]" if column in percentage_columns else "")
+            for column in columns
+        ]
+        widths = [len(_truncate_text(header, max_column_width)) for header in headers]
+        num_rows = 0
 
-    # Calculate column widths based on truncated content
-    col_widths = [
-        max(len(str(item)) for item in col) 
-        for col in zip(*([truncated_headers] + truncated_rows))
-    ]
+        with read_chunks(sample_rows) as chunks:
+            for chunk in chunks:
+                cells, _ = _format_columns(chunk, percentage_columns, highlight_threshold)
+                widths = _measure_columns(cells, widths)
+                num_rows += len(chunk)
 
-    header_line = " │ ".join(f"{header:<{col_widths[i]}}" for i, header in enumerate(truncated_headers))
+        if num_rows == 0:
+            logger.info("No data to display.")
 
-    output_lines = []
+            return
 
-    for _ in range(padding):
-        output_lines.append(NEWLINE)
+        with read_chunks() as chunks:
+            _write_table(
+                output_path,
+                headers,
+                (_format_columns(chunk, percentage_columns, highlight_threshold) for chunk in chunks),
+                [min(width, max_column_width) for width in widths],
+            )
+    except FileNotFoundError:
+        logger.error("Error: File '%1s' not found.", csv_path)
+    except pd.errors.EmptyDataError:
+        logger.error("Error: The CSV file is empty.")
+    except pd.errors.ParserError as e:
+        logger.error("Error parsing CSV file: %1s", e)
 
-    output_lines.append(create_line("─┬─", col_widths))
-    output_lines.append(header_line)
-    output_lines.append(create_line("─┼─", col_widths))
 
-    for row in truncated_rows:
-        row_line = " │ ".join(f"{str(item):<{col_widths[i]}}" for i, item in enumerate(row))
-        output_lines.append(row_line.strip())
+def _format_columns(
+    chunk: pd.DataFrame,
+    percentage_columns: set[str],
+    highlight_threshold: float,
+) -> tuple[list[np.ndarray], list[Optional[np.ndarray]]]:
+    """
+    Format the cells of a chunk of a CSV file, column by column.
 
-    output_lines.append(create_line("─┴─", col_widths))
+    Args:
+        chunk (pd.DataFrame): The chunk, as strings.
+        percentage_columns (set[str]): Column names to format as percentages.
+        highlight_threshold (float): Threshold for highlighting percentage values.
 
-    for _ in range(padding):
-        output_lines.append(NEWLINE)
+    Returns:
+        tuple[list[np.ndarray], list[Optional[np.ndarray]]]: The cells and, for
+            percentage columns, which of them to highlight.
+    """
+    cells = []
+    highlights = []
 
-    output = NEWLINE.join(output_lines)
+    for column in chunk.columns:
+        if column not in percentage_columns:
+            cells.append(chunk[column].to_numpy(dtype=StringDType()))
+            highlights.append(None)
 
-    logger.info(output)
+            continue
 
-    write_resource_file(
-        output_path,
-        content=output.replace(BOLD, "").replace(RED, "").replace(RESET, ""),
-    )
+        values = pd.to_numeric(chunk[column], errors="coerce").to_numpy(dtype=float) * 100
 
+        cells.append(np.strings.mod(np.array("%.1f", dtype=StringDType()), values))
+        highlights.append(values >= highlight_threshold * 100)
 
-def save_csv_table(
-    csv_path: str,
+    return cells, highlights
+
+
+def _measure_columns(
+    cells: list[np.ndarray],
+    widths: list[int],
+) -> list[int]:
+    """
+    Widen columns to fit their cells.
+
+    Args:
+        cells (list[np.ndarray]): The cells, by column.
+        widths (list[int]): The widths of the columns so far.
+
+    Returns:
+        list[int]: The widths of the columns.
+    """
+    return [
+        max(width, int(np.strings.str_len(column).max())) if column.size else width
+        for column, width in zip(cells, widths)
+    ]
+
+
+def _write_table(
     output_path: str,
-    separator: str = ",",
-    max_column_width: int = 80,
-    percentage_columns: list[str] = None,
-    highlight_threshold: float = MIA_THRESHOLD,
+    headers: list[str],
+    chunks: Iterable[tuple[list[np.ndarray], list[Optional[np.ndarray]]]],
+    widths: list[int],
+    padding: int = 1,
 ) -> None:
     """
-    Log a CSV file as a formatted table to the console using pandas.
+    Write a table to a resource file and log it, chunk by chunk.
+
+    Highlighting is only logged, the file is written without it.
 
     Args:
-        csv_path (str): The path to the CSV file.
-        output_path (str): Directory to save the formatted CSV file.
-        separator (str): The delimiter used in the CSV file.
-        max_column_width (int): Maximum width of a table column.
-        percentage_columns (list[str]): Column names to format as percentages for display.
-        highlight_threshold (float): Threshold for highlighting percentage values.
+        output_path (str): Path of the formatted table file, relative to the resources.
+        headers (list[str]): The table headers.
+        chunks (Iterable[tuple[list[np.ndarray], list[Optional[np.ndarray]]]]): Cells of
+            the rows by column and which of them to highlight, chunk by chunk.
+        widths (list[int]): The widths of the columns.
+        padding (int): Number of blank lines before and after the table.
 
     Returns:
         None
     """
+    file_path = get_resource_path(output_path, ensure_parent_exists=True)
+    resource_cache.invalidate(file_path)
+    header_line = COLUMN_SEPARATOR.join(
+        f"{_truncate_text(header, width):<{width}}" for header, width in zip(headers, widths)
+    )
+    head = NEWLINE.join(
+        [NEWLINE] * padding + [_create_line("─┬─", widths), header_line, _create_line("─┼─", widths)]
+    )
+    tail = NEWLINE + NEWLINE.join([_create_line("─┴─", widths)] + [NEWLINE] * padding)
+    log_rows = logger.isEnabledFor(INFO)
 
-    def highlight_percentage(value: float, threshold: float) -> str:
-        """
-        Apply color highlighting to percentage values above threshold.
+    with open(file_path, "w", encoding=ENCODING_UTF8) as fh:
+        fh.write(head)
 
-        Args:
-            value (float): The percentage value.
-            threshold (float): The threshold for highlighting.
+        logger.info(head)
 
-        Returns:
-            str: The formatted (and possibly highlighted) percentage string.
-        """
-        formatted_value = f"{value:.1f}"
+        for cells, highlights in chunks:
+            if not cells or not cells[0].size:
+                continue
 
-        if value >= threshold:
-            return f"{BOLD}{RED}{formatted_value}{RESET}"
+            cells = [_truncate_column(column, width) for column, width in zip(cells, widths)]
+            rows = NEWLINE.join(_render_rows(cells, [None] * len(cells), widths).tolist())
 
-        return formatted_value
+            fh.write(NEWLINE + rows)
 
-    try:
-        # Read CSV with pandas
-        df = pd.read_csv(get_resource_path(csv_path), sep=separator)
+            if log_rows and any(highlight is not None and highlight.any() for highlight in highlights):
+                rows = NEWLINE.join(_render_rows(cells, highlights, widths).tolist())
 
-        if df.empty:
-            logger.info("No data to display.")
+            logger.info(rows)
 
-            return
+        fh.write(tail)
 
-        # Create a copy for display formatting (don't modify original)
-        display_df = df.copy()
+        logger.info(tail)
 
-        # Format specified columns as percentages
-        if percentage_columns:
-            for col in percentage_columns:
-                if col in display_df.columns:
-                    display_df[col] = display_df[col].apply(
-                        lambda x: highlight_percentage(x * 100, highlight_threshold * 100)
-                    )
 
-        # Convert to the format expected by log_table
-        headers = []
+def _render_rows(
+    cells: list[np.ndarray],
+    highlights: list[Optional[np.ndarray]],
+    widths: list[int],
+) -> np.ndarray:
+    """
+    Render rows of a table, column by column.
 
-        for col in display_df.columns:
-            header = str(col).strip().capitalize().replace("_", " ")
+    Args:
+        cells (list[np.ndarray]): The cells of the rows, by column, fitting their columns.
+        highlights (list[Optional[np.ndarray]]): Which cells to highlight, by column.
+        widths (list[int]): The widths of the columns.
 
-            # Add [%] suffix to percentage column headers
-            if percentage_columns and col in percentage_columns:
-                header += " [%]"
+    Returns:
+        np.ndarray: The rendered rows.
+    """
+    rows = None
 
-            headers.append(header)
+    for column, highlight, width in zip(cells, highlights, widths):
+        text = np.strings.ljust(column, width)
 
-        rows = [
-            [str(item) for item in row]
-            for row in display_df.values
-        ]
+        if highlight is not None:
+            text = np.where(highlight, np.strings.add(np.strings.add(BOLD + RED, text), RESET), text)
 
-        save_table(
-            output_path=output_path,
-            headers=headers,
-            rows=rows,
-            max_column_width=max_column_width,
-        )
+        rows = text if rows is None else np.strings.add(np.strings.add(rows, COLUMN_SEPARATOR), text)
 
-    except FileNotFoundError:
-        logger.error("Error: File '%1s' not found.", csv_path)
-    except pd.errors.EmptyDataError:
-        logger.error("Error: The CSV file is empty.")
-    except pd.errors.ParserError as e:
-        logger.error("Error parsing CSV file: %1s", e)
+    return np.strings.rstrip(rows)
+
+
+def _truncate_column(column: np.ndarray, max_width: int) -> np.ndarray:
+    """
+    Truncate the cells of a column to max_width, adding '...' if needed.
+
+    Only the cells that are too long are truncated, one by one.
+
+    Args:
+        column (np.ndarray): The cells of the column.
+        max_width (int): The maximum allowed width.
+
+    Returns:
+        np.ndarray: The truncated cells.
+    """
+    too_long = np.flatnonzero(np.strings.str_len(column) > max_width)
+
+    if too_long.size:
+        column = column.copy()
+        column[too_long] = [_truncate_text(str(text), max_width) for text in column[too_long]]
+
+    return column
+
+
+def _truncate_text(text: str, max_width: int) -> str:
+    """
+    Truncate text to max_width, adding '...' if needed.
+
+    Args:
+        text (str): The text to truncate.
+        max_width (int): The maximum allowed width.
+
+    Returns:
+        str: The truncated text.
+    """
+    if len(text) <= max_width:
+        return text
+
+    if max_width <= 3:
+        return text[:max_width]
+
+    return text[:max_width - 3] + "..."
+
+
+def _create_line(join_with: str, col_widths: list[int]) -> str:
+    """
+    Create a line of repeated characters for table borders.
+
+    Args:
+        join_with (str): The string to join the segments with.
+        col_widths (list[int]): The widths of each column.
+
+    Returns:
+        str: The constructed line.
+    """
+    return join_with.join("─" * col_width for col_width in col_widths)
@@ -0,0 +1,125 @@
+"""
+Locks shared by the workers of a host.
+"""
+
+import os
+
+import asyncio
+
+from pathlib import Path
+
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+from util.path import ensure_dir
+
+
+# Seconds between attempts to take a slot held by another worker
+POLL_SECONDS = 0.05
+
+
+class HostSemaphore:
+    """
+    Semaphore bounding the holders of a resource across all the workers of a host.
+
+    Each slot is a lock file, locked with `flock` while held. The kernel releases
+    the locks of a worker that dies, so a crashed worker never leaks its slots.
+    Within a worker, waiters queue on a local semaphore rather than polling the
+    lock files. Where `flock` is not available, the bound is per worker.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        slots: int,
+    ):
+        """
+        Initialize the semaphore.
+
+        Args:
+            directory (str): Directory of the lock files.
+            name (str): Name of the semaphore.
+            slots (int): Number of slots, 0 for no bound.
+        """
+        self.directory = Path(directory)
+        self.name = name
+        self.slots = slots
+        self.local: Optional[asyncio.Semaphore] = None
+        # Descriptors of the locked slot files, by id of the holding task
+        self.held: dict[int, int] = {}
+
+    async def __aenter__(self) -> "HostSemaphore":
+        await self.acquire()
+
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.release()
+
+    async def acquire(self) -> None:
+        """
+        Acquire a slot, waiting for one to be released if all are held.
+        """
+        if self.slots <= 0:
+            return
+
+        if self.local is None:
+            self.local = asyncio.Semaphore(self.slots)
+
+        await self.local.acquire()
+
+        if fcntl is None:
+            return
+
+        try:
+            while (descriptor := self._lock_slot()) is None:
+                await asyncio.sleep(POLL_SECONDS)
+        except BaseException:
+            self.local.release()
+
+            raise
+
+        self.held[id(asyncio.current_task())] = descriptor
+
+    def release(self) -> None:
+        """
+        Release the slot held by the current task.
+        """
+        if self.slots <= 0:
+            return
+
+        descriptor = self.held.pop(id(asyncio.current_task()), None)
+
+        if descriptor is not None:
+            os.close(descriptor)
+
+        self.local.release()
+
+    def _lock_slot(self) -> Optional[int]:
+        """
+        Lock the first free slot.
+
+        Returns:
+            Optional[int]: Descriptor of the locked slot file or None if all slots are held.
+        """
+        ensure_dir(str(self.directory))
+
+        for slot in range(self.slots):
+            descriptor = os.open(self.directory / f"{self.name}-{slot}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(descriptor)
+
+                continue
+
+            return descriptor
+
+        return None
@@ -0,0 +1,230 @@
+"""
+Logging utility functions.
+"""
+
+import json
+
+import time
+
+import queue
+
+import logging
+
+from datetime import datetime, timezone
+
+from logging.handlers import QueueHandler, QueueListener
+
+from typing import Optional
+
+from common.constants import (
+    KEY_TIMESTAMP,
+    KEY_LEVEL,
+    KEY_LOGGER,
+    KEY_MESSAGE,
+    KEY_EXCEPTION,
+)
+
+# Attributes of every log record, anything else was passed in `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full.
+
+    Records are formatted by the listener thread: the caller only merges the
+    message with its arguments, so that the record can cross threads.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        """
+        Initialize the handler.
+
+        Args:
+            log_queue (queue.Queue): The queue, bounded.
+        """
+        super().__init__(log_queue)
+
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Enqueue a record, or drop it if the queue is full.
+
+        Args:
+            record (logging.LogRecord): The record.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+            return
+
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+
+            try:
+                self.queue.put_nowait(
+                    logging.makeLogRecord({
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": logging.getLevelName(logging.WARNING),
+                        "msg": f"Log queue full, {dropped} records dropped.",
+                    })
+                )
+            except queue.Full:
+                self.dropped += dropped
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepare a record for the queue: merge its message and arguments and
+        render its traceback, leaving the rest of the formatting to the listener.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            logging.LogRecord: The prepared record.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Filter rate limiting chatty records of hot paths.
+
+    Records below `max_level` are let through at most `limit` times per
+    `interval_seconds` per message template; the next record let through
+    reports how many were suppressed in the meantime.
+    """
+
+    def __init__(
+        self,
+        limit: int = 10,
+        interval_seconds: float = 1.0,
+        max_level: str = "INFO",
+    ):
+        """
+        Initialize the filter.
+
+        Args:
+            limit (int): Records let through per interval and message template.
+            interval_seconds (float): Length of the interval.
+            max_level (str): Level from which records are never sampled.
+        """
+        super().__init__()
+
+        self.limit = limit
+        self.interval_seconds = interval_seconds
+        self.max_level = logging.getLevelName(max_level.upper())
+        # Start of the interval, records let through and records suppressed, by message template
+        self.windows: dict[tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Check whether a record is let through.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            bool: Whether the record is logged.
+        """
+        if record.levelno >= self.max_level:
+            return True
+
+        now = time.monotonic()
+        key = (record.name, str(record.msg))
+        window = self.windows.get(key)
+
+        if window is None or now - window[0] >= self.interval_seconds:
+            suppressed = window[2] if window else 0
+            self.windows[key] = window = [now, 0, 0]
+
+            if suppressed:
+                record.msg = f"{record.msg} ({suppressed} similar records suppressed)"
+
+        if window[1] >= self.limit:
+            window[2] += 1
+
+            return False
+
+        window[1] += 1
+
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter rendering records as JSON objects, one per line, with the
+    attributes passed in `extra` as additional fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format a record.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            str: The JSON object.
+        """
+        entry = {
+            KEY_TIMESTAMP: datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            KEY_LEVEL: record.levelname,
+            KEY_LOGGER: record.name,
+            KEY_MESSAGE: record.getMessage(),
+        }
+
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and not key.startswith("_")
+        )
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry[KEY_EXCEPTION] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+def start_queue_listener(
+    logger: logging.Logger,
+    queue_size: int,
+) -> Optional[QueueListener]:
+    """
+    Move the handlers of a logger behind a queue, served by a listener thread.
+
+    Args:
+        logger (logging.Logger): The logger, usually the root logger.
+        queue_size (int): Capacity of the queue, 0 to keep logging synchronously.
+
+    Returns:
+        Optional[QueueListener]: The started listener or None if logging is synchronous.
+    """
+    if queue_size <= 0 or not logger.handlers:
+        return None
+
+    log_queue = queue.Queue(queue_size)
+    handlers = list(logger.handlers)
+
+    for handler in handlers:
+        logger.removeHandler(handler)
+
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    return listener
@@ -4,8 +4,13 @@ Utility functions for working with file paths.
 
 import pathlib
 
+import functools
+
 from common.constants import DIR_RESOURCE
 
+# Most resource paths whose resolution is cached
+MAX_CACHED_PATHS = 1024
+
 
 def get_resource_path(
     *children: str,
@@ -14,8 +19,31 @@ def get_resource_path(
     """
     Get the absolute path to a resource file or directory.
 
+    Paths are resolved once and cached, so repeated lookups do not touch the
+    filesystem.
+
     Args:
         *children (str): Subdirectories or file names to append to the base resource path.
+        ensure_parent_exists (bool): Whether to create the parent directory if needed.
+
+    Returns:
+        str: The absolute path to the specified resource.
+    """
+    if ensure_parent_exists:
+        base_path = pathlib.Path(__file__).parent.parent.parent.resolve()
+
+        ensure_dir(str((base_path / DIR_RESOURCE / pathlib.Path(*children)).parent))
+
+    return _resolve_resource_path(children)
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_PATHS)
+def _resolve_resource_path(children: tuple[str, ...]) -> str:
+    """
+    Resolve the absolute path to a resource file or directory.
+
+    Args:
+        children (tuple[str, ...]): Subdirectories or file names to append to the base resource path.
 
     Returns:
         str: The absolute path to the specified resource.
@@ -23,9 +51,6 @@ def get_resource_path(
     base_path = pathlib.Path(__file__).parent.parent.parent.resolve()
     resource_path = base_path / DIR_RESOURCE / pathlib.Path(*children)
 
-    if ensure_parent_exists:
-        ensure_dir(str(resource_path.parent))
-
     return str(resource_path.resolve())
 
 
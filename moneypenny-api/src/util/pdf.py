@@ -0,0 +1,51 @@
+"""
+Utility functions for working with PDF files.
+"""
+
+from logging import getLogger
+
+import re
+
+import mmap
+
+from typing import Optional
+
+
+logger = getLogger(__file__)
+
+# Page tree nodes, with the key order /Type ... /Count or /Count ... /Type
+PAGES_COUNT_PATTERN = re.compile(
+    rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b"
+)
+
+
+def get_page_count(path: str) -> Optional[int]:
+    """
+    Get the number of pages of a PDF file without parsing it.
+
+    The page count is the /Count of the root page tree node, which is the largest
+    /Count of all page tree nodes. Page trees stored in compressed object streams
+    are not visible this way, in which case the page count is unknown.
+
+    Args:
+        path (str): Path to the PDF file.
+
+    Returns:
+        Optional[int]: The number of pages or None if unknown.
+    """
+    try:
+        with open(path, "rb") as fh:
+            if not fh.read(5) == b"%PDF-":
+                return None
+
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                counts = [
+                    int(first or second)
+                    for first, second in PAGES_COUNT_PATTERN.findall(data)
+                ]
+    except (OSError, ValueError) as e:
+        logger.debug("Could not read page count of '%s': %s", path, e)
+
+        return None
+
+    return max(counts) if counts else None
@@ -0,0 +1,396 @@
+"""
+Resilience of upstream calls: retries with jittered backoff, circuit breakers
+and hedged requests.
+"""
+
+from logging import getLogger
+
+import os
+
+import time
+
+import random
+
+import asyncio
+
+from collections import deque
+
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from common.constants import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    ENV_UPSTREAM_RETRIES,
+    ENV_UPSTREAM_BACKOFF_SECONDS,
+    ENV_UPSTREAM_MAX_BACKOFF_SECONDS,
+    ENV_CIRCUIT_BREAKER_FAILURES,
+    ENV_CIRCUIT_BREAKER_RESET_SECONDS,
+    ENV_HEDGE_ENABLED,
+    ENV_HEDGE_PERCENTILE,
+    ENV_HEDGE_MIN_SAMPLES,
+    VALUE_UPSTREAM_RETRIES_DEFAULT,
+    VALUE_UPSTREAM_BACKOFF_SECONDS_DEFAULT,
+    VALUE_UPSTREAM_MAX_BACKOFF_SECONDS_DEFAULT,
+    VALUE_CIRCUIT_BREAKER_FAILURES_DEFAULT,
+    VALUE_CIRCUIT_BREAKER_RESET_SECONDS_DEFAULT,
+    VALUE_HEDGE_ENABLED_DEFAULT,
+    VALUE_HEDGE_PERCENTILE_DEFAULT,
+    VALUE_HEDGE_MIN_SAMPLES_DEFAULT,
+    VALUE_LATENCY_WINDOW_SIZE,
+    VALUE_TRUE,
+)
+from common.exception import UpstreamUnavailableException
+
+from metrics.instruments import circuit_breaker_state, upstream_retries, hedged_requests
+
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# Base classes of client errors raised for failed connections and timeouts, by name
+# so that the provider SDKs stay optional
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "TransportError", "TimeoutException", "McpError"}
+
+HEDGE_PRIMARY = "primary"
+HEDGE_SECONDARY = "hedge"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of an upstream.
+
+    After `CIRCUIT_BREAKER_FAILURES` consecutive failures the circuit opens and
+    calls fail fast for `CIRCUIT_BREAKER_RESET_SECONDS`. The first call after
+    that is let through as a probe, with the circuit half-open: if it succeeds
+    the circuit closes, if it fails the circuit opens again.
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        failures: int = None,
+        reset_seconds: float = None,
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            upstream (str): Name of the upstream.
+            failures (int): Consecutive failures opening the circuit, 0 to never open it.
+            reset_seconds (float): Time the circuit stays open before a probe is let through.
+        """
+        self.upstream = upstream
+        self.failures_threshold = failures if failures is not None else int(
+            os.getenv(ENV_CIRCUIT_BREAKER_FAILURES, str(VALUE_CIRCUIT_BREAKER_FAILURES_DEFAULT))
+        )
+        self.reset_seconds = reset_seconds if reset_seconds is not None else float(
+            os.getenv(ENV_CIRCUIT_BREAKER_RESET_SECONDS, str(VALUE_CIRCUIT_BREAKER_RESET_SECONDS_DEFAULT))
+        )
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_on = 0.0
+
+        circuit_breaker_state.set(self.state, upstream)
+
+    def check(self) -> None:
+        """
+        Check whether a call may be made.
+
+        Raises:
+            UpstreamUnavailableException: If the circuit is open, or half-open with a probe in flight.
+        """
+        if self.state == CIRCUIT_CLOSED:
+            return
+
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_on >= self.reset_seconds:
+            logger.info("Circuit of '%s' half-open, probing.", self.upstream)
+
+            self._set_state(CIRCUIT_HALF_OPEN)
+
+            return
+
+        raise UpstreamUnavailableException(
+            f"Upstream '{self.upstream}' is unavailable, circuit open.", self.upstream,
+        )
+
+    def record_success(self) -> None:
+        """
+        Record a successful call, closing the circuit.
+        """
+        self.failures = 0
+
+        if self.state != CIRCUIT_CLOSED:
+            logger.info("Circuit of '%s' closed.", self.upstream)
+
+            self._set_state(CIRCUIT_CLOSED)
+
+    def record_failure(self) -> None:
+        """
+        Record a failed call, opening the circuit once too many calls failed in a row.
+        """
+        self.failures += 1
+
+        if self.state == CIRCUIT_HALF_OPEN or (
+            self.failures_threshold > 0 and self.failures >= self.failures_threshold
+        ):
+            if self.state != CIRCUIT_OPEN:
+                logger.warning(
+                    "Circuit of '%s' open after %d failures, failing fast for %s seconds.",
+                    self.upstream, self.failures, self.reset_seconds,
+                )
+
+            self.opened_on = time.monotonic()
+            self._set_state(CIRCUIT_OPEN)
+
+    def record_release(self) -> None:
+        """
+        Record a call that neither succeeded nor failed, e.g. a cancelled probe,
+        so that the next call probes instead.
+        """
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.opened_on = time.monotonic() - self.reset_seconds
+            self._set_state(CIRCUIT_OPEN)
+
+    def _set_state(self, state: int) -> None:
+        """
+        Set the state of the circuit and report it.
+
+        Args:
+            state (int): The state.
+        """
+        self.state = state
+
+        circuit_breaker_state.set(state, self.upstream)
+
+
+class LatencyWindow:
+    """
+    Latencies of the last successful calls to an upstream.
+    """
+
+    def __init__(self, size: int = VALUE_LATENCY_WINDOW_SIZE):
+        """
+        Initialize the window.
+
+        Args:
+            size (int): Number of latencies kept.
+        """
+        self.latencies: deque[float] = deque(maxlen=size)
+
+    def record(self, latency: float) -> None:
+        """
+        Record the latency of a call.
+
+        Args:
+            latency (float): The latency in seconds.
+        """
+        self.latencies.append(latency)
+
+    def get_percentile(
+        self,
+        percentile: float,
+        min_samples: int = 1,
+    ) -> Optional[float]:
+        """
+        Get a percentile of the latencies.
+
+        Args:
+            percentile (float): The percentile, between 0 and 100.
+            min_samples (int): Number of latencies needed for a meaningful percentile.
+
+        Returns:
+            Optional[float]: The latency in seconds or None if there are too few latencies.
+        """
+        if not self.latencies or len(self.latencies) < min_samples:
+            return None
+
+        latencies = sorted(self.latencies)
+
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+class Upstream:
+    """
+    Resilience policy and state of an upstream, shared by all calls to it.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the upstream.
+
+        Args:
+            name (str): Name of the upstream.
+        """
+        self.name = name
+        self.attempts = max(1, 1 + int(os.getenv(ENV_UPSTREAM_RETRIES, str(VALUE_UPSTREAM_RETRIES_DEFAULT))))
+        self.backoff_seconds = float(os.getenv(ENV_UPSTREAM_BACKOFF_SECONDS, str(VALUE_UPSTREAM_BACKOFF_SECONDS_DEFAULT)))
+        self.max_backoff_seconds = float(
+            os.getenv(ENV_UPSTREAM_MAX_BACKOFF_SECONDS, str(VALUE_UPSTREAM_MAX_BACKOFF_SECONDS_DEFAULT))
+        )
+        self.hedge_enabled = os.getenv(ENV_HEDGE_ENABLED, VALUE_HEDGE_ENABLED_DEFAULT).lower() in VALUE_TRUE
+        self.hedge_percentile = float(os.getenv(ENV_HEDGE_PERCENTILE, str(VALUE_HEDGE_PERCENTILE_DEFAULT)))
+        self.hedge_min_samples = int(os.getenv(ENV_HEDGE_MIN_SAMPLES, str(VALUE_HEDGE_MIN_SAMPLES_DEFAULT)))
+        self.breaker = CircuitBreaker(name)
+        self.latencies = LatencyWindow()
+
+    async def call(
+        self,
+        call: Callable[[], Awaitable[T]],
+        retry: bool = True,
+        hedge: bool = False,
+    ) -> T:
+        """
+        Call the upstream through its circuit breaker, retrying transient failures
+        with exponential backoff and full jitter.
+
+        Retries and hedges repeat the call, so they are for idempotent calls only.
+
+        Args:
+            call (Callable[[], Awaitable[T]]): Makes the call, once per attempt.
+            retry (bool): Whether to retry transient failures.
+            hedge (bool): Whether to hedge the call, if hedging is enabled.
+
+        Returns:
+            T: The result of the call.
+
+        Raises:
+            UpstreamUnavailableException: If the circuit of the upstream is open.
+        """
+        attempts = self.attempts if retry else 1
+        attempt = 0
+
+        while True:
+            self.breaker.check()
+
+            start = time.perf_counter()
+
+            try:
+                if hedge and self.hedge_enabled:
+                    result = await self._hedge(call)
+                else:
+                    result = await call()
+            except asyncio.CancelledError:
+                self.breaker.record_release()
+
+                raise
+            except Exception as e: # pylint: disable=broad-except
+                if not is_transient(e):
+                    self.breaker.record_release()
+
+                    raise
+
+                self.breaker.record_failure()
+
+                attempt += 1
+
+                if attempt >= attempts or self.breaker.state == CIRCUIT_OPEN:
+                    raise
+
+                delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempt - 1)))
+
+                logger.warning(
+                    "Call to '%s' failed (%s), retrying in %.2f seconds.", self.name, e, delay,
+                )
+
+                upstream_retries.inc(self.name)
+
+                await asyncio.sleep(delay)
+
+                continue
+
+            self.breaker.record_success()
+            self.latencies.record(time.perf_counter() - start)
+
+            return result
+
+    async def _hedge(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Make a call, and a second one if the first takes longer than the
+        `HEDGE_PERCENTILE` latency of the upstream, taking whichever returns first.
+
+        Args:
+            call (Callable[[], Awaitable[T]]): Makes the call.
+
+        Returns:
+            T: The result of the first call to succeed, or the failure of the last one.
+        """
+        delay = self.latencies.get_percentile(self.hedge_percentile, self.hedge_min_samples)
+
+        if delay is None:
+            return await call()
+
+        tasks = {asyncio.ensure_future(call()): HEDGE_PRIMARY}
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+
+            if not done:
+                logger.debug("Call to '%s' slower than %.2f seconds, hedging.", self.name, delay)
+
+                tasks[asyncio.ensure_future(call())] = HEDGE_SECONDARY
+
+            pending = set(tasks) - done
+
+            # Wait for a success, or for the last call to fail
+            while pending and not any(task.exception() is None for task in done):
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                done |= finished
+
+            winner = next((task for task in done if task.exception() is None), next(iter(done)))
+
+            if len(tasks) > 1:
+                hedged_requests.inc(self.name, tasks[winner])
+
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Check whether a failure is transient, i.e. worth retrying and counting
+    against the circuit breaker: failed connections, timeouts, rate limits and
+    server errors. Invalid requests are not.
+
+    Args:
+        error (BaseException): The failure.
+
+    Returns:
+        bool: Whether the failure is transient.
+    """
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+
+    return isinstance(error, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__
+    )
+
+
+upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    """
+    Get the resilience state of an upstream, creating it on first use.
+
+    Args:
+        name (str): Name of the upstream, e.g. a model or an MCP server.
+
+    Returns:
+        Upstream: The upstream.
+    """
+    if name not in upstreams:
+        upstreams[name] = Upstream(name)
+
+    return upstreams[name]
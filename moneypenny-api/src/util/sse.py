@@ -0,0 +1,214 @@
+"""
+Utility functions for encoding Server-Sent Events.
+"""
+
+import json
+
+from typing import Any, Optional
+
+from common.constants import (
+    KEY_DATA,
+    KEY_FIELD,
+    KEY_TEXT,
+    KEY_SET,
+    KEY_MERGE,
+    KEY_UNSET,
+    KEY_BUDGET,
+    KEY_ARTIFACT,
+    EVENT_STATE,
+    EVENT_TEXT,
+    EVENT_DOCUMENT,
+    EVENT_DONE,
+    EVENT_BUDGET,
+    EVENT_ARTIFACT,
+    STREAM_MODE_CUSTOM,
+    NEWLINE,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> str:
+    """
+    Serialize a value to compact JSON, with orjson if it is installed.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        str: The JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode()
+
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def encode_event_v1(update: dict[str, Any]) -> str:
+    """
+    Encode an update as a protocol v1 event: an unnamed event with the full update.
+
+    Args:
+        update (dict[str, Any]): The update.
+
+    Returns:
+        str: The event.
+    """
+    return f"{KEY_DATA}: {json.dumps(update)}{NEWLINE}{NEWLINE}"
+
+
+class DeltaEncoder:
+    """
+    Encoder of protocol v2 events, i.e. state deltas with typed events and ids.
+
+    Every event has a name and an id increasing by one per event of the stream,
+    starting at 1:
+
+    - `state`: `{"set": {...}, "merge": {...}, "unset": [...]}`, the fields set
+      to a new value, the new and changed entries of object fields and the fields
+      removed since the previous state. Only the operations present are sent.
+    - `text`: `{"field": "...", "text": "..."}`, text appended to a text field.
+    - `document`: per-document progress, as in protocol v1.
+    - `budget`: `{"budget": "...", "limit": ..., "used": ...}`, an execution
+      budget exceeded by the run, as in protocol v1.
+    - `artifact`: `{"artifact": "...", "status": "...", "size": ..., "content_type": "...",
+      "path": "..."}`, a document the run created or modified, as in protocol v1.
+    - `done`: `{}`, the stream completed.
+
+    Applying the events in order to an empty object yields the latest state.
+    """
+
+    def __init__(self):
+        """
+        Initialize the encoder.
+        """
+        self.event_id = 0
+        self.state: dict[str, Any] = {}
+
+    def encode(
+        self,
+        mode: str,
+        update: dict[str, Any],
+    ) -> str:
+        """
+        Encode a graph update as the events of its delta to the previous state.
+
+        Args:
+            mode (str): The stream mode of the update.
+            update (dict[str, Any]): The update.
+
+        Returns:
+            str: The events, empty if nothing changed.
+        """
+        return "".join(self._format_event(*event) for event in self.get_events(mode, update))
+
+    def encode_done(self) -> str:
+        """
+        Encode the event completing the stream.
+
+        Returns:
+            str: The event.
+        """
+        return self._format_event(*self.get_done_event())
+
+    def get_events(
+        self,
+        mode: str,
+        update: dict[str, Any],
+    ) -> list[tuple[int, str, dict[str, Any]]]:
+        """
+        Get the events of the delta of a graph update to the previous state.
+
+        Args:
+            mode (str): The stream mode of the update.
+            update (dict[str, Any]): The update.
+
+        Returns:
+            list[tuple[int, str, dict[str, Any]]]: The id, name and data of the events,
+                empty if nothing changed.
+        """
+        if mode == STREAM_MODE_CUSTOM:
+            if KEY_ARTIFACT in update:
+                return [self._get_event(EVENT_ARTIFACT, update)]
+
+            return [self._get_event(EVENT_BUDGET if KEY_BUDGET in update else EVENT_DOCUMENT, update)]
+
+        texts = []
+        delta: dict[str, Any] = {}
+
+        for key, value in update.items():
+            previous = self.state.get(key)
+
+            if value == previous:
+                continue
+
+            if isinstance(value, str) and isinstance(previous, str) and previous and value.startswith(previous):
+                texts.append({KEY_FIELD: key, KEY_TEXT: value[len(previous):]})
+            elif isinstance(value, dict) and isinstance(previous, dict) and previous.keys() <= value.keys():
+                delta.setdefault(KEY_MERGE, {})[key] = {
+                    name: item for name, item in value.items() if previous.get(name) != item
+                }
+            else:
+                delta.setdefault(KEY_SET, {})[key] = value
+
+        unset = [key for key in self.state if key not in update]
+
+        if unset:
+            delta[KEY_UNSET] = unset
+
+        self.state = {key: dict(value) if isinstance(value, dict) else value for key, value in update.items()}
+
+        events = [self._get_event(EVENT_STATE, delta)] if delta else []
+        events.extend(self._get_event(EVENT_TEXT, text) for text in texts)
+
+        return events
+
+    def get_done_event(self) -> tuple[int, str, dict[str, Any]]:
+        """
+        Get the event completing the stream.
+
+        Returns:
+            tuple[int, str, dict[str, Any]]: The id, name and data of the event.
+        """
+        return self._get_event(EVENT_DONE, {})
+
+    def _get_event(
+        self,
+        event: str,
+        data: Optional[dict[str, Any]],
+    ) -> tuple[int, str, Optional[dict[str, Any]]]:
+        """
+        Get a single event with the next id.
+
+        Args:
+            event (str): The event name.
+            data (Optional[dict[str, Any]]): The event data.
+
+        Returns:
+            tuple[int, str, Optional[dict[str, Any]]]: The id, name and data of the event.
+        """
+        self.event_id += 1
+
+        return self.event_id, event, data
+
+    @staticmethod
+    def _format_event(
+        event_id: int,
+        event: str,
+        data: Optional[dict[str, Any]],
+    ) -> str:
+        """
+        Format an event as a Server-Sent Event.
+
+        Args:
+            event_id (int): The event id.
+            event (str): The event name.
+            data (Optional[dict[str, Any]]): The event data.
+
+        Returns:
+            str: The event.
+        """
+        return f"id: {event_id}{NEWLINE}event: {event}{NEWLINE}{KEY_DATA}: {dumps(data)}{NEWLINE}{NEWLINE}"
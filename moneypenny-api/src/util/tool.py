@@ -0,0 +1,237 @@
+"""
+Utility functions for invoking tools directly, outside of an agent, and for
+wrapping them.
+"""
+
+from logging import getLogger
+
+import uuid
+
+import asyncio
+
+from typing import Annotated, Any, Awaitable, Optional, TypeVar
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.tools import BaseTool, InjectedToolArg, StructuredTool, ToolException
+
+from common.constants import VALUE_ERROR
+
+from repository.document_repository import DocumentRepository
+
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def invoke_tool(
+    tool: BaseTool,
+    args: dict[str, Any],
+) -> str:
+    """
+    Invoke a tool the way an agent would, and return its text content.
+
+    Args:
+        tool (BaseTool): The tool.
+        args (dict[str, Any]): Arguments of the tool call.
+
+    Returns:
+        str: The text content of the tool response.
+
+    Raises:
+        ToolException: If the tool reports an error.
+    """
+    message = await tool.ainvoke(
+        {
+            "type": "tool_call",
+            "id": str(uuid.uuid4()),
+            "name": tool.name,
+            "args": args,
+        }
+    )
+
+    if not isinstance(message, ToolMessage):
+        raise ToolException(f"Tool '{tool.name}' returned no tool message: {message}")
+
+    content = get_text(message.content)
+
+    if message.status == VALUE_ERROR:
+        raise ToolException(content)
+
+    return content
+
+
+async def call_with_timeout(
+    call: Awaitable[T],
+    timeout: Optional[float],
+) -> T:
+    """
+    Await a call, cancelling it once it takes longer than the timeout.
+
+    Unlike with `asyncio.wait_for`, the timeout is raised whatever the cancelled
+    call raises while it unwinds, e.g. MCP sessions receiving the response of
+    a tool call while they shut down.
+
+    Args:
+        call (Awaitable[T]): The call.
+        timeout (Optional[float]): The timeout in seconds, None for no timeout.
+
+    Returns:
+        T: The result of the call.
+
+    Raises:
+        asyncio.TimeoutError: If the call takes longer than the timeout.
+    """
+    task = asyncio.ensure_future(call)
+
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    if not done:
+        raise asyncio.TimeoutError()
+
+    return task.result()
+
+
+def get_text(content: Any) -> str:
+    """
+    Get the text of message content, which may be a list of content blocks.
+
+    Args:
+        content (Any): The message content.
+
+    Returns:
+        str: The text.
+    """
+    if isinstance(content, list):
+        return " ".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+        )
+
+    return str(content)
+
+
+def get_completed_tool_steps(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Get the completed tool calling steps of an agent run: its tool calling
+    messages whose calls all got a result, each followed by the results.
+
+    Args:
+        messages (list[BaseMessage]): Messages of the run.
+
+    Returns:
+        list[BaseMessage]: The messages of the completed steps, empty if no call succeeded.
+    """
+    results = {message.tool_call_id: message for message in messages if isinstance(message, ToolMessage)}
+    steps = []
+
+    for message in messages:
+        if not isinstance(message, AIMessage) or not message.tool_calls:
+            continue
+
+        if all(tool_call["id"] in results for tool_call in message.tool_calls):
+            steps += [message, *(results[tool_call["id"]] for tool_call in message.tool_calls)]
+
+    if all(message.status == VALUE_ERROR for message in steps if isinstance(message, ToolMessage)):
+        return []
+
+    return steps
+
+
+def get_output_paths(arguments: dict[str, Any]) -> list[str]:
+    """
+    Get the output files of a tool call: the values of its `output*` arguments
+    (e.g. `outputPath`), relative to the sandbox.
+
+    Args:
+        arguments (dict[str, Any]): Arguments of the call.
+
+    Returns:
+        list[str]: The output files, empty if the call names none.
+    """
+    return [
+        value for name, value in arguments.items()
+        if name.lower().startswith("output") and isinstance(value, str) and value
+    ]
+
+
+def clean_up_on_cancel(
+    tools: list[BaseTool],
+    repository: DocumentRepository,
+) -> list[BaseTool]:
+    """
+    Wrap tools so that a cancelled call removes the partial output it left behind.
+
+    Output files are the sandbox files named by `output*` arguments (e.g.
+    `outputPath`) that did not exist before the call. By the time the wrapper sees
+    the cancellation, the MCP server session of the call, and with it the server
+    process, has been shut down, so nothing writes to the files anymore.
+
+    Args:
+        tools (list[BaseTool]): The tools to wrap.
+        repository (DocumentRepository): Repository of the sandbox the tools work in.
+
+    Returns:
+        list[BaseTool]: The tools, wrapped where they are async structured tools.
+    """
+    return [
+        _clean_up_tool_on_cancel(tool, repository)
+        if isinstance(tool, StructuredTool) and tool.coroutine
+        else tool
+        for tool in tools
+    ]
+
+
+def _clean_up_tool_on_cancel(
+    tool: StructuredTool,
+    repository: DocumentRepository,
+) -> BaseTool:
+    """
+    Wrap a single tool so that a cancelled call removes its partial output.
+
+    Args:
+        tool (StructuredTool): The tool to wrap.
+        repository (DocumentRepository): Repository of the sandbox the tool works in.
+
+    Returns:
+        BaseTool: The wrapped tool.
+    """
+    async def call_tool(
+        runtime: Annotated[object | None, InjectedToolArg()] = None,
+        **arguments: Any,
+    ) -> Any:
+        outputs = [
+            output for output in get_output_paths(arguments)
+            if not (repository.base_path / output).exists()
+        ]
+
+        try:
+            return await tool.coroutine(runtime=runtime, **arguments)
+        except asyncio.CancelledError:
+            for output in outputs:
+                if not (repository.base_path / output).exists():
+                    continue
+
+                try:
+                    repository.delete_document(output)
+
+                    logger.info("Removed partial output '%s' of cancelled '%s' call.", output, tool.name)
+                except Exception as e: # pylint: disable=broad-except
+                    logger.warning("Could not remove partial output '%s': %s", output, e)
+
+            raise
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call_tool,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+        handle_tool_error=tool.handle_tool_error,
+    )